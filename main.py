@@ -1,23 +1,33 @@
 from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from src.agents.persona_agent import PersonaAgent
-from src.agents.memory import MemoryManager
-from src.bot.manager import BotManager
-from src.database.mongo_manager import(
+from bson import ObjectId
+from bson.errors import InvalidId
+from src.agents.chat_session import ChatSession
+from src.agents.registry import (
+    get_agent, get_memory_manager, get_write_behind, get_counter_aggregator, get_summary_service, get_vector_backend,
+    Lazy, STARTUP_WARMUP, READY_SUBSYSTEMS, subsystem_status, subsystem_ready, warm_up,
+)
+from src.bot.manager import BotManager, WORKER_LOAD_METRICS
+from src.database.indexes import ensure_indexes
+from src.database.quota import quota_engine, QuotaExceeded
+from src.database.mongo_manager import ROLLUP_GRANULARITIES
+from src.utils.metrics import REGISTRY, Gauge, GaugeFamily
+from src.utils.tracing import TracingMiddleware
+from src.database.async_mongo_manager import(
     get_user_auth,
     save_user_profile,get_user_profile,
     update_user_field,
     set_away_mongo,set_mode_mongo,
-    set_chat,get_chat,
-    increment_email_count, increment_switch_count, increment_command_count,
-    get_analytics,
+    get_chat_page, iter_chat,
+    get_analytics, get_analytics_rollups,
     get_story_nfts,
     set_plan, get_plan,
-    get_away_logs,
+    get_away_sessions, get_away_session_messages,
     get_user_by_token, update_user_verification,
-    collection
+    set_verification_token
 )
 from src.auth.jwt_handler import (
     get_password_hash, verify_password,
@@ -32,18 +42,22 @@ from src.utils.email_service import send_verification_email
 
 from fastapi import WebSocket, WebSocketDisconnect
 from fastapi.responses import RedirectResponse
-from fastapi import Request
+from fastapi import Request, Response, Query
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from limits import parse as parse_rate_limit
 
 import os
+import json
 import asyncio
+import anyio
+import functools
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 
 load_dotenv(override=True)
 
@@ -51,6 +65,8 @@ limiter = Limiter(key_func=get_remote_address)
 app = FastAPI()
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Same budget as /chat-with-mimic, counted per user for each /ws/chat message frame.
+CHAT_SOCKET_RATE_LIMIT = parse_rate_limit("5/minute")
 
 app.add_middleware(
     CORSMiddleware,
@@ -59,8 +75,11 @@ app.add_middleware(
     allow_methods=["*"],  
     allow_headers=["*"],  
 )
+app.add_middleware(TracingMiddleware)
 
-memory_manager = MemoryManager()
+memory_manager = Lazy(get_memory_manager)
+write_behind = Lazy(get_write_behind)
+counters = Lazy(get_counter_aggregator)
 bot_manager = BotManager()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
@@ -121,7 +140,8 @@ class SummerizeRequest(BaseModel):
 class SessionMessage(BaseModel):
     start_time: str
     end_time: str
-    messages: List[str] 
+    messages: List[str]
+    session_id: Optional[str] = None
 
 class SummarizeRequest(BaseModel):
     user_id: str
@@ -165,23 +185,23 @@ async def broadcast_winner(duel_id: int, winner: str):
 
 @app.post("/register")
 @limiter.limit("5/minute")
-def register(request: Request,req: AuthRequest):
+async def register(request: Request,req: AuthRequest):
     if(req.user_id.endswith("@gmail.com") == False):
         raise HTTPException(status_code=400, detail="User ID must be a valid Gmail address")
     if len(req.password) < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters long")
     
-    if get_user_auth(req.user_id):
+    if await get_user_auth(req.user_id):
         raise HTTPException(status_code=400, detail="User already exists")
 
-    hashed_pw = get_password_hash(req.password)
-    save_user_profile(req.user_id, hashed_pw, "register")
+    hashed_pw = await run_in_threadpool(get_password_hash, req.password)
+    await save_user_profile(req.user_id, hashed_pw, "register")
     return {"message": "User registered successfully"}
 
 @app.get("/verify-email/{token}")
 @limiter.limit("5/minute")
-def verify_email(request: Request,token:str):
-    user = get_user_by_token(token)
+async def verify_email(request: Request,token:str):
+    user = await get_user_by_token(token)
 
     if not user:
         raise HTTPException(status_code=400, detail="Invalid token")
@@ -192,16 +212,16 @@ def verify_email(request: Request,token:str):
     if user.get("verification_expiry") and datetime.utcnow() > datetime.fromisoformat(user["verification_expiry"]):
         raise HTTPException(status_code=400, detail="Token expired")
     
-    if update_user_verification(user["user_id"]):
+    if await update_user_verification(user["user_id"]):
         return RedirectResponse(url=os.getenv("FRONTEND_URL")+"/auth?message=verified", status_code=302)
     else:
         raise HTTPException(status_code=400, detail="Email verification failed")
 
 @app.post("/send-verification-email")
 @limiter.limit("5/minute")
-def send_email(request: Request,req: SendVerificationRequest):
+async def send_email(request: Request,req: SendVerificationRequest):
     user_id = req.user_id
-    user = get_user_auth(user_id)
+    user = await get_user_auth(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -210,31 +230,31 @@ def send_email(request: Request,req: SendVerificationRequest):
 
     # check user have verification token and it is not expired
     if user.get("verification_token") and user.get("verification_expiry") and datetime.utcnow() < datetime.fromisoformat(user["verification_expiry"]):
-        send_verification_email(user_id, user["verification_token"])
+        await run_in_threadpool(send_verification_email, user_id, user["verification_token"])
         return {"message": "Verification email sent"}
 
     verification_token = str(uuid.uuid4())
-    send_verification_email(user_id, verification_token)
+    await run_in_threadpool(send_verification_email, user_id, verification_token)
 
-    collection.update_one(
-        {"user_id": user_id},
-        {"$set": {
-            "verification_token": verification_token,
-            "verification_expiry": (datetime.utcnow() + timedelta(minutes=15)).isoformat()
-        }}
-    )
+    await set_verification_token(user_id, verification_token)
 
     return {"message": "Verification email sent"}
 
 @app.get("/analytics/{user_id}")
-def get_user_analytics(user_id: str):
+async def get_user_analytics(user_id: str, start: Optional[date] = None, end: Optional[date] = None, granularity: str = "day"):
+    """All-time counters, plus a precomputed time series when a date range is given."""
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid granularity. Choose from {list(ROLLUP_GRANULARITIES)}.")
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+
     try:
-        data = get_analytics(user_id)
+        data = await get_analytics(user_id)
 
-        analytics = data.get("analytics", {})
+        analytics = data.get("analytics") or {}
         plan = data.get("plan", "")
 
-        return {
+        result = {
             "data": [
                 {"name": "Chats", "count": analytics.get("commands", 0)},
                 {"name": "Emails", "count": analytics.get("emails", 0)},
@@ -242,20 +262,31 @@ def get_user_analytics(user_id: str):
             ],
             "plan" : plan
         }
+
+        if start or end:
+            end = end or datetime.utcnow().date()
+            start = start or end - timedelta(days=30)
+            result["granularity"] = granularity
+            result["series"] = await get_analytics_rollups(
+                user_id, granularity,
+                datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+            )
+
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/login")
 @limiter.limit("5/minute")
-def login(request: Request,req: AuthRequest):
-    doc = get_user_auth(req.user_id)
+async def login(request: Request,req: AuthRequest):
+    doc = await get_user_auth(req.user_id)
 
     verified = doc.get("email_verified") if doc else None
     if not verified:
         raise HTTPException(status_code=401, detail="Email not verified")
 
     password = doc.get("password") if doc else None
-    if not password or not verify_password(req.password, password):
+    if not password or not await run_in_threadpool(verify_password, req.password, password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token({"sub": req.user_id})
@@ -267,120 +298,252 @@ def current_user(token: str = Depends(oauth2_scheme)):
     return {"user_id": user_id}
 
 @app.post("/setup-profile")
-def setup_profile(request: ProfileSetupRequest, token: str = Depends(oauth2_scheme)):
+async def setup_profile(request: ProfileSetupRequest, token: str = Depends(oauth2_scheme)):
     """Stores user profile in memory."""
     user_id = decode_token(token)
 
     if not request.profile_data:
         raise HTTPException(status_code=400, detail="User ID and profile data are required.")
     
-    save_user_profile(user_id, request.profile_data,"profile")
-    memory_manager.save_user_profile(user_id, request.profile_data)
+    await save_user_profile(user_id, request.profile_data,"profile")
+    await run_in_threadpool(memory_manager.save_user_profile, user_id, request.profile_data)
     return {"message": "Profile setup successful."}
 
 @app.get("/get-profile/{user_id}")
-def get_profile(user_id: str):
+async def get_profile(user_id: str):
     """Retrieves user profile from memory."""
-    profile = get_user_profile(user_id)
+    profile = await get_user_profile(user_id)
     if profile:
         return profile
     raise HTTPException(status_code=404, detail="Profile not found")
 
 @app.put("/update-profile")
-def update_profile(request: ProfileUpdateRequest):
+async def update_profile(request: ProfileUpdateRequest):
     """Updates a specific user profile field."""
-    profile = get_profile(request.user_id)
+    profile = await get_profile(request.user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
     profile.update(request.updates)
-    memory_manager.save_user_profile(request.user_id, profile)
-    update_user_field(request.user_id, request.updates)
+    await run_in_threadpool(memory_manager.save_user_profile, request.user_id, profile)
+    await update_user_field(request.user_id, request.updates)
     return {"message": f"Updated Profile Successfully"}
 
 @app.post("/switch-mode")
 @limiter.limit("5/minute")
-def switch_mode(request: Request,req: ModeSwitchRequest):
+async def switch_mode(request: Request,req: ModeSwitchRequest):
     """Switches between 'professional' and 'fun' mode."""
-    profile = get_user_profile(req.user_id)
+    profile = await get_user_profile(req.user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
     if req.mode not in ["professional", "fun"]:
         raise HTTPException(status_code=400, detail="Invalid mode. Choose 'professional' or 'fun'.")
     
-    set_mode_mongo(req.user_id, req.mode)
+    await set_mode_mongo(req.user_id, req.mode)
+    await run_in_threadpool(bot_manager.push_profile, req.user_id, {**profile, "mode": req.mode})
 
-    increment_switch_count(req.user_id)
+    counters.increment(req.user_id, "switch")
 
     return {"message": f"Mode switched to {req.mode.capitalize()} Mode 🎭"}
 
 @app.post("/chat-with-mimic")
 @limiter.limit("5/minute")
-def chat_with_mimic(request: Request,req: ChatMimicRequest):
-    user_profile = get_user_profile(req.user_id)
+async def chat_with_mimic(request: Request,req: ChatMimicRequest):
+    user_profile = await get_user_profile(req.user_id)
     if not user_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    plan = user_profile.get("plan", "Basic")
-    chat_count = user_profile.get("chat_count", 0)
-
-    if plan == "Basic" and chat_count >= 100:
-        raise HTTPException(status_code=403, detail="You have reached your chat limit for the Basic plan.")
+    try:
+        await quota_engine.reserve(req.user_id, "chat")
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=403, detail=str(e))
 
-    if plan == "Premium" and chat_count >= 500:
-        raise HTTPException(status_code=403, detail="You have reached your chat limit for the Premium plan.")
+    try:
+        agent = await run_in_threadpool(get_agent, GROQ_API_KEY, user_profile, req.user_id)
+    except Exception:
+        await quota_engine.refund(req.user_id, "chat")
+        raise
 
-    agent = PersonaAgent(api_key=GROQ_API_KEY, user_profile=user_profile,user_id=req.user_id)
     async def streamer():
         response_text = ""
-        async for chunk in agent.generate_response(req.user_input):
-            response_text += chunk
-            yield chunk.encode("utf-8")  
+        try:
+            async for chunk in agent.generate_response(req.user_input):
+                response_text += chunk
+                yield chunk.encode("utf-8")  
+        except Exception:
+            await quota_engine.refund(req.user_id, "chat")
+            raise
 
-        set_chat(req.user_id, req.user_input, response_text)
-        increment_command_count(req.user_id)
+        write_behind.set_chat(req.user_id, req.user_input, response_text)
+        counters.increment(req.user_id, "command")
 
     return StreamingResponse(streamer(), media_type="text/plain")
 
+async def receive_text_frame(websocket: WebSocket):
+    """Next text frame; a binary frame closes the socket with 1003 (unsupported data)."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    text = message.get("text")
+    if text is None:
+        await websocket.close(code=1003, reason="Only text frames are supported")
+        raise WebSocketDisconnect(1003)
+    return text
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, token: Optional[str] = None):
+    """Persistent chat session.
+
+    Authenticate with ?token=... or a first {"type": "auth", "token": ...} frame.
+    Client frames: {"type": "message", "id": ..., "content": ...}, {"type": "cancel"}, {"type": "ping"}.
+    Server frames: ready, token (one per chunk), done (with ttft_ms and tokens_per_second),
+    cancelled, error and pong.
+    """
+    await websocket.accept()
+
+    try:
+        if token is None:
+            frame = json.loads(await asyncio.wait_for(receive_text_frame(websocket), timeout=10))
+            token = frame.get("token") if frame.get("type") == "auth" else None
+        user_id = decode_token(token) if token else None
+    except (HTTPException, asyncio.TimeoutError, ValueError, AttributeError):
+        user_id = None
+    except WebSocketDisconnect:
+        return
+
+    if not user_id:
+        await websocket.close(code=1008, reason="Invalid token")
+        return
+
+    user_profile = await get_user_profile(user_id)
+    if not user_profile:
+        await websocket.close(code=1008, reason="Profile not found")
+        return
+
+    agent = await run_in_threadpool(get_agent, GROQ_API_KEY, user_profile, user_id)
+    session = ChatSession(agent, user_id, write_behind, counters)
+    await websocket.send_json({"type": "ready", "user_id": user_id})
+
+    async def run_turn(turn_id, user_input):
+        try:
+            await quota_engine.reserve(user_id, "chat")
+        except QuotaExceeded as e:
+            await websocket.send_json({"type": "error", "id": turn_id, "detail": str(e)})
+            return
+
+        try:
+            async for chunk in session.stream_turn(user_input):
+                await websocket.send_json({"type": "token", "id": turn_id, "data": chunk})
+        except asyncio.CancelledError:
+            await quota_engine.refund(user_id, "chat")
+            raise
+        except WebSocketDisconnect:
+            await quota_engine.refund(user_id, "chat")
+            return
+        except Exception as e:
+            await quota_engine.refund(user_id, "chat")
+            print(f"[ws-chat] turn failed for {user_id}:", e)
+            await websocket.send_json({"type": "error", "id": turn_id, "detail": "Generation failed"})
+            return
+
+        await websocket.send_json({"type": "done", "id": turn_id, **session.last_turn})
+
+    generation = None
+    turn_number = 0
+    try:
+        while True:
+            try:
+                frame = json.loads(await receive_text_frame(websocket))
+                kind = frame.get("type")
+            except (ValueError, AttributeError):
+                await websocket.send_json({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+
+            if kind == "message":
+                content = frame.get("content")
+                if not isinstance(content, str) or not content.strip():
+                    await websocket.send_json({"type": "error", "id": frame.get("id"), "detail": "Empty message"})
+                elif generation is not None and not generation.done():
+                    await websocket.send_json({"type": "error", "id": frame.get("id"), "detail": "A reply is still streaming"})
+                elif not limiter.limiter.hit(CHAT_SOCKET_RATE_LIMIT, "ws-chat", user_id):
+                    await websocket.send_json({"type": "error", "id": frame.get("id"),
+                                               "detail": f"Rate limit exceeded: {CHAT_SOCKET_RATE_LIMIT}"})
+                else:
+                    turn_number += 1
+                    generation = asyncio.create_task(run_turn(frame.get("id", turn_number), content))
+            elif kind == "cancel":
+                if generation is not None and not generation.done():
+                    generation.cancel()
+                    try:
+                        await generation
+                    except asyncio.CancelledError:
+                        pass
+                    await websocket.send_json({"type": "cancelled", "id": frame.get("id", turn_number)})
+            elif kind == "ping":
+                await websocket.send_json({"type": "pong"})
+            else:
+                await websocket.send_json({"type": "error", "detail": f"Unknown frame type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if generation is not None and not generation.done():
+            generation.cancel()
+
 @app.get("/get-chat/{user_id}")
-def get_chats(user_id: str):
-    """Retrieves the last chat with the user."""
-    chat = get_chat(user_id)
+async def get_chats(user_id: str, response: Response, before: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    """Retrieves a page of chat history ending just before the `before` cursor.
+
+    The cursor for the next (older) page is returned in the X-Next-Cursor header.
+    """
+    try:
+        chat, next_cursor = await get_chat_page(user_id, before, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     if not chat:
         raise HTTPException(status_code=404, detail="No chat found")
-    
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return chat
 
+@app.get("/get-chat/{user_id}/export")
+async def export_chats(user_id: str):
+    """Streams the user's full chat history as NDJSON, oldest message first."""
+    async def exporter():
+        async for message in iter_chat(user_id):
+            yield json.dumps(message, default=str) + "\n"
+
+    return StreamingResponse(exporter(), media_type="application/x-ndjson")
+
 @app.post("/draft-email")
 @limiter.limit("5/minute")
-def draft_email(request:Request,req: DraftEmailRequest):
+async def draft_email(request:Request,req: DraftEmailRequest):
     """Generates a draft email based on the user's persona."""
     user_id = req.user_id
 
-    user_profile = get_user_profile(user_id)
-    plan = user_profile.get("plan", "Basic")
-    email_count = user_profile.get("email_count", 0)
-
-    if plan == "Basic" and email_count >= 10:
-        raise HTTPException(status_code=403, detail="You have reached your email limit for the Basic plan.")
-
-    if plan == "Premium" and email_count >= 100:
-        raise HTTPException(status_code=403, detail="You have reached your email limit for the Premium plan.")
-
+    user_profile = await get_user_profile(user_id)
     if not user_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
-    
-    agent = PersonaAgent(api_key=GROQ_API_KEY, user_profile=user_profile,user_id=user_id)
+
+    try:
+        await quota_engine.reserve(user_id, "email")
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=403, detail=str(e))
 
     prompt = f"""
     Draft a professional email to {req.recipient} with the subject '{req.subject}'. 
     The context of the email is: {req.context}.
     Keep the tone consistent with the user's professional persona.
     """
-    draft = agent.draft_email(prompt)
+    try:
+        agent = await run_in_threadpool(get_agent, GROQ_API_KEY, user_profile, user_id)
+        draft = await run_in_threadpool(agent.draft_email, prompt)
+    except Exception:
+        await quota_engine.refund(user_id, "email")
+        raise
 
-    increment_email_count(user_id)
+    counters.increment(user_id, "email")
 
     return {
         "user_id": user_id,
@@ -391,37 +554,43 @@ def draft_email(request:Request,req: DraftEmailRequest):
 
 @app.post("/set-away")
 @limiter.limit("5/minute")
-def set_away(request:Request,req: SetAwayRequest):
+async def set_away(request:Request,req: SetAwayRequest):
     """Sets the user's status to away or available."""
-    user_profile = get_user_profile(req.user_id)
+    user_profile = await get_user_profile(req.user_id)
     if not user_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    set_away_mongo(req.user_id, req.away)
+    closed_session_id = await set_away_mongo(req.user_id, req.away)
+
+    counters.increment(req.user_id, "switch")
 
-    increment_switch_count(req.user_id)
+    if closed_session_id:
+        get_summary_service(GROQ_API_KEY).refresh_in_background(req.user_id, closed_session_id)
 
-    if not req.away:
-        bot_manager.stop_bot(req.user_id)
+    if req.away:
+        await run_in_threadpool(bot_manager.push_profile, req.user_id, {**user_profile, "away": True})
+    else:
+        await run_in_threadpool(bot_manager.stop_bot, req.user_id)
 
     return {"message": f"User status set to {'away' if req.away else 'available'}."}
 
 @app.post("/receive-message")
-def receive_message(request: ReceiveMessageRequest):
+async def receive_message(request: ReceiveMessageRequest):
     """Processes a message only if the user is set to away mode with a mimicked response style."""
     user_id = request.user_id
 
-    user_profile = get_user_profile(user_id)
+    user_profile = await get_user_profile(user_id)
     if not user_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    agent = PersonaAgent(api_key=GROQ_API_KEY, user_profile=user_profile,user_id=user_id)
-
-    if not agent.user_profile.get("away", False):
+    if not user_profile.get("away", False):
         print("User is not in away mode.")
         raise HTTPException(status_code=403, detail="User is not in away mode.")
 
-    auto_reply = agent.generate_mimic_response(request.message,type="discord")
+    agent = await run_in_threadpool(get_agent, GROQ_API_KEY, user_profile, user_id)
+
+    auto_reply = await run_in_threadpool(agent.generate_mimic_response, request.message, "discord")
+    counters.increment(user_id, "away_message")
 
     return {
         "user_id": user_id,
@@ -441,6 +610,11 @@ def stop_bot(request: InitBotPayload):
     result = bot_manager.stop_bot(request.user_id)
     return {"message": result}
 
+@app.get("/bot-workers")
+def bot_workers():
+    """Per-worker load of the bot runtime and how many users hash to each worker."""
+    return {"workers": bot_manager.worker_stats()}
+
 @app.get("/bot-status/{user_id}")
 def bot_status(user_id: str):
     """Checks if the bot is running for the user."""
@@ -456,28 +630,28 @@ def mint_story(request:MintRequest):
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/shooping")
-def shopping_assistant(req: ShoppingRequest):
+async def shopping_assistant(req: ShoppingRequest):
     try:
-        plan = get_plan(req.user_id)
+        plan = await get_plan(req.user_id)
         if not plan:
             raise HTTPException(status_code=404, detail="Profile or plan not found")
         if plan == "Basic":
             raise HTTPException(status_code=403, detail="Basic plan does not support shopping assistant.")
-        result = handle_shopping_flow(req.prompt)
+        result = await run_in_threadpool(handle_shopping_flow, req.prompt)
         return {"status": "success", "data": result}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @app.get("/story/nfts/{user_id}")
-def get_story_nft(user_id: str):
+async def get_story_nft(user_id: str):
     try:
-        nfts = get_story_nfts(user_id)
+        nfts = await get_story_nfts(user_id)
         return {"status": "success", "data": nfts}
     except Exception as e:
         return {"status": "error", "message": str(e)}   
 
 @app.post("/subscribe")
-def buy_plan(request: SubscriptionRequest):
+async def buy_plan(request: SubscriptionRequest):
     user_id = request.user_id
     selected_plan = request.plan
 
@@ -485,18 +659,19 @@ def buy_plan(request: SubscriptionRequest):
     if selected_plan not in valid_plans:
         raise HTTPException(status_code=400, detail=f"Invalid plan: {selected_plan}. Choose from {valid_plans}.")
 
-    profile = get_user_profile(user_id)
+    profile = await get_user_profile(user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")    
     
-    set_plan(user_id, selected_plan, tx_hash=request.tx_hash, subscribed_at=datetime.utcnow())
+    await set_plan(user_id, selected_plan, tx_hash=request.tx_hash, subscribed_at=datetime.utcnow())
+    quota_engine.clear(user_id)
 
     return {"message": f"Subscription plan successfully updated to {selected_plan}."}
 
 @app.get("/get-plan/{user_id}")
-def get_plan_route(user_id: str):
+async def get_plan_route(user_id: str):
     """Retrieves the user's current subscription plan."""
-    plan = get_plan(user_id)
+    plan = await get_plan(user_id)
 
     if not plan:
         raise HTTPException(status_code=404, detail="Profile or plan not found")
@@ -504,31 +679,55 @@ def get_plan_route(user_id: str):
     return {"user_id": user_id, "plan": plan}
 
 @app.get("/away-messages/{user_id}")
-def get_away_messages(user_id: str):
-    """Retrieves the away messages for all users."""
-    away_messages = get_away_logs(user_id)
-    return {"away_messages": away_messages}
+async def get_away_messages(user_id: str, before: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    """Retrieves a page of the user's away sessions (newest first) without their messages."""
+    try:
+        sessions, next_cursor = await get_away_sessions(user_id, before, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"away_messages": sessions, "next_cursor": next_cursor}
+
+@app.get("/away-messages/{user_id}/{session_id}")
+async def get_away_session(user_id: str, session_id: str, after: Optional[str] = None, limit: int = Query(100, ge=1, le=500)):
+    """Retrieves a page of one away session's messages (oldest first)."""
+    try:
+        messages, next_cursor = await get_away_session_messages(user_id, session_id, after, limit)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid session id or cursor")
+    return {"session_id": session_id, "messages": messages, "next_cursor": next_cursor}
 
 
 @app.post("/away-summary")
-def summarize_away_sessions(data: SummarizeRequest):
+async def summarize_away_sessions(data: SummarizeRequest, stream: bool = False):
     """
     Returns summarized away messages for the given user.
+    Sessions that carry a session_id are answered from the summary stored
+    with the session; the LLM only runs for sessions that are missing or stale.
+    With ?stream=true each summary is sent as an NDJSON line as soon as it is ready.
     """
     user_id = data.user_id
     sessions = [session.dict() for session in data.sessions]
 
-    plan = get_plan(user_id)
+    plan = await get_plan(user_id)
     if not plan:
         raise HTTPException(status_code=404, detail="Profile or plan not found")
 
     if plan == "Basic":
         raise HTTPException(status_code=403, detail="Basic plan does not support away message summarization.")
 
-    user_profile = get_user_profile(user_id)
+    if any(s.get("session_id") and not ObjectId.is_valid(s["session_id"]) for s in sessions):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+
+    summary_service = get_summary_service(GROQ_API_KEY)
 
-    agent = PersonaAgent(api_key=GROQ_API_KEY, user_profile=user_profile, user_id=user_id)
-    summaries = agent.summarize_conversation(sessions)
+    if stream:
+        async def streamer():
+            async for index, summary in summary_service.stream(user_id, sessions):
+                yield json.dumps({"index": index, **summary}, default=str) + "\n"
+
+        return StreamingResponse(streamer(), media_type="application/x-ndjson")
+
+    summaries = await summary_service.summarize_all(user_id, sessions)
 
     return {
         "original_sessions": sessions,
@@ -536,13 +735,13 @@ def summarize_away_sessions(data: SummarizeRequest):
     }
 
 @app.post("/api/duel/create")
-def create_duel(req: PathRequest):
-    plan = get_plan(req.user_id) 
+async def create_duel(req: PathRequest):
+    plan = await get_plan(req.user_id) 
     if not plan:
         raise HTTPException(status_code=404, detail="Profile or plan not found")
     if plan  == "Basic":
         raise HTTPException(status_code=403, detail="Basic plan does not support duel creation.")
-    duel_id = maze_game_skill.create_duel(req.path)
+    duel_id = await run_in_threadpool(maze_game_skill.create_duel, req.path)
     return {"duel_id": duel_id}
 
 
@@ -558,8 +757,8 @@ def submit_guess(req: GuessRequest):
 @app.post("/api/duel/reveal")
 async def reveal_maze(req: GuessRequest):
     try:
-        tx_hash = maze_game_skill.reveal_maze(req.duel_id, req.path)
-        winner =  maze_game_skill.get_winner(req.duel_id)
+        tx_hash = await run_in_threadpool(maze_game_skill.reveal_maze, req.duel_id, req.path)
+        winner = await run_in_threadpool(maze_game_skill.get_winner, req.duel_id)
         if winner:
             await broadcast_winner(req.duel_id, winner)
         return {"tx_hash": tx_hash}
@@ -570,7 +769,7 @@ async def reveal_maze(req: GuessRequest):
 async def get_duel_winner(duel_id: int):
     """Fetches the winner of a duel by duel ID."""
     try:
-        winner = maze_game_skill.get_winner(duel_id)
+        winner = await run_in_threadpool(maze_game_skill.get_winner, duel_id)
         
         if winner is None:
             raise HTTPException(status_code=404, detail=f"No winner found for duel {duel_id}")
@@ -582,6 +781,67 @@ async def get_duel_winner(duel_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+Gauge(
+    "threadpool_busy_threads", "Threads currently running run_in_threadpool work.",
+    lambda: anyio.to_thread.current_default_thread_limiter().borrowed_tokens,
+)
+Gauge(
+    "threadpool_max_threads", "Size of the run_in_threadpool worker limit.",
+    lambda: anyio.to_thread.current_default_thread_limiter().total_tokens,
+)
+Gauge("bot_workers_alive", "Bot worker processes that are alive.", lambda: sum(w.is_alive() for w in bot_manager.workers))
+for field, description in WORKER_LOAD_METRICS.items():
+    GaugeFamily(f"bot_worker_{field}", ("worker",), functools.partial(bot_manager.load_metric, field), description)
+Gauge("duel_websockets_open", "Open duel WebSocket connections.", lambda: sum(len(c) for c in list(active_connections.values())))
+# Read only once the subsystem exists, so a scrape never initializes it.
+Gauge(
+    "counter_pending_updates", "Analytics counter increments waiting to be flushed.",
+    lambda: counters.stats()["pending_updates"] if subsystem_ready("counter_aggregator") else 0,
+)
+Gauge(
+    "counter_pending_users", "Users with unflushed analytics counter deltas.",
+    lambda: counters.stats()["pending_users"] if subsystem_ready("counter_aggregator") else 0,
+)
+Gauge(
+    "write_behind_queue_depth", "Memory and chat writes waiting in the write-behind queue.",
+    lambda: write_behind.pending() if subsystem_ready("write_behind") else 0,
+)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of every registered metric."""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness probe. Never blocks: pending or failed READY_SUBSYSTEMS are (re)started in the background."""
+    warm_up(READY_SUBSYSTEMS)
+    subsystems = subsystem_status()
+    is_ready = all(subsystems[name]["state"] == "ready" for name in READY_SUBSYSTEMS)
+    response.status_code = 200 if is_ready else 503
+    return {"ready": is_ready, "subsystems": subsystems}
+
+@app.on_event("startup")
+async def start_warmup():
+    if STARTUP_WARMUP:
+        warm_up()
+
+@app.on_event("startup")
+async def create_indexes():
+    # In the background so an unreachable Mongo does not hold up startup.
+    app.state.index_task = asyncio.create_task(run_in_threadpool(ensure_indexes))
+
 @app.on_event("startup")
 async def start_bot_watchdog():
-    asyncio.create_task(bot_manager.monitor_bots())
\ No newline at end of file
+    asyncio.create_task(bot_manager.monitor_bots())
+
+@app.on_event("shutdown")
+def flush_write_behind():
+    if subsystem_ready("write_behind"):
+        write_behind.close()
+    if subsystem_ready("counter_aggregator"):
+        counters.close()
+    # After write_behind, whose final flush still writes memory through the backend.
+    if subsystem_ready("vector_backend"):
+        get_vector_backend().close()
+    bot_manager.close()
\ No newline at end of file
@@ -0,0 +1,69 @@
+import os
+import time
+from collections import deque
+
+from src.utils.metrics import Histogram
+
+CHAT_SESSION_CONTEXT_TURNS = int(os.getenv("CHAT_SESSION_CONTEXT_TURNS", "10"))
+
+ttft_histogram = Histogram(
+    "chat_time_to_first_token_seconds", [0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2.5, 5, 10],
+    "Time from receiving a chat turn to streaming its first token.",
+)
+tokens_per_second_histogram = Histogram(
+    "chat_tokens_per_second", [5, 10, 25, 50, 100, 200, 400, 800, 1600],
+    "Streaming rate of a chat turn after its first token.",
+)
+
+
+class ChatSession:
+    """One live chat connection: a long-lived agent plus the turns exchanged on it.
+
+    The agent is built once when the session opens; every turn reuses it and
+    passes the session's recent turns as extra context. Streamed chunks are
+    counted as tokens for the per-turn rate.
+    """
+
+    def __init__(self, agent, user_id, writer, counters, max_context_turns=CHAT_SESSION_CONTEXT_TURNS):
+        self.agent = agent
+        self.user_id = user_id
+        self.writer = writer
+        self.counters = counters
+        self.turns = deque(maxlen=max_context_turns)
+        self.last_turn = None
+
+    async def stream_turn(self, user_input):
+        """Yields response chunks; turns closed before the end are not saved."""
+        started = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        response_text = ""
+
+        async for chunk in self.agent.generate_response(user_input, session_turns=list(self.turns)):
+            if not chunk:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            tokens += 1
+            response_text += chunk
+            yield chunk
+
+        finished = time.perf_counter()
+        ttft = (first_token_at or finished) - started
+        streaming_time = finished - (first_token_at or finished)
+        tokens_per_second = tokens / streaming_time if streaming_time > 0 else 0.0
+
+        ttft_histogram.observe(ttft)
+        if tokens > 1:
+            tokens_per_second_histogram.observe(tokens_per_second)
+
+        self.turns.append((user_input, response_text))
+        self.writer.set_chat(self.user_id, user_input, response_text)
+        self.counters.increment(self.user_id, "command")
+
+        self.last_turn = {
+            "ttft_ms": round(ttft * 1000, 1),
+            "tokens": tokens,
+            "tokens_per_second": round(tokens_per_second, 1),
+            "total_ms": round((finished - started) * 1000, 1),
+        }
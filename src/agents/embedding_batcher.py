@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.utils.metrics import Histogram
+
+
+class MicroBatchEmbeddings:
+    """Coalesces concurrent embed_query calls into one embed_documents batch.
+
+    Callers from any thread submit a text and wait on a future; a single
+    worker thread collects requests for up to max_wait_ms (or until
+    max_batch_size is reached), runs them through the model together and
+    hands each caller its own vector.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+
+        self.batch_size_histogram = Histogram(
+            "embedding_batch_size", [1, 2, 4, 8, 16, 32, 64, 128],
+            "Texts per embed_documents call made by the micro-batcher.",
+        )
+        self.queue_wait_histogram = Histogram(
+            "embedding_queue_wait_seconds", [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25],
+            "Time a text waited in the micro-batch queue before inference started.",
+        )
+
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed_query(self, text):
+        return self.submit(text).result()
+
+    def embed_documents(self, texts):
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_histogram.observe(started - enqueued)
+            self.batch_size_histogram.observe(len(batch))
+
+            try:
+                vectors = self.model.embed_documents([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self):
+        return {
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_seconds": self.queue_wait_histogram.snapshot(),
+            "pending": self._queue.qsize(),
+        }
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.utils.metrics import Counter
+from src.utils.tracing import current_span
+
+
+def embedding_key(model_name, text):
+    """Content address for an embedding: sha256 over model name and text."""
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """Fixed-capacity on-disk tier backed by a memory-mapped float32 matrix.
+
+    Slots are reused round-robin once the store is full. The slot -> key map
+    is an append-only log that is replayed on startup and rewritten from the
+    live slots once it holds more than compact_factor * capacity lines, so
+    both files stay bounded.
+    """
+
+    def __init__(self, path, dimension, capacity=100_000, compact_factor=2):
+        os.makedirs(path, exist_ok=True)
+        self.dimension = dimension
+        self.capacity = capacity
+        self.max_log_lines = capacity * compact_factor
+        self._lock = threading.Lock()
+        self.vectors_path = os.path.join(path, f"vectors-{dimension}.f32")
+        self.keys_path = os.path.join(path, f"keys-{dimension}.log")
+
+        mode = "r+" if os.path.exists(self.vectors_path) else "w+"
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode=mode, shape=(capacity, dimension))
+
+        self.slots = {}
+        self.keys = [None] * capacity
+        self.next_slot = 0
+        self.log_lines = 0
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r") as f:
+                for line in f:
+                    self.log_lines += 1
+                    slot, _, key = line.rstrip("\n").partition("\t")
+                    if not key:
+                        continue
+                    slot = int(slot)
+                    if slot >= capacity:
+                        continue
+                    old = self.keys[slot]
+                    if old is not None:
+                        self.slots.pop(old, None)
+                    self.keys[slot] = key
+                    self.slots[key] = slot
+                    self.next_slot = (slot + 1) % capacity
+        self._log = open(self.keys_path, "a")
+        if self.log_lines > self.max_log_lines:
+            self._compact()
+
+    def get(self, key):
+        with self._lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                return None
+            return np.array(self.vectors[slot])
+
+    def put(self, key, vector):
+        with self._lock:
+            if key in self.slots:
+                return
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.capacity
+            old = self.keys[slot]
+            if old is not None:
+                self.slots.pop(old, None)
+            self.vectors[slot] = vector
+            self.keys[slot] = key
+            self.slots[key] = slot
+            self._log.write(f"{slot}\t{key}\n")
+            self._log.flush()
+            self.log_lines += 1
+            if self.log_lines > self.max_log_lines:
+                self._compact()
+
+    def _compact(self):
+        """Rewrites the key log with one line per live slot, ending with the newest so replay restores next_slot."""
+        self._log.close()
+        order = [(self.next_slot + i) % self.capacity for i in range(self.capacity)]
+        live = [slot for slot in order if self.keys[slot] is not None]
+        tmp_path = self.keys_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for slot in live:
+                f.write(f"{slot}\t{self.keys[slot]}\n")
+        os.replace(tmp_path, self.keys_path)
+        self._log = open(self.keys_path, "a")
+        self.log_lines = len(live)
+
+    def close(self):
+        with self._lock:
+            self.vectors.flush()
+            self._log.close()
+
+
+class EmbeddingCache:
+    """Bounded LRU of embeddings with an optional memory-mapped disk tier.
+
+    The LRU lock only guards the in-memory map; disk reads and writes take
+    the store's own lock, so a slow disk never blocks memory hits.
+    """
+
+    def __init__(self, max_entries=10_000, disk_path=None, disk_capacity=100_000):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_capacity = disk_capacity
+        self._memory = OrderedDict()
+        self._disks = {}
+        self._lock = threading.Lock()
+        self.hits = Counter("embedding_cache_hits_total", "Embedding cache hits, memory or disk.")
+        self.disk_hits = Counter("embedding_cache_disk_hits_total", "Embedding cache hits served from the disk tier.")
+        self.misses = Counter("embedding_cache_misses_total", "Embedding cache misses.")
+
+        if disk_path and os.path.isdir(disk_path):
+            for name in os.listdir(disk_path):
+                if name.startswith("vectors-") and name.endswith(".f32"):
+                    self._disk(int(name[len("vectors-"):-len(".f32")]))
+
+    def _disk(self, dimension):
+        if not self.disk_path:
+            return None
+        store = self._disks.get(dimension)
+        if store is None:
+            store = DiskEmbeddingStore(self.disk_path, dimension, self.disk_capacity)
+            self._disks[dimension] = store
+        return store
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits.inc()
+                return vector
+            stores = list(self._disks.values())
+
+        for store in stores:
+            vector = store.get(key)
+            if vector is not None:
+                with self._lock:
+                    self._remember(key, vector)
+                self.hits.inc()
+                self.disk_hits.inc()
+                return vector
+        self.misses.inc()
+        return None
+
+    def put(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            store = self._disk(vector.shape[0])
+        if store is not None:
+            store.put(key, vector)
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._memory)
+        hits, misses = self.hits.value, self.misses.value
+        total = hits + misses
+        return {
+            "hits": hits,
+            "disk_hits": self.disk_hits.value,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+class CachedEmbeddings:
+    """Drop-in wrapper for a LangChain embeddings object that consults the cache first."""
+
+    def __init__(self, model, model_name, cache):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_query(self, text):
+        key = embedding_key(self.model_name, text)
+        vector = self.cache.get(key)
+        active = current_span()
+        if active is not None:
+            active.set("embedding.cache_hit", vector is not None)
+        if vector is None:
+            vector = self.model.embed_query(text)
+            self.cache.put(key, vector)
+            return list(vector)
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        results = [self.cache.get(key) for key in keys]
+
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing:
+            computed = self.model.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                self.cache.put(keys[i], vector)
+                results[i] = np.asarray(vector, dtype=np.float32)
+
+        return [np.asarray(vector).tolist() for vector in results]
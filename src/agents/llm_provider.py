@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
+import weakref
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+from src.utils.tracing import KIND_CLIENT, span, start_span
+
+load_dotenv(override=True)
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
+LLM_DEFAULT_MODEL = "llama-3.1-8b-instant"
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_MS = float(os.getenv("LLM_RETRY_BASE_MS", "250"))
+LLM_RETRY_MAX_MS = float(os.getenv("LLM_RETRY_MAX_MS", "4000"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_STUB_TTFT_MS = float(os.getenv("LLM_STUB_TTFT_MS", "150"))
+LLM_STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "200"))
+LLM_STUB_MAX_TOKENS = int(os.getenv("LLM_STUB_MAX_TOKENS", "80"))
+
+# Mirrors the shape of LangChain messages so callers can keep reading `.content`.
+Completion = namedtuple("Completion", ["content"])
+
+
+def as_messages(prompt):
+    """Accepts a plain prompt string or a list of {"role", "content"} chat messages."""
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return list(prompt)
+
+
+def retry_delay(attempt, base_ms=LLM_RETRY_BASE_MS, max_ms=LLM_RETRY_MAX_MS):
+    """Exponential backoff with full jitter, in seconds."""
+    return random.uniform(0, min(max_ms, base_ms * (2 ** attempt))) / 1000.0
+
+
+class LLMProvider:
+    """Interface every chat model backend implements.
+
+    `prompt` is either a string or a list of chat messages. `timeout` is the
+    per-call limit in seconds; None uses the provider default. Backends
+    implement the underscored methods; the public ones add trace spans,
+    including time to first token for streams.
+    """
+
+    model = None
+
+    def invoke(self, prompt, model=None, timeout=None, max_tokens=None):
+        with span("llm.invoke", KIND_CLIENT, **{"llm.model": model or self.model}):
+            return self._invoke(prompt, model, timeout, max_tokens)
+
+    async def ainvoke(self, prompt, model=None, timeout=None, max_tokens=None):
+        with span("llm.invoke", KIND_CLIENT, **{"llm.model": model or self.model}):
+            return await self._ainvoke(prompt, model, timeout, max_tokens)
+
+    async def astream(self, prompt, model=None, timeout=None, max_tokens=None):
+        """Async iterator of Completion chunks."""
+        trace_span = start_span("llm.stream", KIND_CLIENT, **{"llm.model": model or self.model})
+        # Closed explicitly so a consumer that stops early releases the backend's connection now, not at GC.
+        stream = self._astream(prompt, model, timeout, max_tokens)
+        if trace_span is None:
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
+
+        started = time.perf_counter()
+        chunks, error = 0, None
+        try:
+            async for chunk in stream:
+                if not chunks:
+                    trace_span.set("llm.ttft_ms", round((time.perf_counter() - started) * 1000, 1))
+                chunks += 1
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            await stream.aclose()
+            trace_span.set("llm.chunks", chunks)
+            trace_span.end(error)
+
+    def _invoke(self, prompt, model, timeout, max_tokens):
+        raise NotImplementedError
+
+    async def _ainvoke(self, prompt, model, timeout, max_tokens):
+        raise NotImplementedError
+
+    def _astream(self, prompt, model, timeout, max_tokens):
+        raise NotImplementedError
+
+
+class GroqProvider(LLMProvider):
+    """Groq chat completions over shared, pooled HTTP clients.
+
+    One sync client and one async client per event loop are kept for the
+    lifetime of the provider, so every agent, skill and summarizer reuses
+    the same keep-alive connections. The SDK's own retries are disabled in
+    favour of jittered backoff here; a stream is only retried if it failed
+    before yielding its first token.
+    """
+
+    def __init__(self, api_key, model=LLM_DEFAULT_MODEL, timeout=LLM_TIMEOUT_SECONDS,
+                 max_retries=LLM_MAX_RETRIES, max_connections=LLM_MAX_CONNECTIONS):
+        import groq
+        import httpx
+
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._groq = groq
+        self._httpx = httpx
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._retryable = (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)
+        self._client = groq.Groq(
+            api_key=api_key, max_retries=0, timeout=timeout,
+            http_client=httpx.Client(limits=self._limits, timeout=timeout),
+        )
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _async_client(self):
+        # httpx async pools are bound to the loop that opened their connections.
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._groq.AsyncGroq(
+                api_key=self.api_key, max_retries=0, timeout=self.timeout,
+                http_client=self._httpx.AsyncClient(limits=self._limits, timeout=self.timeout),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _request(self, prompt, model, timeout, max_tokens, **extra):
+        request = {
+            "messages": as_messages(prompt),
+            "model": model or self.model,
+            "timeout": timeout or self.timeout,
+            **extra,
+        }
+        if max_tokens:
+            request["max_tokens"] = max_tokens
+        return request
+
+    def _invoke(self, prompt, model, timeout, max_tokens):
+        request = self._request(prompt, model, timeout, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            try:
+                completion = self._client.chat.completions.create(**request)
+                return Completion(completion.choices[0].message.content or "")
+            except self._retryable:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(retry_delay(attempt))
+
+    async def _ainvoke(self, prompt, model, timeout, max_tokens):
+        request = self._request(prompt, model, timeout, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            try:
+                completion = await self._async_client().chat.completions.create(**request)
+                return Completion(completion.choices[0].message.content or "")
+            except self._retryable:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(retry_delay(attempt))
+
+    async def _astream(self, prompt, model, timeout, max_tokens):
+        request = self._request(prompt, model, timeout, max_tokens, stream=True)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                stream = await self._async_client().chat.completions.create(**request)
+                async with stream:
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            started = True
+                            yield Completion(delta)
+                return
+            except self._retryable:
+                if started or attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(retry_delay(attempt))
+
+
+class StubProvider(LLMProvider):
+    """Deterministic offline model for load tests and benchmarks.
+
+    The reply is a pseudo-random word sequence seeded by the model and prompt,
+    so identical requests get identical replies. Latency follows a fixed
+    time-to-first-token plus a constant token rate.
+    """
+
+    VOCABULARY = (
+        "sure", "thanks", "the", "team", "meeting", "update", "will", "follow", "up", "today",
+        "project", "idea", "sounds", "good", "let", "me", "check", "and", "get", "back",
+        "to", "you", "soon", "plan", "next", "week", "review", "notes", "happy", "help",
+    )
+
+    def __init__(self, model="stub", ttft_ms=LLM_STUB_TTFT_MS, tokens_per_second=LLM_STUB_TOKENS_PER_SECOND,
+                 max_tokens=LLM_STUB_MAX_TOKENS):
+        self.model = model
+        self.ttft = ttft_ms / 1000.0
+        self.token_interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+        self.max_tokens = max_tokens
+
+    def _tokens(self, prompt, model, max_tokens):
+        text = "\n".join(m["content"] for m in as_messages(prompt))
+        seed = hashlib.sha256(f"{model or self.model}\n{text}".encode("utf-8")).digest()
+        rng = random.Random(seed)
+        limit = min(max_tokens or self.max_tokens, self.max_tokens)
+        count = rng.randint(max(1, limit // 2), limit)
+        words = [rng.choice(self.VOCABULARY) for _ in range(count)]
+        return [words[0].capitalize()] + [f" {w}" for w in words[1:]]
+
+    def _latency(self, tokens):
+        return self.ttft + self.token_interval * (len(tokens) - 1)
+
+    def _invoke(self, prompt, model, timeout, max_tokens):
+        tokens = self._tokens(prompt, model, max_tokens)
+        time.sleep(self._latency(tokens))
+        return Completion("".join(tokens) + ".")
+
+    async def _ainvoke(self, prompt, model, timeout, max_tokens):
+        tokens = self._tokens(prompt, model, max_tokens)
+        await asyncio.sleep(self._latency(tokens))
+        return Completion("".join(tokens) + ".")
+
+    async def _astream(self, prompt, model, timeout, max_tokens):
+        tokens = self._tokens(prompt, model, max_tokens)
+        tokens[-1] += "."
+        await asyncio.sleep(self.ttft)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            yield Completion(token)
+
+
+def create_provider(api_key=None, model=LLM_DEFAULT_MODEL, name=None):
+    """Builds the provider selected by LLM_PROVIDER ("groq" or "stub")."""
+    name = (name or LLM_PROVIDER).lower()
+    if name == "stub":
+        return StubProvider()
+    if name == "groq":
+        return GroqProvider(api_key or os.getenv("GROQ_API_KEY"), model=model)
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
@@ -2,29 +2,50 @@ import time
 import uuid
 import json
 
-from pinecone import Pinecone,ServerlessSpec
-from langchain_huggingface import HuggingFaceEmbeddings
+from src.agents.vector_store import PineconeBackend, LocalVectorBackend
+from src.utils.metrics import REGISTRY
+from src.utils.tracing import span
 
 import os
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-class MemoryManager:
-    def __init__(self):
-        self.pc = Pinecone(api_key=os.getenv("PINECONE_KEY")) 
-        self.index_name = "proxy-persona-memory"
-        self.embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-        existing_indexes = [idx["name"] for idx in self.pc.list_indexes()]
-        if self.index_name not in existing_indexes:
-            self.pc.create_index(
-                name=self.index_name,
-                dimension=384,
-                metric="cosine",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1")
-            )
+INDEX_NAME = "proxy-persona-memory"
+EMBEDDING_DIMENSION = 384
+
+def create_backend(pc=None):
+    """Builds the vector backend selected by MEMORY_BACKEND ("pinecone" or "local")."""
+    if os.getenv("MEMORY_BACKEND", "pinecone") == "local":
+        return LocalVectorBackend(
+            root=os.getenv("MEMORY_LOCAL_PATH", "memory_index"),
+            dimension=EMBEDDING_DIMENSION,
+            quantize=os.getenv("MEMORY_LOCAL_QUANTIZE", "false").lower() == "true",
+            max_open_shards=int(os.getenv("MEMORY_LOCAL_MAX_OPEN_SHARDS", "256")),
+        )
+    if pc is None:
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=os.getenv("PINECONE_KEY"))
+    return PineconeBackend(pc, INDEX_NAME, EMBEDDING_DIMENSION)
 
-        self.index = self.pc.Index(self.index_name)
+MEMORY_STAGE_SECONDS = REGISTRY.histogram_family(
+    "memory_stage_seconds", ("operation", "stage"), description="Embedding and vector store time per memory operation."
+)
+_save_embed = MEMORY_STAGE_SECONDS.labels("save_conversations", "embed")
+_save_upsert = MEMORY_STAGE_SECONDS.labels("save_conversations", "upsert")
+_recent_embed = MEMORY_STAGE_SECONDS.labels("get_recent_conversations", "embed")
+_recent_query = MEMORY_STAGE_SECONDS.labels("get_recent_conversations", "vector_query")
+
+def conversation_id(user_id, timestamp, user_input):
+    """Stable vector id for one turn, so saving it again (a retried flush) overwrites instead of adding a copy."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}\x00{timestamp!r}\x00{user_input}"))
+
+class MemoryManager:
+    def __init__(self, backend=None, embedding_model=None):
+        self.backend = backend or create_backend()
+        if embedding_model is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embedding_model = embedding_model
     
 
     def save_user_profile(self,user_id, user_profile):
@@ -32,47 +53,58 @@ class MemoryManager:
          embedding = self.embedding_model.embed_query(json.dumps(user_profile))  
          vector_id = f"profile-{user_id}"
 
-         self.index.upsert([
+         self.backend.upsert([
                 (vector_id, embedding, {"user_id": user_id, "profile_data": json.dumps(user_profile), "timestamp": time.time()})
             ])
 
     def get_user_profile(self, user_id):
-        """Retrieves structured user profile from Pinecone."""
+        """Retrieves structured user profile from the vector store."""
         vector_id = f"profile-{user_id}"
-        results = self.index.fetch([vector_id])
-        if results.vectors and vector_id in results.vectors:
-            profile_data = results.vectors[vector_id].metadata.get("profile_data")
+        results = self.backend.fetch([vector_id], user_id)
+        if vector_id in results:
+            profile_data = results[vector_id].get("profile_data")
             return json.loads(profile_data) if profile_data else None
         return None
 
     def save_conversation(self,user_id, user_input, ai_response,type = "general"):
         """Stores past conversation for memory consistency."""
-        embedding = self.embedding_model.embed_query(user_input)  
-        vector_id = str(uuid.uuid4())  
+        self.save_conversations([(user_id, user_input, ai_response, type)])
 
-        self.index.upsert([
-            (
-                vector_id,
-                embedding,
-                {
-                    "user_id": user_id,  
-                    "user_input": user_input,
-                    "response": ai_response,
-                    "type": type,
-                    "timestamp": time.time()
-                }
-            )
-        ]) 
+    def save_conversations(self, conversations):
+        """Stores many (user_id, user_input, ai_response, type[, timestamp]) turns with one embedding batch and upsert.
 
-    def get_recent_conversations(self,user_id, user_input, limit=10):
-        """Retrieves past stored messages for better context awareness."""
-        index_stats = self.index.describe_index_stats()
-        if index_stats["namespaces"].get("", {}).get("vector_count", 0) == 0:
-            return []
+        The vector id is derived from user_id, timestamp and input, so callers
+        that retry pass the turn's original timestamp.
+        """
+        now = time.time()
+        conversations = [c if len(c) == 5 else (*c, now) for c in conversations]
+        with _save_embed.time(), span("embedding.embed_documents", count=len(conversations)):
+            embeddings = self.embedding_model.embed_documents([c[1] for c in conversations])
 
-        query_vector = self.embedding_model.embed_query(user_input)
+        with _save_upsert.time(), span("vector.upsert", count=len(conversations)):
+            self.backend.upsert([
+                (
+                    conversation_id(user_id, timestamp, user_input),
+                    embedding,
+                    {
+                        "user_id": user_id,  
+                        "user_input": user_input,
+                        "response": ai_response,
+                        "type": type,
+                        "timestamp": timestamp
+                    }
+                )
+                for (user_id, user_input, ai_response, type, timestamp), embedding in zip(conversations, embeddings)
+            ]) 
+
+    def get_recent_conversations(self,user_id, user_input, limit=10, type=None):
+        """Retrieves past stored messages for better context awareness."""
+        with _recent_embed.time(), span("embedding.embed_query"):
+            query_vector = self.embedding_model.embed_query(user_input)
 
-        results = self.index.query(vector=query_vector, top_k=limit, include_metadata=True)
+        filter = {"type": type} if type else None
+        with _recent_query.time(), span("vector.query", top_k=limit):
+            matches = self.backend.query(query_vector, top_k=limit, user_id=user_id, filter=filter)
 
         past_messages = [
             (
@@ -80,10 +112,10 @@ class MemoryManager:
                 r["metadata"].get("response", ""),   
                 r["metadata"].get("type", "")        
             )
-            for r in results["matches"]
-            if r["metadata"].get("user_id") == user_id  
+            for r in matches
+            if "user_input" in r["metadata"]
         ]
 
         past_messages.sort(key=lambda x: x[1], reverse=True)
     
-        return past_messages
\ No newline at end of file
+        return past_messages
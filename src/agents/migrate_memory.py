@@ -0,0 +1,69 @@
+"""One-shot migration of conversation/profile vectors into per-user namespaces.
+
+Older deployments wrote every vector into the default ("") namespace of the
+shared index and filtered by user_id after querying. This moves each vector
+into the namespace of the user in its metadata.
+
+    python -m src.agents.migrate_memory [--dry-run] [--keep-source] [--batch-size N]
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from pinecone import Pinecone
+
+from src.agents.memory import INDEX_NAME
+from src.agents.vector_store import user_namespace
+
+load_dotenv(override=True)
+
+
+def migrate(index, batch_size=100, dry_run=False, keep_source=False, source_namespace=""):
+    moved = 0
+    skipped = 0
+
+    for ids in index.list(namespace=source_namespace, limit=batch_size):
+        if not ids:
+            continue
+        fetched = index.fetch(ids=ids, namespace=source_namespace).vectors
+
+        by_namespace = {}
+        for vid, vec in fetched.items():
+            user_id = (vec.metadata or {}).get("user_id")
+            if not user_id:
+                skipped += 1
+                continue
+            by_namespace.setdefault(user_namespace(user_id), []).append(
+                (vid, vec.values, vec.metadata)
+            )
+
+        migrated_ids = []
+        for namespace, vectors in by_namespace.items():
+            if not dry_run:
+                index.upsert(vectors=vectors, namespace=namespace)
+            migrated_ids.extend(v[0] for v in vectors)
+
+        if migrated_ids and not dry_run and not keep_source:
+            index.delete(ids=migrated_ids, namespace=source_namespace)
+
+        moved += len(migrated_ids)
+        print(f"[memory-migrate] moved {moved} vectors so far ({skipped} without user_id skipped)")
+
+    return {"moved": moved, "skipped": skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move shared-namespace memory vectors into per-user namespaces.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without writing.")
+    parser.add_argument("--keep-source", action="store_true", help="Copy instead of move.")
+    args = parser.parse_args()
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_KEY"))
+    index = pc.Index(INDEX_NAME)
+    result = migrate(index, args.batch_size, args.dry_run, args.keep_source)
+    print(f"[memory-migrate] done: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,38 @@
-from langchain_groq import ChatGroq
+import asyncio
+import time
 from src.agents.memory import MemoryManager
-from langchain_huggingface import HuggingFaceEmbeddings
+from src.agents.llm_provider import create_provider
+from src.agents.prompt_builder import PromptBuilder
 from src.database.mongo_manager import (
     get_user_profile,
-    save_user_profile,
     set_mode_mongo,
+    profile_cache,
 )
+from src.database import async_mongo_manager
+from src.utils.metrics import REGISTRY
+
+AGENT_STAGE_SECONDS = REGISTRY.histogram_family(
+    "agent_stage_seconds", ("method", "stage"), description="Time spent in each stage of a PersonaAgent reply."
+)
+CHAT_STAGES = {
+    stage: AGENT_STAGE_SECONDS.labels("generate_response", stage)
+    for stage in ("profile", "retrieval", "prompt", "llm_first_token", "llm", "save")
+}
+MIMIC_STAGES = {
+    stage: AGENT_STAGE_SECONDS.labels("generate_mimic_response", stage)
+    for stage in ("profile", "retrieval", "prompt", "llm", "save")
+}
 
 class PersonaAgent:
-    def __init__(self, api_key, user_profile,user_id):
-        self.llm = ChatGroq(groq_api_key=api_key, model="llama-3.1-8b-instant",streaming=True)  
-        self.mode = "professional"
-        self.memory = MemoryManager()
+    def __init__(self, api_key, user_profile,user_id, llm=None, memory=None, writer=None, prompts=None):
+        """`user_profile` is the stored profile, already read by the caller; building an agent does no I/O."""
+        self.llm = llm or create_provider(api_key=api_key)
+        self.memory = memory or MemoryManager()
+        self.writer = writer or self.memory
+        self.prompts = prompts or PromptBuilder()
         self.user_id = user_id
         self.user_profile = user_profile
-        self.embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-        stored_profile = get_user_profile(self.user_id)
-        if stored_profile:
-            self.user_profile = stored_profile
-            self.mode = stored_profile.get("mode", "professional")
-        else:
-            self.mode = "professional"
-            self.user_profile["mode"] = self.mode
-            save_user_profile(self.user_id, self.user_profile,"user")
+        self.mode = user_profile.get("mode", "professional")
 
     def switch_mode(self, new_mode):
         """Switches between 'professional' and 'fun' modes and saves it persistently."""
@@ -34,90 +43,60 @@ class PersonaAgent:
             return f"Mode switched to {new_mode.capitalize()} Mode 🎭"
         return "Invalid mode! Choose 'professional' or 'fun'."
 
-    async def generate_response(self, user_input):
-        """Generate AI response based on the current mode and user details."""
-        stored_profile = get_user_profile(self.user_id)
+    async def generate_response(self, user_input, session_turns=None):
+        """Generate AI response based on the current mode and user details.
+
+        `session_turns` are (user, ai) pairs from the live chat session; they get
+        their own prompt section so turns that are still queued in the
+        write-behind buffer are not lost from context.
+        """
+        started = time.perf_counter()
+        stored_profile = await async_mongo_manager.get_user_profile(self.user_id)
         if stored_profile:
             self.user_profile = stored_profile
             self.mode = stored_profile.get("mode", "professional") 
+        started = self._stage_done(CHAT_STAGES["profile"], started)
 
-        past_conversations = self.memory.get_recent_conversations(self.user_id,user_input,10)
-
-        if "discord" in user_input.lower():
-            past_context = "\n".join([f"User: {u}\nAI: {r}" for u, r, t in past_conversations if t == "discord"])
-        else:
-            past_context = "\n".join([f"User: {u}\nAI: {r}" for u, r, t in past_conversations if t == "general"])
+        history_type = "discord" if "discord" in user_input.lower() else "general"
+        past_conversations = await asyncio.to_thread(
+            self.memory.get_recent_conversations, self.user_id, user_input, 10, history_type
+        )
+        started = self._stage_done(CHAT_STAGES["retrieval"], started)
 
-        system_prompt = self._get_system_prompt(past_context)
+        system_prompt = self.prompts.chat_prompt(
+            self.user_id, self.user_profile, self.mode, profile_cache.version(self.user_id),
+            [(u, r) for u, r, t in past_conversations], session_turns,
+        )
+        started = self._stage_done(CHAT_STAGES["prompt"], started)
 
         full_response = ""
+        llm_started = started
         async for chunk in self._call_ai_stream(system_prompt, user_input):
+            if not full_response:
+                CHAT_STAGES["llm_first_token"].observe(time.perf_counter() - llm_started)
             full_response += chunk
             yield chunk
+        started = self._stage_done(CHAT_STAGES["llm"], llm_started)
 
         
-        self.memory.save_conversation(self.user_id, user_input, full_response)
+        self.writer.save_conversation(self.user_id, user_input, full_response)
+        self._stage_done(CHAT_STAGES["save"], started)
         
         return 
     
+    @staticmethod
+    def _stage_done(histogram, started):
+        """Records the time since `started` and returns the new stage start."""
+        now = time.perf_counter()
+        histogram.observe(now - started)
+        return now
+
     async def _call_ai_stream(self, system_prompt, user_input):
         full_prompt = f"{system_prompt}\nUser: {user_input}\nAI: "
         async for chunk in self.llm.astream(full_prompt):
             yield chunk.content if hasattr(chunk, "content") else str(chunk)
 
 
-    def _get_system_prompt(self, past_context):
-        """Builds a rich system prompt with detailed user context."""
-        user_name = self.user_profile.get("name", "Unknown User")
-        job_title = self.user_profile.get("professional", {}).get("job_title", "Not Specified")
-        company = self.user_profile.get("professional", {}).get("company", "Unknown Company")
-        skills = ", ".join(self.user_profile.get("professional", {}).get("skills", ["Not Specified"]))
-        experience = self.user_profile.get("professional", {}).get("experience", "Not Specified")
-        interests = ", ".join(self.user_profile.get("interests", ["Not Specified"]))
-        away = self.user_profile.get("away", False)
-
-        if self.mode == "fun":
-            mode_prompt = (
-                "Your tone should be playful and engaging. Use casual phrases, jokes, and emojis when appropriate. "
-                "Avoid mentioning the user's company, job title, or professional skills."
-            )
-        else:
-            mode_prompt = (
-                "Maintain a professional and concise tone. Use clear and formal language. Avoid casual expressions."
-            )
-
-        away_behavior = (
-            "The user is currently **away**. Respond on their behalf as a helpful assistant who can represent their voice and preferences."
-            if away else
-            "The user is **present**. Act as their second brain—supportive, context-aware,learn about him/her and insightful."
-        )
-
-
-        return f"""
-        You are an AI assistant. Your response style must follow the selected mode.
-        {away_behavior}
-
-        ---
-        **User Profile**:
-        - **Name**: {user_name}
-        - **Job Title**: {job_title}
-        - **Company**: {company}
-        - **Skills**: {skills}
-        - **Experience**: {experience} years
-        - **Interests**: {interests}
-
-        **Mode**: {'Fun 🕺' if self.mode == 'fun' else 'Professional 💼'}
-        ---
-
-        **Conversation History**:
-        {past_context}
-
-        **Mode-Specific Instructions**:
-        {mode_prompt}
-
-        Now, generate a relevant and thoughtful response to the user's input and Do not use any Markdown formatting like **bold** or *italic* in your response.
-        """
-    
     def draft_email(self, prompt):
         """Drafts an email based on the user's professional persona."""
         # get the profile name
@@ -145,85 +124,26 @@ class PersonaAgent:
 
     def generate_mimic_response(self, message: str,type: str = "general"):
         """Generate a mimic-style response while the user is away."""
+        started = time.perf_counter()
         stored_profile = get_user_profile(self.user_id)
         if stored_profile:
             self.user_profile = stored_profile
             self.mode = stored_profile.get("mode", "professional")
+        started = self._stage_done(MIMIC_STAGES["profile"], started)
 
         past_conversations = self.memory.get_recent_conversations(self.user_id, message, 5)
-        past_context = "\n".join([f"User: {u}\nAI: {r}" for u, r,_ in past_conversations]) if past_conversations else "No prior interactions."
-
-        user_name = self.user_profile.get("name", "The User")
+        started = self._stage_done(MIMIC_STAGES["retrieval"], started)
 
-        if self.mode == "fun":
-            mode_prompt = "Make it playful, use emojis(little bit), and sound casual like a friend. Keep it light, make the user feel welcomed."
-        else:
-            mode_prompt = "Maintain a courteous, polite, and professional tone. Avoid jokes or slang."
-        
-        job_title = self.user_profile.get("professional", {}).get("job_title", "Not Specified")
-        skills = ", ".join(self.user_profile.get("professional", {}).get("skills", ["Not Specified"]))
-
-        system_prompt = f"""
-        You are impersonating the user's assistant (MimicBot). 
-        Your job is to respond to messages as their stand-in when they’re away.
-
-        Additional context:
-        - **Mode**: {self.mode}
-        - **User ID**: {self.user_id}
-        - **User Name**: {user_name}
-        - **Job Title**: {job_title}
-        - **Skills**: {skills}
-        
-        Conversation History:
-        {past_context}
-
-        Instructions:
-        - Respond naturally on behalf of the ${user_name.upper()}.
-        - {mode_prompt}
-        """
+        system_prompt = self.prompts.mimic_prompt(
+            self.user_id, self.user_profile, self.mode, profile_cache.version(self.user_id),
+            [(u, r) for u, r, _ in past_conversations],
+        )
+        started = self._stage_done(MIMIC_STAGES["prompt"], started)
 
         response = self._call_ai(system_prompt, message)
+        started = self._stage_done(MIMIC_STAGES["llm"], started)
 
-        self.memory.save_conversation(self.user_id, message, response,type)
+        self.writer.save_conversation(self.user_id, message, response,type)
+        self._stage_done(MIMIC_STAGES["save"], started)
 
         return response
-
-    def summarize_conversation(self, sessions: list):
-        """Summarizes away-time conversations for the user."""
-        summaries = []
-
-        for session in sessions:
-            start_time = session.get("start_time", "Unknown")
-            end_time = session.get("end_time", "Unknown")
-            messages = session.get("messages", [])
-
-            if not messages:
-                summaries.append({
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "summary": "No messages during this session."
-                })
-                continue
-
-            formatted_messages = "\n".join(messages)
-
-            system_prompt = f"""
-            You are a helpful assistant summarizing away-time messages for the user.
-            The following are messages sent to the user between {start_time} and {end_time}:
-
-            ---
-            {formatted_messages}
-            ---
-
-            Your task:
-            Summarize the main points and intentions in 2-4 sentences. Be clear and concise.
-            """
-
-            summary = self._call_ai(system_prompt, "Please summarize the above messages.")
-            summaries.append({
-                "start_time": start_time,
-                "end_time": end_time,
-                "summary": summary
-            })
-
-        return summaries
\ No newline at end of file
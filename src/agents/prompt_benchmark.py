@@ -0,0 +1,124 @@
+"""Compares prompt size and assembly time of the unbounded legacy prompt with PromptBuilder.
+
+    python -m src.agents.prompt_benchmark [--requests N] [--users N] [--seed N] [--json PATH]
+
+The workload is synthetic: every request retrieves up to 10 past turns, some
+of them near-duplicates (repeated greetings, re-asked questions), and a share
+of the responses are long. The static profile text is identical in both
+variants, so the difference comes from budgeting, de-duplication and
+truncation of the history section.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from src.agents.prompt_builder import PromptBuilder, _chat_prefix
+from src.agents.summarizer import estimate_tokens
+
+QUESTIONS = [
+    "hey, how are you doing today?",
+    "can you remind me what I said about the quarterly report?",
+    "what should I prepare for tomorrow's standup?",
+    "draft a quick reply to the design team about the new mockups",
+    "what are my main skills again?",
+    "summarize the last discussion about the migration plan",
+    "any ideas for the team offsite?",
+]
+FILLER = (
+    "Sure, here is a detailed answer that walks through the context, the trade-offs involved "
+    "and a few concrete next steps you could take this week. "
+)
+
+
+def legacy_prompt(profile, mode, history):
+    """The pre-PromptBuilder prompt: every retrieved turn pasted in full."""
+    past_context = "\n".join([f"User: {u}\nAI: {r}" for u, r in history])
+    return f"{_chat_prefix(profile, mode)}\n**Conversation History**:\n{past_context}"
+
+
+def synthetic_history(rng, turns=10):
+    history = []
+    for _ in range(turns):
+        if history and rng.random() < 0.3:
+            user, ai = rng.choice(history)
+            history.append((user + rng.choice(["", "?", " please"]), ai))
+            continue
+        length = rng.choice([1, 1, 2, 3, 8, 20])
+        history.append((rng.choice(QUESTIONS), FILLER * length))
+    return history
+
+
+def synthetic_profile(user):
+    return {
+        "name": f"User {user}",
+        "mode": "professional",
+        "professional": {"job_title": "Engineer", "company": "Acme", "skills": ["python", "mongodb"], "experience": 5},
+        "interests": ["music", "climbing"],
+    }
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(requests=2000, users=50, seed=7):
+    rng = random.Random(seed)
+    builder = PromptBuilder()
+    profiles = {u: synthetic_profile(u) for u in range(users)}
+
+    before, after, before_time, after_time = [], [], 0.0, 0.0
+    for _ in range(requests):
+        user = rng.randrange(users)
+        history = synthetic_history(rng)
+
+        started = time.perf_counter()
+        old = legacy_prompt(profiles[user], "professional", history)
+        before_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        new = builder.chat_prompt(str(user), profiles[user], "professional", 1, history)
+        after_time += time.perf_counter() - started
+
+        before.append(estimate_tokens(old))
+        after.append(estimate_tokens(new))
+
+    def summary(tokens, seconds):
+        return {
+            "mean_tokens": round(statistics.mean(tokens), 1),
+            "p95_tokens": percentile(tokens, 0.95),
+            "max_tokens": max(tokens),
+            "build_us": round(seconds / requests * 1e6, 1),
+        }
+
+    return {
+        "requests": requests,
+        "before": summary(before, before_time),
+        "after": summary(after, after_time),
+        "prefix_cache": builder.prefix_cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt tokens per request before/after PromptBuilder.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    result = run(args.requests, args.users, args.seed)
+    for label in ("before", "after"):
+        r = result[label]
+        print(f"[prompt] {label:<6} mean={r['mean_tokens']} p95={r['p95_tokens']} max={r['max_tokens']} tokens, build={r['build_us']}us")
+    print(f"[prompt] prefix cache {result['prefix_cache']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from src.agents.summarizer import estimate_tokens
+
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1200"))
+PROMPT_SESSION_TOKENS = int(os.getenv("PROMPT_SESSION_TOKENS", "600"))
+PROMPT_RESPONSE_TOKENS = int(os.getenv("PROMPT_RESPONSE_TOKENS", "200"))
+PROMPT_DEDUP_THRESHOLD = float(os.getenv("PROMPT_DEDUP_THRESHOLD", "0.85"))
+PROMPT_PREFIX_CACHE_SIZE = int(os.getenv("PROMPT_PREFIX_CACHE_SIZE", "4096"))
+
+_WORD = re.compile(r"\w+")
+
+
+def truncate_to_tokens(text, budget):
+    """Cuts text to roughly `budget` tokens on a word boundary."""
+    if estimate_tokens(text) <= budget:
+        return text
+    cut = text[:max(budget, 1) * 4]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " …"
+
+
+def _shingles(text):
+    return set(_WORD.findall(text.lower()))
+
+
+def _similarity(a, b):
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return len(a & b) / len(a | b)
+
+
+def dedupe_turns(turns, threshold=PROMPT_DEDUP_THRESHOLD, compare_chars=1000):
+    """Drops (user, ai) turns whose words are near-identical to an earlier kept turn.
+
+    Turns are expected in relevance order, so the most relevant copy survives.
+    Only the first `compare_chars` of each turn are compared.
+    """
+    kept, seen = [], []
+    for user, ai in turns:
+        words = _shingles(f"{user} {ai}"[:compare_chars])
+        if any(_similarity(words, other) >= threshold for other in seen):
+            continue
+        kept.append((user, ai))
+        seen.append(words)
+    return kept
+
+
+def fit_turns(turns, budget, response_budget=PROMPT_RESPONSE_TOKENS, newest_first=False):
+    """Formats turns until the section budget is spent; long responses are truncated first.
+
+    With newest_first the budget is spent from the end of `turns` backwards,
+    but the kept turns are still returned in their original order.
+    """
+    lines, used = [], 0
+    for user, ai in (reversed(turns) if newest_first else turns):
+        line = f"User: {truncate_to_tokens(user, response_budget)}\nAI: {truncate_to_tokens(ai, response_budget)}"
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(reversed(lines) if newest_first else lines)
+
+
+class PromptPrefixCache:
+    """LRU of rendered static prompt prefixes keyed by (kind, user_id, profile version)."""
+
+    def __init__(self, max_entries=PROMPT_PREFIX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            prefix = self._entries.get(key)
+            if prefix is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return prefix
+            self.misses += 1
+
+        prefix = build()
+        with self._lock:
+            self._entries[key] = prefix
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prefix
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def _profile_key(profile, version):
+    """Cache key part for a profile: its profile_version, or a content hash when the version is unknown."""
+    if version is not None:
+        return f"v{version}"
+    encoded = json.dumps(profile, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def _chat_prefix(profile, mode):
+    user_name = profile.get("name", "Unknown User")
+    job_title = profile.get("professional", {}).get("job_title", "Not Specified")
+    company = profile.get("professional", {}).get("company", "Unknown Company")
+    skills = ", ".join(profile.get("professional", {}).get("skills", ["Not Specified"]))
+    experience = profile.get("professional", {}).get("experience", "Not Specified")
+    interests = ", ".join(profile.get("interests", ["Not Specified"]))
+    away = profile.get("away", False)
+
+    if mode == "fun":
+        mode_prompt = (
+            "Your tone should be playful and engaging. Use casual phrases, jokes, and emojis when appropriate. "
+            "Avoid mentioning the user's company, job title, or professional skills."
+        )
+    else:
+        mode_prompt = (
+            "Maintain a professional and concise tone. Use clear and formal language. Avoid casual expressions."
+        )
+
+    away_behavior = (
+        "The user is currently **away**. Respond on their behalf as a helpful assistant who can represent their voice and preferences."
+        if away else
+        "The user is **present**. Act as their second brain—supportive, context-aware,learn about him/her and insightful."
+    )
+
+    return f"""
+        You are an AI assistant. Your response style must follow the selected mode.
+        {away_behavior}
+
+        ---
+        **User Profile**:
+        - **Name**: {user_name}
+        - **Job Title**: {job_title}
+        - **Company**: {company}
+        - **Skills**: {skills}
+        - **Experience**: {experience} years
+        - **Interests**: {interests}
+
+        **Mode**: {'Fun 🕺' if mode == 'fun' else 'Professional 💼'}
+        ---
+
+        **Mode-Specific Instructions**:
+        {mode_prompt}
+
+        Generate a relevant and thoughtful response to the user's input and Do not use any Markdown formatting like **bold** or *italic* in your response.
+        """
+
+
+def _mimic_prefix(user_id, profile, mode):
+    user_name = profile.get("name", "The User")
+
+    if mode == "fun":
+        mode_prompt = "Make it playful, use emojis(little bit), and sound casual like a friend. Keep it light, make the user feel welcomed."
+    else:
+        mode_prompt = "Maintain a courteous, polite, and professional tone. Avoid jokes or slang."
+
+    job_title = profile.get("professional", {}).get("job_title", "Not Specified")
+    skills = ", ".join(profile.get("professional", {}).get("skills", ["Not Specified"]))
+
+    return f"""
+        You are impersonating the user's assistant (MimicBot).
+        Your job is to respond to messages as their stand-in when they’re away.
+
+        Additional context:
+        - **Mode**: {mode}
+        - **User ID**: {user_id}
+        - **User Name**: {user_name}
+        - **Job Title**: {job_title}
+        - **Skills**: {skills}
+
+        Instructions:
+        - Respond naturally on behalf of the ${user_name.upper()}.
+        - {mode_prompt}
+        """
+
+
+class PromptBuilder:
+    """Assembles agent prompts from a cached static prefix and budgeted history sections.
+
+    The profile/mode part only changes when the profile_version does, so it is
+    rendered once per (user, version) and shared by every agent in the process.
+    Retrieved history is de-duplicated and fitted to its own token budget, and
+    the live session's turns get a separate budget so they are never crowded
+    out by older retrieved ones.
+    """
+
+    def __init__(self, history_tokens=PROMPT_HISTORY_TOKENS, session_tokens=PROMPT_SESSION_TOKENS,
+                 response_tokens=PROMPT_RESPONSE_TOKENS, dedup_threshold=PROMPT_DEDUP_THRESHOLD,
+                 prefix_cache=None):
+        self.history_tokens = history_tokens
+        self.session_tokens = session_tokens
+        self.response_tokens = response_tokens
+        self.dedup_threshold = dedup_threshold
+        self.prefix_cache = prefix_cache or PromptPrefixCache()
+
+    def _history(self, turns, budget):
+        return fit_turns(dedupe_turns(turns, self.dedup_threshold), budget, self.response_tokens)
+
+    def _session(self, turns):
+        # Newest turns matter most: de-duplicate and spend the budget from the end.
+        recent = list(reversed(dedupe_turns(list(reversed(turns)), self.dedup_threshold)))
+        return fit_turns(recent, self.session_tokens, self.response_tokens, newest_first=True)
+
+    def chat_prompt(self, user_id, profile, mode, version, history, session_turns=None):
+        """System prompt for generate_response; `history` and `session_turns` are (user, ai) pairs."""
+        prefix = self.prefix_cache.get_or_build(
+            ("chat", user_id, mode, _profile_key(profile, version)),
+            lambda: _chat_prefix(profile, mode),
+        )
+        sections = [prefix, "**Conversation History**:", self._history(history, self.history_tokens)]
+        if session_turns:
+            sections += ["**This Session**:", self._session(session_turns)]
+        return "\n".join(sections)
+
+    def mimic_prompt(self, user_id, profile, mode, version, history):
+        """System prompt for generate_mimic_response."""
+        prefix = self.prefix_cache.get_or_build(
+            ("mimic", user_id, mode, _profile_key(profile, version)),
+            lambda: _mimic_prefix(user_id, profile, mode),
+        )
+        past_context = self._history(history, self.history_tokens) or "No prior interactions."
+        return f"{prefix}\nConversation History:\n{past_context}"
@@ -0,0 +1,358 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+LLM_MODEL_NAME = "llama-3.1-8b-instant"
+AGENT_CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "256"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+EMBEDDING_CACHE_DISK_SIZE = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "100000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "50"))
+COUNTER_FLUSH_MS = float(os.getenv("COUNTER_FLUSH_MS", "1000"))
+COUNTER_FLUSH_EVERY = int(os.getenv("COUNTER_FLUSH_EVERY", "500"))
+MONAD_RPC_URL = os.getenv("MONAD_RPC_URL", "https://testnet-rpc.monad.xyz")
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+READY_SUBSYSTEMS = [s for s in os.getenv("READY_SUBSYSTEMS", "mongo,async_mongo,memory_manager").split(",") if s]
+
+# name -> (address env var, ABI file) for the contracts the skills call.
+CONTRACTS = {
+    "maze": ("MAZE_CONTRACT_ADDRESS", "MazeGameABI.json"),
+    "story_nft": ("STORY_NFT_ADDRESS", "StoryNFT_ABI.json"),
+}
+
+_lock = threading.RLock()
+_resources = {}
+_key_locks = {}
+_status = {}
+_agents = OrderedDict()
+
+
+def _status_name(key, name):
+    return name or (key if isinstance(key, str) else key[0])
+
+
+def _get_or_create(key, factory, name=None):
+    """Builds a shared resource once per process and returns the cached instance.
+
+    Each key has its own lock, so a slow subsystem never holds up another.
+    A factory that raises is recorded as failed and retried on the next call.
+    """
+    resource = _resources.get(key)
+    if resource is not None:
+        return resource
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    name = _status_name(key, name)
+    with key_lock:
+        resource = _resources.get(key)
+        if resource is None:
+            _status[name] = {"state": "initializing"}
+            started = time.perf_counter()
+            try:
+                resource = factory()
+            except Exception as e:
+                _status[name] = {
+                    "state": "failed",
+                    "seconds": round(time.perf_counter() - started, 3),
+                    "error": f"{type(e).__name__}: {e}",
+                }
+                raise
+            _resources[key] = resource
+            _status[name] = {"state": "ready", "seconds": round(time.perf_counter() - started, 3)}
+        return resource
+
+
+def provide(key, resource, name=None):
+    """Installs a pre-built shared resource under `key`, e.g. a stand-in for benchmarks."""
+    with _lock:
+        _resources[key] = resource
+        _status[_status_name(key, name)] = {"state": "ready", "provided": True}
+
+
+class Lazy:
+    """Module-level stand-in for a shared resource, built on first attribute access.
+
+    Lets modules keep names like `collection` or `w3` without connecting at
+    import time.
+    """
+
+    __slots__ = ("_factory", "_value")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+
+    def resolve(self):
+        value = self._value
+        if value is None:
+            value = self._value = self._factory()
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+
+def get_embedding_cache():
+    """Returns the process-wide embedding cache (memory LRU + optional disk tier)."""
+    def factory():
+        from src.agents.embedding_cache import EmbeddingCache
+        return EmbeddingCache(
+            max_entries=EMBEDDING_CACHE_SIZE,
+            disk_path=EMBEDDING_CACHE_DIR,
+            disk_capacity=EMBEDDING_CACHE_DISK_SIZE,
+        )
+    return _get_or_create("embedding_cache", factory)
+
+
+def get_embedding_batcher():
+    """Returns the process-wide micro-batcher wrapping the MiniLM model."""
+    def factory():
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from src.agents.embedding_batcher import MicroBatchEmbeddings
+        model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        return MicroBatchEmbeddings(model, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WAIT_MS)
+    return _get_or_create("embedding_batcher", factory)
+
+
+def get_embedding_model():
+    """Returns the process-wide embedding model: cache first, then the micro-batcher."""
+    def factory():
+        from src.agents.embedding_cache import CachedEmbeddings
+        return CachedEmbeddings(get_embedding_batcher(), EMBEDDING_MODEL_NAME, get_embedding_cache())
+    return _get_or_create("embedding_model", factory)
+
+
+def get_pinecone_client():
+    """Returns the process-wide Pinecone client."""
+    def factory():
+        from pinecone import Pinecone
+        return Pinecone(api_key=os.getenv("PINECONE_KEY"))
+    return _get_or_create("pinecone", factory)
+
+
+def get_vector_backend():
+    """Returns the process-wide vector backend chosen by MEMORY_BACKEND."""
+    def factory():
+        from src.agents.memory import create_backend
+        if os.getenv("MEMORY_BACKEND", "pinecone") == "local":
+            return create_backend()
+        return create_backend(pc=get_pinecone_client())
+    return _get_or_create("vector_backend", factory)
+
+
+def get_memory_manager():
+    """Returns the process-wide MemoryManager (vector backend + embeddings)."""
+    def factory():
+        from src.agents.memory import MemoryManager
+        return MemoryManager(backend=get_vector_backend(), embedding_model=get_embedding_model())
+    return _get_or_create("memory_manager", factory)
+
+
+def get_write_behind():
+    """Returns the process-wide write-behind queue for memory, chat rows and counters."""
+    def factory():
+        from src.database.write_behind import WriteBehindQueue
+        return WriteBehindQueue(
+            memory=get_memory_manager(),
+            max_pending=WRITE_BEHIND_MAX_PENDING,
+            batch_size=WRITE_BEHIND_BATCH_SIZE,
+            flush_interval_ms=WRITE_BEHIND_FLUSH_MS,
+        )
+    return _get_or_create("write_behind", factory)
+
+
+def get_counter_aggregator():
+    """Returns the process-wide analytics counter aggregator."""
+    def factory():
+        from src.database.counters import CounterAggregator
+        return CounterAggregator(flush_interval_ms=COUNTER_FLUSH_MS, max_pending=COUNTER_FLUSH_EVERY)
+    return _get_or_create("counter_aggregator", factory)
+
+
+def get_mongo_db():
+    """Returns the process-wide sync Mongo database, after checking the server answers."""
+    def factory():
+        from pymongo import MongoClient
+        from src.database.mongo_manager import MONGO_URI, DB_NAME, MONGO_POOL_OPTIONS
+        client = MongoClient(MONGO_URI, **MONGO_POOL_OPTIONS)
+        client.admin.command("ping")
+        return client[DB_NAME]
+    return _get_or_create("mongo", factory)
+
+
+def get_async_mongo_db():
+    """Returns the process-wide AsyncMongoClient database; it connects on first use."""
+    def factory():
+        from pymongo import AsyncMongoClient
+        from src.database.mongo_manager import MONGO_URI, DB_NAME, MONGO_POOL_OPTIONS
+        return AsyncMongoClient(MONGO_URI, **MONGO_POOL_OPTIONS)[DB_NAME]
+    return _get_or_create("async_mongo", factory)
+
+
+def get_serpapi_client():
+    """Returns the shared SerpAPI client."""
+    def factory():
+        import serpapi
+        return serpapi.Client(api_key=os.getenv("SERPAPI_API_KEY"))
+    return _get_or_create("serpapi", factory)
+
+
+def get_web3():
+    """Returns the shared Web3 instance for the Monad RPC (pooled HTTP session, traced per RPC)."""
+    def factory():
+        from web3 import Web3
+        from src.utils.tracing import traced_http_provider
+        return Web3(traced_http_provider(MONAD_RPC_URL))
+    return _get_or_create("web3", factory)
+
+
+def get_owner_account():
+    """Returns the contract owner account derived from OWNER_PRIVATE_KEY."""
+    def factory():
+        from eth_account import Account
+        return Account.from_key(os.getenv("OWNER_PRIVATE_KEY"))
+    return _get_or_create("owner_account", factory)
+
+
+def get_contract_abi(filename):
+    """Returns a contract ABI loaded from the JSON file in the working directory."""
+    def factory():
+        with open(filename, "r") as f:
+            return json.load(f)
+    return _get_or_create(("abi", filename), factory, name=f"abi:{filename}")
+
+
+def get_contract(name):
+    """Returns the web3 contract registered under `name` in CONTRACTS."""
+    address_env, abi_file = CONTRACTS[name]
+    def factory():
+        return get_web3().eth.contract(address=os.getenv(address_env), abi=get_contract_abi(abi_file))
+    return _get_or_create(("contract", name), factory, name=f"contract:{name}")
+
+
+def get_llm(api_key=None):
+    """Returns the shared LLM provider (see LLM_PROVIDER) for the given API key."""
+    api_key = api_key or os.getenv("GROQ_API_KEY")
+    def factory():
+        from src.agents.llm_provider import create_provider
+        return create_provider(api_key=api_key, model=LLM_MODEL_NAME)
+    return _get_or_create(("llm", api_key), factory, name="llm")
+
+
+def get_prompt_builder():
+    """Returns the shared prompt builder, whose prefix cache is reused across agents."""
+    def factory():
+        from src.agents.prompt_builder import PromptBuilder
+        return PromptBuilder()
+    return _get_or_create("prompt_builder", factory)
+
+
+def get_summary_service(api_key):
+    """Returns the shared away-session summary service for the given API key."""
+    def factory():
+        from src.agents.session_summaries import AwaySummaryService
+        from src.agents.summarizer import SessionSummarizer
+        return AwaySummaryService(SessionSummarizer(get_llm(api_key)))
+    return _get_or_create(("summary_service", api_key), factory, name="summary_service")
+
+
+def get_agent(api_key, user_profile, user_id):
+    """Returns a hot PersonaAgent for the user, building a cheap one on a miss.
+
+    `user_profile` is the stored profile the handler already read through
+    async_mongo_manager; the agent itself does not touch Mongo to be built.
+    """
+    with _lock:
+        agent = _agents.get(user_id)
+        if agent is not None:
+            _agents.move_to_end(user_id)
+            return agent
+
+    from src.agents.persona_agent import PersonaAgent
+    agent = PersonaAgent(
+        api_key=api_key,
+        user_profile=user_profile,
+        user_id=user_id,
+        llm=get_llm(api_key),
+        memory=get_memory_manager(),
+        writer=get_write_behind(),
+        prompts=get_prompt_builder(),
+    )
+
+    with _lock:
+        existing = _agents.get(user_id)
+        if existing is not None:
+            _agents.move_to_end(user_id)
+            return existing
+        _agents[user_id] = agent
+        while len(_agents) > AGENT_CACHE_SIZE:
+            _agents.popitem(last=False)
+    return agent
+
+
+def evict_agent(user_id):
+    """Drops a user's cached agent so the next request rebuilds it."""
+    with _lock:
+        _agents.pop(user_id, None)
+
+
+# Subsystems reported by /ready and started by warm_up(), in warmup order.
+SUBSYSTEMS = {
+    "mongo": get_mongo_db,
+    "async_mongo": get_async_mongo_db,
+    "memory_manager": get_memory_manager,
+    "write_behind": get_write_behind,
+    "counter_aggregator": get_counter_aggregator,
+    "llm": get_llm,
+    "serpapi": get_serpapi_client,
+    "web3": get_web3,
+    "owner_account": get_owner_account,
+    "contract:maze": lambda: get_contract("maze"),
+    "contract:story_nft": lambda: get_contract("story_nft"),
+}
+
+
+def subsystem_status():
+    """Returns {name: {"state", "seconds", "error"}} for every subsystem; untouched ones are "pending"."""
+    return {name: dict(_status.get(name, {"state": "pending"})) for name in SUBSYSTEMS}
+
+
+def subsystem_ready(name):
+    return _status.get(name, {}).get("state") == "ready"
+
+
+def warm_up(names=None):
+    """Initializes subsystems on daemon threads, one per subsystem, without waiting.
+
+    Subsystems that are ready or already initializing are skipped; failed
+    ones are retried. Returns the started threads.
+    """
+    threads = []
+    for name in names or SUBSYSTEMS:
+        if _status.get(name, {}).get("state") in ("ready", "initializing"):
+            continue
+        thread = threading.Thread(target=_warm, args=(name,), name=f"warmup-{name}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def _warm(name):
+    try:
+        SUBSYSTEMS[name]()
+    except Exception as e:
+        print(f"[warmup] {name} failed: {e}")
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+
+from src.database.async_mongo_manager import (
+    get_away_session_doc,
+    get_away_messages_since,
+    save_away_session_summary,
+)
+from src.database.mongo_manager import format_away_message
+
+
+def messages_hash(messages, seed=""):
+    """Chained sha256 over formatted messages, so a hash can be extended with new messages only."""
+    digest = seed
+    for message in messages:
+        digest = hashlib.sha256(f"{digest}\n{message}".encode("utf-8")).hexdigest()
+    return digest
+
+
+def _stored_summary(session):
+    return {
+        "session_id": str(session["_id"]),
+        "start_time": session.get("start_time"),
+        "end_time": session.get("end_time"),
+        "summary": session.get("summary"),
+    }
+
+
+class AwaySummaryService:
+    """Keeps an LLM summary next to every away session.
+
+    Closed sessions are summarized once in the background; open sessions
+    are brought up to date by folding only the messages that arrived since
+    the stored summary, tracked by the _id of the last one folded in. The
+    stored summary_hash (a chained hash of the formatted messages it covers)
+    tells the endpoint whether the sessions a client sends are already
+    summarized. A summary is only stored if the watermark and hash it was
+    built on are still current, so concurrent refreshes never fold twice.
+    """
+
+    def __init__(self, summarizer):
+        self.summarizer = summarizer
+        self._background = set()
+
+    async def refresh(self, user_id, session_id):
+        """Brings one session's stored summary up to date and returns it."""
+        session = await get_away_session_doc(user_id, session_id)
+        if session is None:
+            return None
+
+        new_docs = await get_away_messages_since(
+            user_id, session_id, session.get("summary_last_message_id"), session.get("summary_last_message_at")
+        )
+        if not new_docs and session.get("summary") is not None:
+            return _stored_summary(session)
+
+        new_messages = [format_away_message(doc) for doc in new_docs]
+        previous = session.get("summary")
+        if previous is not None:
+            summary = await self.summarizer.fold(previous, session, new_messages)
+        else:
+            summary = (await self.summarizer.summarize_session({**session, "messages": new_messages}))["summary"]
+
+        summary_hash = messages_hash(new_messages, session.get("summary_hash") or "")
+        saved = await save_away_session_summary(
+            session["_id"],
+            summary,
+            summary_hash,
+            session.get("summary_message_count", 0) + len(new_messages),
+            new_docs[-1]["_id"] if new_docs else session.get("summary_last_message_id"),
+            new_docs[-1]["timestamp"] if new_docs else session.get("summary_last_message_at"),
+            expected_hash=session.get("summary_hash"),
+            expected_last_message_id=session.get("summary_last_message_id"),
+        )
+        if not saved:
+            # Another refresh stored a summary first; ours was folded from a stale base.
+            session = await get_away_session_doc(user_id, session_id)
+            return _stored_summary(session) if session is not None else None
+        session.update(summary=summary, summary_hash=summary_hash)
+        return _stored_summary(session)
+
+    def refresh_in_background(self, user_id, session_id):
+        """Schedules refresh() without awaiting it (e.g. right after a session closes)."""
+        async def run():
+            try:
+                await self.refresh(user_id, session_id)
+            except Exception as e:
+                print(f"[away-summary] background summary failed for {user_id}/{session_id}:", e)
+
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def summarize(self, user_id, session):
+        """Summary for one client-supplied session, reusing the stored one when it is current."""
+        session_id = session.get("session_id")
+        if session_id:
+            requested_hash = messages_hash(session.get("messages", []))
+            stored = await get_away_session_doc(user_id, session_id)
+            if stored is not None:
+                if stored.get("summary") is not None and stored.get("summary_hash") == requested_hash:
+                    summary = _stored_summary(stored)
+                else:
+                    summary = await self.refresh(user_id, session_id)
+                    refreshed = await get_away_session_doc(user_id, session_id)
+                    if refreshed.get("summary_hash") != requested_hash:
+                        summary = None
+                if summary is not None:
+                    return {
+                        "start_time": session.get("start_time", summary["start_time"]),
+                        "end_time": session.get("end_time", summary["end_time"]),
+                        "summary": summary["summary"],
+                    }
+
+        return await self.summarizer.summarize_session(session)
+
+    async def summarize_all(self, user_id, sessions):
+        return list(await asyncio.gather(*[self.summarize(user_id, s) for s in sessions]))
+
+    async def stream(self, user_id, sessions):
+        """Yields (index, summary) pairs in completion order."""
+        async def indexed(i, session):
+            return i, await self.summarize(user_id, session)
+
+        tasks = [asyncio.create_task(indexed(i, session)) for i, session in enumerate(sessions)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,171 @@
+import asyncio
+import os
+
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "3000"))
+
+_semaphore = None
+
+
+def _llm_slots():
+    """Process-wide cap on concurrent summarization calls, shared by every request."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+    return _semaphore
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English chat text)."""
+    return len(text) // 4 + 1
+
+
+def chunk_messages(messages, budget):
+    """Splits messages into consecutive chunks whose estimated size fits the budget."""
+    chunks, current, size = [], [], 0
+    for message in messages:
+        tokens = estimate_tokens(message)
+        if current and size + tokens > budget:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(message)
+        size += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def session_prompt(start_time, end_time, messages):
+    formatted_messages = "\n".join(messages)
+    return f"""
+            You are a helpful assistant summarizing away-time messages for the user.
+            The following are messages sent to the user between {start_time} and {end_time}:
+
+            ---
+            {formatted_messages}
+            ---
+
+            Your task:
+            Summarize the main points and intentions in 2-4 sentences. Be clear and concise.
+            """
+
+
+def reduce_prompt(start_time, end_time, partial_summaries):
+    formatted_summaries = "\n".join(f"- {summary}" for summary in partial_summaries)
+    return f"""
+            You are a helpful assistant summarizing away-time messages for the user.
+            The messages sent to the user between {start_time} and {end_time} were too long to read at once,
+            so they were summarized in parts:
+
+            ---
+            {formatted_summaries}
+            ---
+
+            Your task:
+            Combine these partial summaries into one summary of the main points and intentions in 2-4 sentences.
+            Be clear and concise.
+            """
+
+
+def fold_prompt(start_time, end_time, previous_summary, new_messages):
+    formatted_messages = "\n".join(new_messages)
+    return f"""
+            You are a helpful assistant summarizing away-time messages for the user.
+            This is the summary so far of the messages sent to the user since {start_time}:
+
+            {previous_summary}
+
+            These new messages arrived afterwards (up to {end_time}):
+
+            ---
+            {formatted_messages}
+            ---
+
+            Your task:
+            Update the summary so it also covers the new messages. Keep it to 2-4 sentences. Be clear and concise.
+            """
+
+
+class SessionSummarizer:
+    """Map-reduce summarizer that runs sessions and chunks concurrently.
+
+    Sessions over the token budget are split into chunks that are
+    summarized in parallel and then reduced into one summary. Every LLM
+    call goes through a process-wide semaphore (SUMMARY_CONCURRENCY).
+    """
+
+    def __init__(self, llm, token_budget=SUMMARY_TOKEN_BUDGET):
+        self.llm = llm
+        self.token_budget = token_budget
+
+    async def _call(self, system_prompt, user_input):
+        async with _llm_slots():
+            response = await self.llm.ainvoke(f"{system_prompt}\nUser: {user_input}\nAI: ")
+        return response.content.strip() if hasattr(response, "content") else str(response).strip()
+
+    async def _reduce(self, start_time, end_time, summaries):
+        while len(summaries) > 1:
+            groups = chunk_messages(summaries, self.token_budget)
+            if len(groups) == len(summaries):
+                groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+            summaries = await asyncio.gather(*[
+                self._call(reduce_prompt(start_time, end_time, group), "Please combine the above summaries.")
+                for group in groups
+            ])
+        return summaries[0]
+
+    async def summarize_session(self, session):
+        start_time = session.get("start_time", "Unknown")
+        end_time = session.get("end_time", "Unknown")
+        messages = session.get("messages", [])
+
+        if not messages:
+            summary = "No messages during this session."
+        else:
+            chunks = chunk_messages(messages, self.token_budget)
+            partials = await asyncio.gather(*[
+                self._call(session_prompt(start_time, end_time, chunk), "Please summarize the above messages.")
+                for chunk in chunks
+            ])
+            summary = await self._reduce(start_time, end_time, list(partials))
+
+        return {
+            "start_time": start_time,
+            "end_time": end_time,
+            "summary": summary
+        }
+
+    async def fold(self, previous_summary, session, new_messages):
+        """Folds messages that arrived after `previous_summary` into it without re-reading older ones."""
+        start_time = session.get("start_time", "Unknown")
+        end_time = session.get("end_time", "Unknown")
+
+        chunks = chunk_messages(new_messages, self.token_budget)
+        if len(chunks) == 1:
+            return await self._call(
+                fold_prompt(start_time, end_time, previous_summary, chunks[0]),
+                "Please update the summary."
+            )
+
+        partials = await asyncio.gather(*[
+            self._call(session_prompt(start_time, end_time, chunk), "Please summarize the above messages.")
+            for chunk in chunks
+        ])
+        return await self._reduce(start_time, end_time, [previous_summary, *partials])
+
+    async def stream(self, sessions):
+        """Yields (index, summary) pairs in completion order."""
+        async def indexed(i, session):
+            return i, await self.summarize_session(session)
+
+        tasks = [asyncio.create_task(indexed(i, session)) for i, session in enumerate(sessions)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def summarize(self, sessions):
+        """Summaries in input order, computed concurrently."""
+        return list(await asyncio.gather(*[self.summarize_session(s) for s in sessions]))
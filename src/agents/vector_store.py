@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class VectorBackend:
+    """Minimal vector index surface used by MemoryManager.
+
+    Storage is partitioned per user: records are (id, values, metadata)
+    tuples whose metadata carries "user_id", and reads only ever touch one
+    user's partition. Matches are dicts with "id", "score" and "metadata"
+    keys, like Pinecone query matches.
+    """
+
+    def upsert(self, records):
+        raise NotImplementedError
+
+    def fetch(self, ids, user_id):
+        """Returns {id: metadata} for the ids that exist in the user's partition."""
+        raise NotImplementedError
+
+    def query(self, vector, top_k, user_id, filter=None):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def close(self):
+        """Releases files and connections; called on shutdown."""
+
+
+def user_namespace(user_id):
+    """Pinecone namespace holding one user's vectors."""
+    return f"user-{user_id}"
+
+
+class PineconeBackend(VectorBackend):
+    """Pinecone serverless index with one namespace per user, created on first use if missing."""
+
+    def __init__(self, pc, index_name, dimension=384):
+        from pinecone import ServerlessSpec
+
+        existing_indexes = [idx["name"] for idx in pc.list_indexes()]
+        if index_name not in existing_indexes:
+            pc.create_index(
+                name=index_name,
+                dimension=dimension,
+                metric="cosine",
+                spec=ServerlessSpec(cloud="aws", region="us-east-1")
+            )
+        self.index = pc.Index(index_name)
+
+    def upsert(self, records):
+        by_namespace = {}
+        for record in records:
+            by_namespace.setdefault(user_namespace(record[2].get("user_id")), []).append(record)
+        for namespace, vectors in by_namespace.items():
+            self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def fetch(self, ids, user_id):
+        results = self.index.fetch(ids=ids, namespace=user_namespace(user_id))
+        if not results.vectors:
+            return {}
+        return {vid: vec.metadata for vid, vec in results.vectors.items()}
+
+    def query(self, vector, top_k, user_id, filter=None):
+        kwargs = {
+            "vector": vector,
+            "top_k": top_k,
+            "namespace": user_namespace(user_id),
+            "include_metadata": True,
+        }
+        if filter:
+            kwargs["filter"] = {k: {"$eq": v} for k, v in filter.items()}
+        results = self.index.query(**kwargs)
+        return [
+            {"id": m["id"], "score": m["score"], "metadata": m["metadata"]}
+            for m in results["matches"]
+        ]
+
+    def count(self):
+        stats = self.index.describe_index_stats()
+        return stats.get("total_vector_count", 0)
+
+
+class _Shard:
+    """One user's vectors: float32 (and optionally int8) memory-mapped matrices plus a metadata log."""
+
+    def __init__(self, path, dimension, quantize, initial_capacity=256):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dimension = dimension
+        self.quantize = quantize
+        self.ids = []
+        self.metadata = []
+        self.rows = {}
+
+        meta_path = os.path.join(path, "meta.jsonl")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._set_row(entry["row"], entry["id"], entry["metadata"])
+        self._meta_log = open(meta_path, "a")
+
+        capacity = max(initial_capacity, len(self.ids))
+        self._open(capacity)
+
+    def _set_row(self, row, vid, metadata):
+        if row == len(self.ids):
+            self.ids.append(vid)
+            self.metadata.append(metadata)
+        else:
+            self.ids[row] = vid
+            self.metadata[row] = metadata
+        self.rows[vid] = row
+
+    def _mmap(self, name, dtype, width, capacity):
+        file_path = os.path.join(self.path, name)
+        size = capacity * width * np.dtype(dtype).itemsize
+        with open(file_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(file_path, dtype=dtype, mode="r+", shape=(capacity, width))
+
+    def _open(self, capacity):
+        self.capacity = capacity
+        self.vectors = self._mmap("vectors.f32", np.float32, self.dimension, capacity)
+        if self.quantize:
+            self.codes = self._mmap("vectors.i8", np.int8, self.dimension, capacity)
+            self.scales = self._mmap("scales.f32", np.float32, 1, capacity)
+
+    def _grow(self):
+        self.vectors.flush()
+        if self.quantize:
+            self.codes.flush()
+            self.scales.flush()
+        self._open(self.capacity * 2)
+
+    def upsert(self, vid, vector, metadata):
+        row = self.rows.get(vid)
+        if row is None:
+            row = len(self.ids)
+            if row >= self.capacity:
+                self._grow()
+
+        self.vectors[row] = vector
+        if self.quantize:
+            scale = float(np.abs(vector).max()) / 127.0 or 1.0
+            self.codes[row] = np.round(vector / scale).astype(np.int8)
+            self.scales[row, 0] = scale
+
+        self._set_row(row, vid, metadata)
+        self._meta_log.write(json.dumps({"row": row, "id": vid, "metadata": metadata}) + "\n")
+        self._meta_log.flush()
+
+    def close(self):
+        self.vectors.flush()
+        if self.quantize:
+            self.codes.flush()
+            self.scales.flush()
+        self._meta_log.close()
+        self.vectors = self.codes = self.scales = None
+
+    def search(self, query, top_k, metadata_filter, rescore_factor):
+        size = len(self.ids)
+        if size == 0:
+            return []
+
+        if self.quantize:
+            scores = (self.codes[:size].astype(np.float32) @ query) * self.scales[:size, 0]
+        else:
+            scores = self.vectors[:size] @ query
+
+        if metadata_filter:
+            mask = np.fromiter(
+                (all(meta.get(k) == v for k, v in metadata_filter.items()) for meta in self.metadata),
+                dtype=bool,
+                count=size,
+            )
+            scores = np.where(mask, scores, -np.inf)
+
+        candidates = min(size, top_k * rescore_factor if self.quantize else top_k)
+        rows = np.argpartition(-scores, candidates - 1)[:candidates]
+        rows = np.sort(rows[np.isfinite(scores[rows])])
+
+        exact = self.vectors[rows] @ query if self.quantize else scores[rows]
+        order = np.argsort(-exact)[:top_k]
+        return [
+            {"id": self.ids[rows[i]], "score": float(exact[i]), "metadata": self.metadata[rows[i]]}
+            for i in order
+        ]
+
+
+class LocalVectorBackend(VectorBackend):
+    """In-process cosine index with one memory-mapped shard per user.
+
+    Search is NumPy brute force over the user's shard. With quantize=True
+    the scan runs over int8 codes and the best top_k * rescore_factor
+    candidates are rescored against the full-precision vectors. At most
+    max_open_shards shards stay open; the least recently used one is
+    flushed and closed when another is opened.
+    """
+
+    def __init__(self, root, dimension=384, quantize=False, rescore_factor=4, max_open_shards=256):
+        self.root = root
+        self.dimension = dimension
+        self.quantize = quantize
+        self.rescore_factor = rescore_factor
+        self.max_open_shards = max_open_shards
+        self._shards = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def _shard_name(user_id):
+        return hashlib.sha1(str(user_id).encode("utf-8")).hexdigest()
+
+    def _open_shard(self, name, create=True):
+        shard = self._shards.get(name)
+        if shard is not None:
+            self._shards.move_to_end(name)
+            return shard
+        path = os.path.join(self.root, name)
+        if not create and not os.path.isdir(path):
+            return None
+        shard = _Shard(path, self.dimension, self.quantize)
+        self._shards[name] = shard
+        while len(self._shards) > self.max_open_shards:
+            _, evicted = self._shards.popitem(last=False)
+            evicted.close()
+        return shard
+
+    def _shard_names(self):
+        return [name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name))]
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def upsert(self, records):
+        with self._lock:
+            for vid, values, metadata in records:
+                shard = self._open_shard(self._shard_name(metadata.get("user_id")))
+                shard.upsert(vid, self._normalize(values), metadata)
+
+    def fetch(self, ids, user_id):
+        with self._lock:
+            shard = self._open_shard(self._shard_name(user_id), create=False)
+            if shard is None:
+                return {}
+            return {vid: shard.metadata[shard.rows[vid]] for vid in ids if vid in shard.rows}
+
+    def query(self, vector, top_k, user_id, filter=None):
+        with self._lock:
+            shard = self._open_shard(self._shard_name(user_id), create=False)
+            if shard is None:
+                return []
+            return shard.search(self._normalize(vector), top_k, filter, self.rescore_factor)
+
+    def count(self):
+        with self._lock:
+            return sum(len(self._open_shard(name).ids) for name in self._shard_names())
+
+    def close(self):
+        with self._lock:
+            while self._shards:
+                _, shard = self._shards.popitem()
+                shard.close()
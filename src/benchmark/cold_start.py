@@ -0,0 +1,141 @@
+"""Cold-start benchmark: how long a fresh process takes before it can answer requests.
+
+    python -m src.benchmark.cold_start [--runs 5] [--subsystems] [--json PATH]
+
+Every run starts a new interpreter and measures, in order:
+
+  import        `import main`
+  startup       the app's startup handlers
+  first_ready   the first GET /ready response (through httpx's ASGI transport)
+
+With --subsystems each run then initializes every registry subsystem in turn
+and reports how long each took, or why it failed. That part talks to
+whatever the environment points at (Mongo, Groq, the Monad RPC, Pinecone),
+so expect failures on a machine without credentials; the import and startup
+figures do not depend on any of them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RESULT_PREFIX = "cold-start-result "
+
+
+def _child(measure_subsystems):
+    """Runs inside the fresh interpreter and prints one JSON result line."""
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+
+    import httpx
+
+    async def boot():
+        await main.app.router.startup()
+        booted = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            response = await client.get("/ready")
+        return booted, time.perf_counter(), response.status_code
+
+    booted, answered, status = asyncio.run(boot())
+    result = {
+        "import": imported - started,
+        "startup": booted - imported,
+        "first_ready": answered - booted,
+        "total": answered - started,
+        "ready_status": status,
+    }
+
+    if measure_subsystems:
+        from src.agents.registry import SUBSYSTEMS, subsystem_status
+        for name, getter in SUBSYSTEMS.items():
+            try:
+                getter()
+            except Exception:
+                pass
+        result["subsystems"] = subsystem_status()
+
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+    # Background work such as index creation against an unreachable Mongo must not delay the next run.
+    os._exit(0)
+
+
+def run_once(measure_subsystems):
+    env = {**os.environ, "STARTUP_WARMUP": "false"}
+    command = [sys.executable, "-m", "src.benchmark.cold_start", "--child"]
+    if measure_subsystems:
+        command.append("--subsystems")
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    line = next(l for l in completed.stdout.splitlines() if l.startswith(RESULT_PREFIX))
+    return json.loads(line[len(RESULT_PREFIX):])
+
+
+def summarize(runs):
+    summary = {}
+    for phase in ("import", "startup", "first_ready", "total"):
+        values = [run[phase] * 1000 for run in runs]
+        summary[phase] = {
+            "median_ms": round(statistics.median(values), 1),
+            "max_ms": round(max(values), 1),
+        }
+
+    subsystems = {}
+    for run in runs:
+        for name, status in run.get("subsystems", {}).items():
+            entry = subsystems.setdefault(name, {"seconds": [], "failures": 0, "error": None})
+            if status.get("state") == "ready" and "seconds" in status:
+                entry["seconds"].append(status["seconds"])
+            elif status.get("state") == "failed":
+                entry["failures"] += 1
+                entry["error"] = status.get("error")
+    if subsystems:
+        summary["subsystems"] = {
+            name: {
+                "median_ms": round(statistics.median(entry["seconds"]) * 1000, 1) if entry["seconds"] else None,
+                "failures": entry["failures"],
+                "error": entry["error"],
+            }
+            for name, entry in subsystems.items()
+        }
+    return summary
+
+
+def print_report(summary, runs):
+    print(f"cold start over {runs} fresh processes (STARTUP_WARMUP=false)")
+    for phase in ("import", "startup", "first_ready", "total"):
+        print(f"  {phase:<12} median {summary[phase]['median_ms']:>8.1f} ms   max {summary[phase]['max_ms']:>8.1f} ms")
+    if "subsystems" in summary:
+        print("subsystem initialization")
+        for name, entry in summary["subsystems"].items():
+            if entry["median_ms"] is not None:
+                print(f"  {name:<20} {entry['median_ms']:>8.1f} ms")
+            else:
+                print(f"  {name:<20}   failed: {entry['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures process cold start of the API.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--subsystems", action="store_true", help="Also time each registry subsystem's first initialization.")
+    parser.add_argument("--json", help="Write the summary as JSON.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.subsystems)
+        return
+
+    runs = [run_once(args.subsystems) for _ in range(args.runs)]
+    summary = summarize(runs)
+    print_report(summary, args.runs)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": runs, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
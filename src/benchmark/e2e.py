@@ -0,0 +1,366 @@
+"""End-to-end load benchmark: runs main.app in-process against local stand-ins.
+
+    python -m src.benchmark.e2e [--duration 30] [--concurrency 16] [--users 20]
+                                [--mix chat=30,receive=25,get_chat=20,analytics=10,away_summary=5,duel=10]
+                                [--mongo-uri URI] [--no-chain] [--out baseline.json]
+                                [--compare baseline.json --max-regression 15]
+
+Requests go through httpx's ASGI transport, so no sockets are opened for the
+app itself. The stand-ins are: a throwaway mongod (or --mongo-uri, which must
+point at a disposable server), the local vector backend in a temp directory,
+hashed embeddings, the stub LLM provider, an in-process SMTP sink and an
+eth-tester chain with EchoMaze deployed (needs eth-tester[py-evm] and
+py-solc-x; skip duels with --no-chain).
+
+Latency is measured until the full response body is received. Results are
+reported per endpoint as p50/p95/p99/mean in milliseconds plus requests per
+second, and can be saved as a JSON baseline and diffed against a later run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BENCH_DB_NAME = "persona_bot_bench"
+BENCH_PASSWORD = "benchmark-password"
+DEFAULT_MIX = "chat=30,receive=25,get_chat=20,analytics=10,away_summary=5,duel=10"
+PROMPTS = [
+    "what should I focus on this week?",
+    "can you draft a short status update for my team?",
+    "remind me what we discussed about the launch",
+    "any tips for my presentation tomorrow?",
+    "summarize my priorities",
+]
+INCOMING = [
+    "hey, are you around?",
+    "can we move our meeting to 3pm?",
+    "did you see the latest design review?",
+    "ping me when you are back",
+]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.enabled = False
+
+    def record(self, name, seconds, ok):
+        if not self.enabled:
+            return
+        self.latencies.setdefault(name, [])
+        self.errors.setdefault(name, 0)
+        if ok:
+            self.latencies[name].append(seconds)
+        else:
+            self.errors[name] += 1
+
+    def summary(self, elapsed):
+        def stats(latencies, errors):
+            if not latencies:
+                return {"count": 0, "errors": errors, "rps": 0.0}
+            ms = [s * 1000 for s in latencies]
+            return {
+                "count": len(ms),
+                "errors": errors,
+                "rps": round(len(ms) / elapsed, 2),
+                "p50_ms": round(percentile(ms, 0.50), 2),
+                "p95_ms": round(percentile(ms, 0.95), 2),
+                "p99_ms": round(percentile(ms, 0.99), 2),
+                "mean_ms": round(statistics.mean(ms), 2),
+            }
+
+        endpoints = {name: stats(values, self.errors[name]) for name, values in sorted(self.latencies.items())}
+        everything = [s for values in self.latencies.values() for s in values]
+        return {"overall": stats(everything, sum(self.errors.values())), "endpoints": endpoints}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def configure_environment(args, mongo_uri, smtp, chain, workdir):
+    """Points every subsystem at its stand-in. Must run before main is imported."""
+    from eth_account import Account
+
+    os.environ.update({
+        "MONGO_URI": mongo_uri,
+        "MONGO_DB_NAME": BENCH_DB_NAME,
+        "MEMORY_BACKEND": "local",
+        "MEMORY_LOCAL_PATH": os.path.join(workdir, "memory_index"),
+        "LLM_PROVIDER": "stub",
+        "SMTP_SERVER": smtp.host,
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_STARTTLS": "false",
+        "EMAIL": "bench@example.com",
+        "EMAIL_PASSWORD": "",
+        "SECRET_KEY": "benchmark-secret",
+        "FRONTEND_URL": "http://bench.local",
+        "BACKEND_URL": "http://bench.local",
+        "OWNER_PRIVATE_KEY": (chain.owner if chain else Account.create()).key.hex(),
+        "MAZE_CONTRACT_ADDRESS": chain.contract_address if chain else "0x" + "00" * 20,
+        "STARTUP_WARMUP": "false",
+    })
+
+    from src.agents import registry
+    from src.benchmark.standins import HashEmbeddings
+    registry.provide("embedding_model", HashEmbeddings())
+
+
+def load_app(args, mongo_uri, smtp, chain):
+    """Imports main and re-applies stand-ins that a local .env may have overridden."""
+    import main
+    from src.agents import registry
+    from src.agents.llm_provider import StubProvider
+    from src.database import mongo_manager
+    from src.utils import email_service
+
+    if mongo_manager.MONGO_URI != mongo_uri or mongo_manager.DB_NAME != BENCH_DB_NAME:
+        sys.exit("[bench] refusing to run: MONGO_URI/MONGO_DB_NAME were overridden (check .env)")
+
+    main.limiter.enabled = False
+    registry.provide(
+        ("llm", main.GROQ_API_KEY), StubProvider(ttft_ms=args.llm_ttft_ms, tokens_per_second=args.llm_tps), name="llm"
+    )
+
+    email_service.SMTP_SERVER, email_service.SMTP_PORT = smtp.host, smtp.port
+    email_service.SMTP_STARTTLS, email_service.FROM_PASSWORD = False, None
+
+    if chain:
+        registry.provide("web3", chain.w3)
+        registry.provide("owner_account", chain.owner)
+        registry.provide(
+            ("contract", "maze"),
+            chain.w3.eth.contract(address=chain.contract_address, abi=registry.get_contract_abi("MazeGameABI.json")),
+            name="contract:maze",
+        )
+    return main
+
+
+async def timed(recorder, name, request):
+    started = time.perf_counter()
+    try:
+        response = await request
+        ok = response.status_code < 400
+    except Exception:
+        response, ok = None, False
+    recorder.record(name, time.perf_counter() - started, ok)
+    return response
+
+
+async def setup_users(client, smtp, count):
+    """Registers, verifies and profiles users through the API; odd users go away."""
+    from src.database.async_mongo_manager import set_plan
+
+    present, away = [], []
+    for i in range(count):
+        user_id = f"bench{i}@gmail.com"
+        await client.post("/register", json={"user_id": user_id, "password": BENCH_PASSWORD})
+        await client.post("/send-verification-email", json={"user_id": user_id})
+        mail = smtp.last_message_to(user_id) or ""
+        token = re.search(r"/verify-email/([0-9a-f-]{36})", mail)
+        if token:
+            await client.get(f"/verify-email/{token.group(1)}", follow_redirects=False)
+
+        login = await client.post("/login", json={"user_id": user_id, "password": BENCH_PASSWORD})
+        if login.status_code != 200:
+            raise RuntimeError(f"setup failed for {user_id}: {login.status_code} {login.text}")
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        await client.post("/setup-profile", headers=headers, json={"profile_data": {
+            "name": f"Bench User {i}",
+            "professional": {"job_title": "Engineer", "company": "Acme", "skills": ["python"], "experience": 3},
+            "interests": ["music"],
+        }})
+        await set_plan(user_id, "Pro", "0xbench", datetime.utcnow())
+        await client.post("/chat-with-mimic", json={"user_id": user_id, "user_input": "hello"})
+
+        if i % 2:
+            await client.post("/set-away", json={"user_id": user_id, "away": True})
+            away.append(user_id)
+        else:
+            present.append(user_id)
+    return present, away or present
+
+
+def make_operations(recorder, present, away, everyone):
+    async def chat(client, rng):
+        user = rng.choice(present)
+        await timed(recorder, "POST /chat-with-mimic", client.post(
+            "/chat-with-mimic", json={"user_id": user, "user_input": rng.choice(PROMPTS)}))
+
+    async def receive(client, rng):
+        user = rng.choice(away)
+        await timed(recorder, "POST /receive-message", client.post(
+            "/receive-message", json={"user_id": user, "message": rng.choice(INCOMING)}))
+
+    async def get_chat(client, rng):
+        await timed(recorder, "GET /get-chat", client.get(f"/get-chat/{rng.choice(everyone)}", params={"limit": 50}))
+
+    async def analytics(client, rng):
+        end = date.today()
+        await timed(recorder, "GET /analytics", client.get(
+            f"/analytics/{rng.choice(everyone)}", params={"start": str(end - timedelta(days=30)), "end": str(end)}))
+
+    async def away_summary(client, rng):
+        now = datetime.utcnow()
+        sessions = [{
+            "start_time": (now - timedelta(hours=h + 1)).isoformat(),
+            "end_time": (now - timedelta(hours=h)).isoformat(),
+            "messages": [f"friend{j}: {rng.choice(INCOMING)}" for j in range(rng.randint(3, 12))],
+        } for h in range(rng.randint(1, 3))]
+        await timed(recorder, "POST /away-summary", client.post(
+            "/away-summary", json={"user_id": rng.choice(everyone), "sessions": sessions}))
+
+    async def duel(client, rng):
+        path = [rng.choice("LRUD") for _ in range(6)]
+        created = await timed(recorder, "POST /api/duel/create", client.post(
+            "/api/duel/create", json={"user_id": rng.choice(everyone), "path": path}))
+        if created is None or created.status_code != 200:
+            return
+        duel_id = created.json()["duel_id"]
+        await timed(recorder, "POST /api/duel/reveal", client.post("/api/duel/reveal", json={"duel_id": duel_id, "path": path}))
+        await timed(recorder, "GET /api/duel/winner", client.get(f"/api/duel/winner/{duel_id}"))
+
+    return {
+        "chat": chat, "receive": receive, "get_chat": get_chat,
+        "analytics": analytics, "away_summary": away_summary, "duel": duel,
+    }
+
+
+async def drive(args, main, smtp):
+    import httpx
+
+    recorder = Recorder()
+    await main.app.router.startup()
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            present, away = await setup_users(client, smtp, args.users)
+            main.write_behind.flush()
+
+            mix = parse_mix(args.mix)
+            if args.no_chain:
+                mix.pop("duel", None)
+            operations = make_operations(recorder, present, away, present + away)
+            names = [name for name in mix if name in operations]
+            weights = [mix[name] for name in names]
+
+            async def worker(seed, deadline):
+                rng = random.Random(seed)
+                while time.perf_counter() < deadline:
+                    await operations[rng.choices(names, weights)[0]](client, rng)
+
+            warmup_end = time.perf_counter() + args.warmup
+            await asyncio.gather(*[worker(args.seed + i, warmup_end) for i in range(args.concurrency)])
+
+            recorder.enabled = True
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*[worker(args.seed + 1000 + i, deadline) for i in range(args.concurrency)])
+            elapsed = time.perf_counter() - started
+    finally:
+        await main.app.router.shutdown()
+
+    result = recorder.summary(elapsed)
+    result["config"] = {
+        "duration": args.duration, "concurrency": args.concurrency, "users": args.users, "mix": mix,
+        "llm_ttft_ms": args.llm_ttft_ms, "llm_tps": args.llm_tps, "seed": args.seed,
+        "recorded_at": datetime.utcnow().isoformat(),
+    }
+    result["standins"] = {"smtp_messages": smtp.received}
+    return result
+
+
+def print_report(result):
+    print(f"{'endpoint':<26}{'count':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    rows = list(result["endpoints"].items()) + [("overall", result["overall"])]
+    for name, r in rows:
+        if not r["count"]:
+            print(f"{name:<26}{0:>8}{r['errors']:>6}")
+            continue
+        print(f"{name:<26}{r['count']:>8}{r['errors']:>6}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+
+
+def compare(result, baseline, max_regression):
+    """Prints per-endpoint deltas; returns the endpoints whose p95 regressed beyond max_regression percent."""
+    regressions = []
+    print(f"\n{'endpoint':<26}{'p50 Δ%':>9}{'p95 Δ%':>9}{'p99 Δ%':>9}{'rps Δ%':>9}")
+    rows = list(result["endpoints"].items()) + [("overall", result["overall"])]
+    for name, r in rows:
+        old = baseline["overall"] if name == "overall" else baseline["endpoints"].get(name)
+        if not old or not old.get("count") or not r.get("count"):
+            continue
+        deltas = [100.0 * (r[k] - old[k]) / old[k] if old[k] else 0.0 for k in ("p50_ms", "p95_ms", "p99_ms", "rps")]
+        print(f"{name:<26}" + "".join(f"{d:>+9.1f}" for d in deltas))
+        if max_regression is not None and deltas[1] > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process end-to-end load benchmark with local stand-ins.")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before the run.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Comma-separated operation=weight pairs.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--llm-ttft-ms", type=float, default=150)
+    parser.add_argument("--llm-tps", type=float, default=200)
+    parser.add_argument("--mongo-uri", help="Disposable Mongo server to use instead of starting mongod.")
+    parser.add_argument("--no-chain", action="store_true", help="Skip the eth-tester chain and duel endpoints.")
+    parser.add_argument("--out", help="Write the results as a JSON baseline.")
+    parser.add_argument("--compare", help="Baseline JSON to diff against.")
+    parser.add_argument("--max-regression", type=float, help="Exit 1 when any endpoint's p95 regresses by more than this percent.")
+    args = parser.parse_args()
+
+    from src.benchmark.standins import LocalMongod, SmtpSink, TestChain
+
+    mongod = None if args.mongo_uri else LocalMongod()
+    mongo_uri = args.mongo_uri or mongod.uri
+    smtp = SmtpSink()
+    chain = None if args.no_chain else TestChain()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+
+    try:
+        configure_environment(args, mongo_uri, smtp, chain, workdir)
+        app_module = load_app(args, mongo_uri, smtp, chain)
+        result = asyncio.run(drive(args, app_module, smtp))
+    finally:
+        smtp.close()
+        if mongod:
+            mongod.close()
+
+    print_report(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n[bench] baseline written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.max_regression)
+        if regressions:
+            print(f"\n[bench] p95 regressed beyond {args.max_regression}% for: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Local stand-ins for the service's external dependencies, used by the e2e benchmark.
+
+Nothing here talks to the network: embeddings are hashed, SMTP goes to an
+in-process sink, the chain is an eth-tester EVM and Mongo is a throwaway
+mongod started from a temp directory.
+"""
+import hashlib
+import shutil
+import socket
+import socketserver
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+class HashEmbeddings:
+    """Deterministic unit vectors seeded by the text; same interface as HuggingFaceEmbeddings."""
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        self._reply("220 bench-smtp ready")
+        in_data, recipients, body = False, [], []
+        for raw in self.rfile:
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    self.server.sink.deliver(recipients, "\n".join(body))
+                    in_data, recipients, body = False, [], []
+                    self._reply("250 OK")
+                else:
+                    body.append(line[1:] if line.startswith("..") else line)
+                continue
+
+            verb = line.split(" ", 1)[0].upper()
+            if verb == "RCPT":
+                recipients.append(line.split(":", 1)[-1].strip().strip("<>"))
+                self._reply("250 OK")
+            elif verb in ("EHLO", "HELO"):
+                self._reply("250 bench-smtp")
+            elif verb == "DATA":
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("250 OK")
+
+
+class SmtpSink:
+    """Accepts mail on 127.0.0.1 and keeps it in memory (no TLS, no auth)."""
+
+    def __init__(self):
+        self.received = 0
+        self.messages = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SmtpHandler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+
+    def deliver(self, recipients, data):
+        with self._lock:
+            self.received += 1
+            self.messages.append((recipients, data))
+
+    def last_message_to(self, address):
+        with self._lock:
+            for recipients, data in reversed(self.messages):
+                if address in recipients:
+                    return data
+        return None
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class TestChain:
+    """eth-tester EVM with EchoMaze deployed and a funded owner account.
+
+    Needs eth-tester[py-evm] and py-solc-x; solc is installed on first use.
+    py-evm is not thread-safe, so requests are serialized through one lock.
+    """
+
+    def __init__(self, contract_path="contracts/EchoMaze.sol", contract_name="EchoMaze", solc_version="0.8.24"):
+        import solcx
+        from eth_account import Account
+        from web3 import Web3, EthereumTesterProvider
+
+        class LockedTesterProvider(EthereumTesterProvider):
+            _lock = threading.Lock()
+
+            def make_request(self, method, params):
+                with self._lock:
+                    return super().make_request(method, params)
+
+        if solc_version not in {str(v) for v in solcx.get_installed_solc_versions()}:
+            solcx.install_solc(solc_version)
+        compiled = solcx.compile_files([contract_path], output_values=["abi", "bin"], solc_version=solc_version)
+        artifact = next(v for k, v in compiled.items() if k.endswith(f":{contract_name}"))
+
+        self.w3 = Web3(LockedTesterProvider())
+        self.owner = Account.create()
+        funder = self.w3.eth.accounts[0]
+        self.w3.eth.wait_for_transaction_receipt(self.w3.eth.send_transaction(
+            {"from": funder, "to": self.owner.address, "value": self.w3.to_wei(1000, "ether")}
+        ))
+        deploy = self.w3.eth.contract(abi=artifact["abi"], bytecode=artifact["bin"]).constructor().transact({"from": funder})
+        self.contract_address = self.w3.eth.wait_for_transaction_receipt(deploy).contractAddress
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalMongod:
+    """Throwaway mongod on a free port with its data in a temp directory."""
+
+    def __init__(self, binary=None, startup_timeout=30):
+        from pymongo import MongoClient
+
+        binary = binary or shutil.which("mongod")
+        if not binary:
+            raise RuntimeError("mongod not found on PATH; pass --mongo-uri to use a running server instead")
+        self.dbpath = tempfile.mkdtemp(prefix="bench-mongod-")
+        self.port = free_port()
+        self.uri = f"mongodb://127.0.0.1:{self.port}"
+        self._process = subprocess.Popen(
+            [binary, "--dbpath", self.dbpath, "--port", str(self.port), "--bind_ip", "127.0.0.1", "--quiet"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                MongoClient(self.uri, serverSelectionTimeoutMS=500).admin.command("ping")
+                break
+            except Exception:
+                if time.monotonic() > deadline or self._process.poll() is not None:
+                    self.close()
+                    raise RuntimeError("mongod did not start")
+                time.sleep(0.2)
+
+    def close(self):
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        shutil.rmtree(self.dbpath, ignore_errors=True)
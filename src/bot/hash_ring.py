@@ -0,0 +1,43 @@
+import bisect
+import hashlib
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Each node is placed on the ring `replicas` times, so keys spread evenly
+    and adding or removing a node only moves the keys that node gains or
+    loses; every other key keeps its node.
+    """
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self._hashes = []
+        self._nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(str(value).encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            index = bisect.bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node):
+        kept = [(h, n) for h, n in zip(self._hashes, self._nodes) if n != node]
+        self._hashes = [h for h, _ in kept]
+        self._nodes = [n for _, n in kept]
+
+    def node_for(self, key):
+        if not self._hashes:
+            raise LookupError("hash ring is empty")
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+    def __len__(self):
+        return len(set(self._nodes))
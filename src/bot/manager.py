@@ -1,120 +1,236 @@
 import os
-from multiprocessing import Process
+import threading
+import time
+import multiprocessing
 from dotenv import load_dotenv
 import asyncio
-from src.database.mongo_manager import log_away_message
+from src.bot.hash_ring import HashRing
+from src.bot.worker import run_worker
 
 load_dotenv(override=True)
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-FASTAPI_ENDPOINT = os.getenv("FASTAPI_ENDPOINT")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "4"))
+BOT_WORKER_CALL_TIMEOUT = float(os.getenv("BOT_WORKER_CALL_TIMEOUT", "30"))
+BOT_PROFILE_PUSH_TIMEOUT = float(os.getenv("BOT_PROFILE_PUSH_TIMEOUT", "2"))
+BOT_MONITOR_SECONDS = float(os.getenv("BOT_MONITOR_SECONDS", "5"))
+
+# Worker stats exported as bot_worker_<field>{worker="N"} gauges.
+WORKER_LOAD_METRICS = {
+    "clients": "Discord clients hosted by the worker.",
+    "ready_clients": "Discord clients that are logged in and connected.",
+    "messages": "Messages handled since the worker started.",
+    "in_flight": "Messages currently being handled.",
+    "cached_profiles": "User profiles held in the worker's pushed cache.",
+    "loop_lag_seconds": "How late the worker's event loop woke from a 1s sleep.",
+    "max_rss_bytes": "Peak resident memory of the worker process.",
+}
+
+
+class WorkerHandle:
+    """Supervisor side of one bot worker process; started on first use.
+
+    `replay(worker)` returns the (user_id, token) pairs to add back when a
+    crashed process is restarted. Starting, restarting and every exchange
+    on the pipe happen under one lock, so a restart and its replay are
+    never interleaved with other commands.
+    """
+
+    def __init__(self, index, replay=None):
+        self.index = index
+        self.replay = replay
+        self.process = None
+        self._conn = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        # spawn, not fork: the API process holds threads and client pools that must not be copied.
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=run_worker, args=(self.index, child_conn), name=f"bot-worker-{self.index}", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def crashed(self):
+        return self.process is not None and not self.process.is_alive()
+
+    def ensure_started(self):
+        """Starts the process if it is not running; returns True if it had to."""
+        with self._lock:
+            return self._ensure_started()
+
+    def _ensure_started(self):
+        # Caller holds _lock.
+        if self.is_alive():
+            return False
+        crashed = self.process is not None
+        self.start()
+        if crashed and self.replay is not None:
+            pairs = self.replay(self)
+            print(f"[⚠️ Bot worker crash detected] Restarted worker {self.index} with {len(pairs)} bots")
+            for user_id, token in pairs:
+                try:
+                    self._request("add", (user_id, token), BOT_WORKER_CALL_TIMEOUT)
+                except (TimeoutError, RuntimeError) as e:
+                    print(f"[Bot worker {self.index} could not restore bot for {user_id}]:", e)
+        return True
+
+    def call(self, op, *args, timeout=BOT_WORKER_CALL_TIMEOUT, start=True):
+        """Sends one command and waits for its reply; replies to timed-out earlier calls are skipped."""
+        with self._lock:
+            if not self.is_alive():
+                if not start:
+                    return None
+                self._ensure_started()
+            return self._request(op, args, timeout)
+
+    def _request(self, op, args, timeout):
+        # Caller holds _lock. The deadline covers the whole exchange, including stale replies skipped on the way.
+        self._next_id += 1
+        request_id = self._next_id
+        deadline = time.monotonic() + timeout
+        try:
+            self._conn.send((request_id, op, args))
+            while self._conn.poll(max(0.0, deadline - time.monotonic())):
+                reply_id, ok, value = self._conn.recv()
+                if reply_id != request_id:
+                    continue
+                if not ok:
+                    raise RuntimeError(f"bot worker {self.index}: {value}")
+                return value
+        except (EOFError, OSError) as e:
+            raise RuntimeError(f"bot worker {self.index} exited") from e
+        raise TimeoutError(f"bot worker {self.index} did not answer {op} within {timeout}s")
+
+    def stop(self, timeout=5):
+        if not self.is_alive():
+            return
+        try:
+            self.call("shutdown", timeout=timeout, start=False)
+        except (TimeoutError, RuntimeError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
 
 class BotManager:
-    def __init__(self):
-        self.bots = {}  
-        self.greeted_users = {}  
+    """Runs users' Discord bots on a fixed pool of worker processes.
 
-    def initialize_bot(self, user_id, bot_token):
-        if user_id in self.bots:
-            return f"Bot for {user_id} already initialized."
+    Users are assigned to workers by consistent hashing on user_id, and each
+    worker hosts all of its users' clients on one event loop, so memory
+    grows with the pool size rather than with the number of away users.
+    Bots are added and removed in place; a crashed worker is restarted,
+    together with the bots it hosted, by monitor_bots() or by the next
+    command sent to it, whichever comes first.
+    """
 
-        process = Process(target=self._run_bot, args=(user_id, bot_token))
-        process.start()
+    def __init__(self, workers=BOT_WORKERS):
+        self.workers = [WorkerHandle(index, replay=self._assigned_bots) for index in range(workers)]
+        self.ring = HashRing(range(workers))
+        self.tokens = {}
+        self.load = {}
 
-        self.bots[user_id] = process
-        self.greeted_users[user_id] = set()
+    def worker_for(self, user_id):
+        return self.workers[self.ring.node_for(user_id)]
 
-        return f"Bot initialized for {user_id}"
+    def _assigned_bots(self, worker):
+        return [(user_id, token) for user_id, token in list(self.tokens.items()) if self.worker_for(user_id) is worker]
 
-    def _run_bot(self, user_id, token):
-        import discord
-        from discord.ext import commands
-        import requests
-        from src.database.mongo_manager import get_user_profile
-
-        intents = discord.Intents.default()
-        intents.message_content = True
-
-        bot = commands.Bot(command_prefix="!",intents=intents)
-        greeted_users = set()
-
-        @bot.event
-        async def on_ready():
-            print(f"🤖 MimicBot for {user_id} logged in as {bot.user}")
-
-        @bot.event
-        async def on_message(message):
-            if message.author == bot.user:
-                return
-
-            profile = get_user_profile(user_id=user_id)
-
-            if not profile or not profile.get("away", False):
-                return
-
-            if message.author.id not in greeted_users:
-                greeted_users.add(message.author.id)
-                intro = (
-                    f"Heya! 😎 This is EchoPersonaAI, standing in for {user_id}. "
-                    "They’re away right now 🛸 but I can keep you company!"
-                )
-                await message.channel.send(intro)
-
-            await message.channel.typing()
-            log_away_message(
-                user_id=user_id,
-                sender_id=message.author.id,
-                sender_name=str(message.author),
-                content=message.content
-            )
-
-            payload = {
-                "user_id": user_id,
-                "message": message.content
-            }
+    def initialize_bot(self, user_id, bot_token):
+        if user_id in self.tokens and self.is_bot_running(user_id):
+            return f"Bot for {user_id} already initialized."
 
-            try:
-                response = requests.post(FASTAPI_ENDPOINT, json=payload)
-                if response.status_code == 200:
-                    auto_reply = response.json().get("auto_reply")
-                    await message.channel.send(f"{auto_reply}" if auto_reply else "❌ No reply generated.")
-                else:
-                    await message.channel.send("⚠️ Could not process message.")
-            except Exception as e:
-                print(f"[Bot error for {user_id}]:", e)
-                await message.channel.send("⚠️ Error while contacting the server.")
+        worker = self.worker_for(user_id)
+        worker.call("add", user_id, bot_token)
+        self.tokens[user_id] = bot_token
 
-        try:
-            bot.run(token)
-        except discord.LoginFailure:
-            return f"[⚠️ Login failed] Invalid token for {user_id}."
-        except Exception as e:
-            print(f"[Unhandled bot error for {user_id}]:", e)
+        return f"Bot initialized for {user_id}"
 
     def stop_bot(self, user_id):
-        if user_id not in self.bots:
+        if self.tokens.pop(user_id, None) is None:
             return f"No bot found for {user_id}"
 
-        process = self.bots[user_id]
-        process.terminate()
-        process.join()
-
-        del self.bots[user_id]
-        self.greeted_users.pop(user_id, None)
-
-        print(f"🤖 Bot for {user_id} stopped.")
+        self.worker_for(user_id).call("remove", user_id, start=False)
         return f"Bot stopped for {user_id}"
 
     def is_bot_running(self, user_id):
-        return user_id in self.bots and self.bots[user_id].is_alive()
+        if user_id not in self.tokens:
+            return False
+        return bool(self.worker_for(user_id).call("status", user_id, start=False))
+
+    def push_profile(self, user_id, profile):
+        """Replaces the profile cached by the user's bot, so on_message never has to read Mongo.
+
+        Best effort: the profile is already saved when this runs, so a slow or
+        restarting worker is logged and skipped rather than failing the request;
+        a restarted worker reloads the profile from Mongo when it re-adds the bot.
+        """
+        if user_id not in self.tokens:
+            return False
+        try:
+            return bool(self.worker_for(user_id).call("profile", user_id, profile,
+                                                      timeout=BOT_PROFILE_PUSH_TIMEOUT, start=False))
+        except (TimeoutError, RuntimeError) as e:
+            print(f"[Bot profile push failed for {user_id}]:", e)
+            return False
+
+    def worker_stats(self):
+        """Latest load per started worker, plus the users assigned to it."""
+        assigned = {}
+        for user_id in list(self.tokens):
+            assigned.setdefault(self.ring.node_for(user_id), []).append(user_id)
+        return [
+            {
+                "worker": worker.index,
+                "alive": worker.is_alive(),
+                "assigned_users": len(assigned.get(worker.index, [])),
+                **self.load.get(worker.index, {}),
+            }
+            for worker in self.workers
+        ]
+
+    def load_metric(self, field):
+        """{(worker,): value} for one WORKER_LOAD_METRICS field, for a labelled gauge."""
+        return {
+            (str(index),): stats[field]
+            for index, stats in list(self.load.items())
+            if stats.get(field) is not None
+        }
+
+    def check_workers(self):
+        """Restarts crashed workers with their bots and refreshes the load snapshot."""
+        for worker in self.workers:
+            if worker.crashed():
+                try:
+                    worker.ensure_started()
+                except (TimeoutError, RuntimeError) as e:
+                    print(f"[Bot worker {worker.index} restart failed]:", e)
+
+            if worker.is_alive():
+                try:
+                    self.load[worker.index] = worker.call("stats", start=False)
+                except (TimeoutError, RuntimeError) as e:
+                    print(f"[Bot worker {worker.index} stats failed]:", e)
+            else:
+                self.load.pop(worker.index, None)
 
     async def monitor_bots(self):
-        """Periodically checks and restarts crashed bots."""
+        """Periodically restarts crashed workers and collects their load."""
         while True:
-            await asyncio.sleep(5)
-            for user_id, process in list(self.bots.items()):
-                if not process.is_alive():
-                    print(f"[⚠️ Bot crash detected] Restarting bot for {user_id}")
-                    bot_token = self.tokens.get(user_id)
-                    if bot_token:
-                        self.initialize_bot(user_id, bot_token)
\ No newline at end of file
+            await asyncio.sleep(BOT_MONITOR_SECONDS)
+            try:
+                await asyncio.to_thread(self.check_workers)
+            except Exception as e:
+                print("[Bot monitor error]:", e)
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
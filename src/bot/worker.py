@@ -0,0 +1,284 @@
+"""Bot worker process: many users' discord.Clients sharing one event loop.
+
+The supervisor (BotManager) talks to each worker over a Pipe. Requests are
+(request_id, op, args) tuples and every request gets exactly one
+(request_id, ok, value) reply:
+
+  add(user_id, token)   start a client for the user; False if one is running
+  remove(user_id)       close the user's client; False if there was none
+  status(user_id)       True while the user's client is running
+  profile(user_id, p)   replace the user's cached profile (pushed by the API)
+  users()               user ids with a running client
+  stats()               load figures for metrics
+  shutdown()            close every client and exit
+"""
+import asyncio
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+FASTAPI_ENDPOINT = os.getenv("FASTAPI_ENDPOINT")
+BOT_HTTP_TIMEOUT_SECONDS = float(os.getenv("BOT_HTTP_TIMEOUT_SECONDS", "60"))
+BOT_HTTP_MAX_CONNECTIONS = int(os.getenv("BOT_HTTP_MAX_CONNECTIONS", "100"))
+LOOP_LAG_INTERVAL_SECONDS = 1.0
+
+
+def _max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class BotWorker:
+    def __init__(self, index):
+        self.index = index
+        self.clients = {}
+        self.tasks = {}
+        self.profiles = {}
+        self.http = None
+        self._background = set()
+        self.messages = 0
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.started = time.time()
+        self._stopped = None
+
+    async def serve(self, conn):
+        import httpx
+        from src.utils import tracing
+        tracing.set_service_name("echopersona-bot")
+
+        # One keep-alive pool for every client's calls to the API.
+        self.http = httpx.AsyncClient(
+            timeout=BOT_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=BOT_HTTP_MAX_CONNECTIONS, max_keepalive_connections=BOT_HTTP_MAX_CONNECTIONS),
+        )
+
+        self._stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        lag_task = asyncio.create_task(self._measure_lag())
+        threading.Thread(target=self._read_commands, args=(conn, loop), name="bot-commands", daemon=True).start()
+        print(f"🤖 Bot worker {self.index} started (pid {os.getpid()})")
+
+        await self._stopped.wait()
+        lag_task.cancel()
+        for user_id in list(self.clients):
+            await self.remove(user_id)
+        await self.http.aclose()
+
+    def _read_commands(self, conn, loop):
+        """Blocks on the pipe in a thread and runs each command on the event loop."""
+        while True:
+            try:
+                request_id, op, args = conn.recv()
+            except (EOFError, OSError):
+                loop.call_soon_threadsafe(self._stopped.set)
+                return
+            future = asyncio.run_coroutine_threadsafe(self.handle(op, *args), loop)
+            try:
+                reply = (request_id, True, future.result())
+            except Exception as e:
+                reply = (request_id, False, f"{type(e).__name__}: {e}")
+            conn.send(reply)
+            if op == "shutdown":
+                return
+
+    async def handle(self, op, *args):
+        if op == "add":
+            return await self.add(*args)
+        if op == "remove":
+            return await self.remove(*args)
+        if op == "status":
+            return args[0] in self.clients
+        if op == "profile":
+            return self.set_profile(*args)
+        if op == "users":
+            return list(self.clients)
+        if op == "stats":
+            return self.stats()
+        if op == "shutdown":
+            self._stopped.set()
+            return True
+        raise ValueError(f"Unknown bot worker command: {op}")
+
+    async def add(self, user_id, token):
+        if user_id in self.clients:
+            return False
+        client = self._make_client(user_id)
+        self.clients[user_id] = client
+        self.tasks[user_id] = asyncio.create_task(self._run_client(user_id, client, token))
+        self._in_background(self._load_profile(user_id))
+        return True
+
+    def set_profile(self, user_id, profile):
+        if user_id not in self.clients:
+            return False
+        self.profiles[user_id] = profile
+        return True
+
+    async def _load_profile(self, user_id):
+        """Seeds the cache from Mongo once per bot; later changes arrive through set_profile().
+
+        A plain read: the shared profile cache would start its invalidation
+        watcher in every worker, which the pushes make redundant.
+        """
+        from src.database.async_mongo_manager import read_user_profile
+
+        profile = await read_user_profile(user_id)
+        # A push that landed while we were reading is newer than what we read.
+        if user_id in self.clients and user_id not in self.profiles:
+            self.profiles[user_id] = profile
+        return self.profiles.get(user_id, profile)
+
+    def _in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        task.add_done_callback(_log_failure)
+        return task
+
+    async def remove(self, user_id):
+        client = self.clients.pop(user_id, None)
+        task = self.tasks.pop(user_id, None)
+        self.profiles.pop(user_id, None)
+        if client is None:
+            return False
+        await client.close()
+        if task is not None:
+            task.cancel()
+        print(f"🤖 Bot for {user_id} stopped.")
+        return True
+
+    async def _run_client(self, user_id, client, token):
+        import discord
+
+        try:
+            await client.start(token)
+        except discord.LoginFailure:
+            print(f"[⚠️ Login failed] Invalid token for {user_id}.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Unhandled bot error for {user_id}]:", e)
+        finally:
+            # Drop the entry unless remove() or a newer add() already replaced it.
+            if self.clients.get(user_id) is client:
+                self.clients.pop(user_id, None)
+                self.tasks.pop(user_id, None)
+                self.profiles.pop(user_id, None)
+            if not client.is_closed():
+                await client.close()
+
+    def _make_client(self, user_id):
+        import discord
+
+        intents = discord.Intents.default()
+        intents.message_content = True
+        client = discord.Client(intents=intents)
+        greeted_users = set()
+
+        @client.event
+        async def on_ready():
+            print(f"🤖 MimicBot for {user_id} logged in as {client.user} (worker {self.index})")
+
+        @client.event
+        async def on_message(message):
+            if message.author == client.user:
+                return
+            self.in_flight += 1
+            try:
+                await self._on_message(user_id, greeted_users, message)
+            finally:
+                self.in_flight -= 1
+                self.messages += 1
+
+        return client
+
+    async def _on_message(self, user_id, greeted_users, message):
+        from src.database.async_mongo_manager import log_away_message
+        from src.utils import tracing
+        from src.utils.tracing import KIND_CLIENT, KIND_CONSUMER, span, start_trace, traceparent_header
+
+        with start_trace(
+            "bot.on_message", force=user_id in tracing.TRACE_FORCE_USERS, kind=KIND_CONSUMER,
+            **{"bot.user_id": user_id, "bot.worker": self.index},
+        ):
+            profile = self.profiles.get(user_id)
+            if profile is None:
+                profile = await self._load_profile(user_id)
+
+            if not profile or not profile.get("away", False):
+                return
+
+            if message.author.id not in greeted_users:
+                greeted_users.add(message.author.id)
+                intro = (
+                    f"Heya! 😎 This is EchoPersonaAI, standing in for {user_id}. "
+                    "They’re away right now 🛸 but I can keep you company!"
+                )
+                await message.channel.send(intro)
+
+            await message.channel.typing()
+            # Logged concurrently with the reply request; the API does not read it back.
+            logged = self._in_background(log_away_message(
+                user_id=user_id,
+                sender_id=message.author.id,
+                sender_name=str(message.author),
+                content=message.content
+            ))
+
+            payload = {
+                "user_id": user_id,
+                "message": message.content
+            }
+
+            try:
+                with span("bot.receive_message", KIND_CLIENT):
+                    response = await self.http.post(FASTAPI_ENDPOINT, json=payload, headers=traceparent_header())
+                if response.status_code == 200:
+                    auto_reply = response.json().get("auto_reply")
+                    await message.channel.send(f"{auto_reply}" if auto_reply else "❌ No reply generated.")
+                else:
+                    await message.channel.send("⚠️ Could not process message.")
+            except Exception as e:
+                print(f"[Bot error for {user_id}]:", e)
+                await message.channel.send("⚠️ Error while contacting the server.")
+            await asyncio.wait([logged])
+
+    async def _measure_lag(self):
+        """Tracks how late the loop wakes up from a fixed sleep, a direct measure of blocked clients."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+            self.loop_lag = max(0.0, loop.time() - started - LOOP_LAG_INTERVAL_SECONDS)
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "clients": len(self.clients),
+            "ready_clients": sum(1 for client in self.clients.values() if client.is_ready()),
+            "messages": self.messages,
+            "in_flight": self.in_flight,
+            "cached_profiles": len(self.profiles),
+            "loop_lag_seconds": self.loop_lag,
+            "max_rss_bytes": _max_rss_bytes(),
+            "uptime_seconds": time.time() - self.started,
+        }
+
+
+def _log_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        print("[Bot worker background task failed]:", task.exception())
+
+
+def run_worker(index, conn):
+    """Process entry point."""
+    asyncio.run(BotWorker(index).serve(conn))
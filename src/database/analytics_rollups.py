@@ -0,0 +1,135 @@
+"""Rebuilds analytics rollups from the raw chat and away logs.
+
+    python -m src.database.analytics_rollups [--user-id USER]
+
+Only counters that can be derived from logs are rebuilt: "commands" from
+user messages in chat_buckets and "away_messages" from the away_messages
+event log. Emails and switches leave no log behind, so their rollups are
+left untouched.
+
+With CHAT_RETENTION_DAYS or AWAY_LOG_RETENTION_DAYS set, the logs only
+cover the retention window and the rollups are the sole record of older
+activity. A field is therefore only rebuilt for the periods that start
+inside its log window: those periods are cleared and set from the logs,
+and every older period, including one that straddles the window's start,
+keeps its stored count.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from pymongo import UpdateMany, UpdateOne
+
+from src.database.indexes import AWAY_LOG_RETENTION_DAYS, CHAT_RETENTION_DAYS
+from src.database.mongo_manager import (
+    chat_bucket_collection, away_message_collection, analytics_rollup_collection,
+    ROLLUP_GRANULARITIES, rollup_period,
+)
+
+REBUILT_FIELDS = ("commands", "away_messages")
+
+
+def period_start(day, granularity):
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def log_window_start(retention_days, now=None):
+    """First whole day the logs are guaranteed to cover, or None when they are kept forever."""
+    if not retention_days:
+        return None
+    cutoff = (now or datetime.utcnow()) - timedelta(days=float(retention_days))
+    return datetime(cutoff.year, cutoff.month, cutoff.day) + timedelta(days=1)
+
+
+def first_rebuilt_period(window_start, granularity):
+    """Label of the first period that starts inside the log window; None rebuilds every period."""
+    if window_start is None:
+        return None
+    day = window_start
+    while period_start(day, granularity) != day:
+        day += timedelta(days=1)
+    return rollup_period(day, granularity)
+
+
+def daily_chat_counts(user_id=None):
+    match = {"user_id": user_id} if user_id else {}
+    return chat_bucket_collection.aggregate([
+        {"$match": match},
+        {"$unwind": "$messages"},
+        {"$match": {"messages.sender": "user"}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "day": {"$substrBytes": ["$messages.timestamp", 0, 10]}},
+            "count": {"$sum": 1},
+        }},
+    ])
+
+
+def daily_away_counts(user_id=None):
+    match = {"user_id": user_id} if user_id else {}
+    return away_message_collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+            },
+            "count": {"$sum": 1},
+        }},
+    ])
+
+
+def rebuild(user_id=None, now=None):
+    sources = {
+        "commands": (daily_chat_counts(user_id), log_window_start(CHAT_RETENTION_DAYS, now)),
+        "away_messages": (daily_away_counts(user_id), log_window_start(AWAY_LOG_RETENTION_DAYS, now)),
+    }
+
+    # Ordered, so each clear runs before any of the rebuilt counts are set.
+    operations = []
+    totals = {}
+    for field, (rows, window_start) in sources.items():
+        first = {g: first_rebuilt_period(window_start, g) for g in ROLLUP_GRANULARITIES}
+        for granularity, label in first.items():
+            query = {"granularity": granularity}
+            if user_id:
+                query["user_id"] = user_id
+            if label:
+                query["period"] = {"$gte": label}
+            operations.append(UpdateMany(query, {"$unset": {field: ""}}))
+
+        for row in rows:
+            day = datetime.strptime(row["_id"]["day"], "%Y-%m-%d")
+            for granularity in ROLLUP_GRANULARITIES:
+                period = rollup_period(day, granularity)
+                if first[granularity] and period < first[granularity]:
+                    continue
+                counts = totals.setdefault((row["_id"]["user_id"], granularity, period), {})
+                counts[field] = counts.get(field, 0) + row["count"]
+
+    clears = len(operations)
+    operations += [
+        UpdateOne(
+            {"user_id": uid, "granularity": granularity, "period": period},
+            {"$set": counts},
+            upsert=True
+        )
+        for (uid, granularity, period), counts in totals.items()
+    ]
+    for start in range(0, len(operations), 1000):
+        analytics_rollup_collection.bulk_write(operations[start:start + 1000], ordered=True)
+    return len(operations) - clears
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild analytics rollups from chat and away logs.")
+    parser.add_argument("--user-id", help="Only rebuild this user's rollups.")
+    args = parser.parse_args()
+    written = rebuild(args.user_id)
+    print(f"[rollups] rebuilt {written} rollup buckets")
+
+
+if __name__ == "__main__":
+    main()
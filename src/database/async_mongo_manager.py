@@ -0,0 +1,390 @@
+"""Async mirror of mongo_manager for use from async FastAPI handlers and the streaming path.
+
+Function names, arguments and return values match mongo_manager so call
+sites only need an `await`. Collection names, pool options and counter
+definitions are shared with the sync module; the client is built lazily by
+the registry.
+"""
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from datetime import datetime, timedelta
+from bson import ObjectId
+import asyncio
+import uuid
+from src.utils.email_service import send_verification_email
+from src.database.mongo_manager import (
+    COLLECTION_NAME, CHAT_COLLECTION_NAME, AWAY_COLLECTION_NAME, AWAY_MESSAGE_COLLECTION_NAME, STORY_NFT_COLLECTION_NAME,
+    ANALYTICS_ROLLUP_COLLECTION_NAME,
+    CHAT_BUCKET_COLLECTION_NAME,
+    COUNTER_FIELDS,
+    counter_operations, rollup_operations, duplicate_upserts, analytics_rollups_query, ROLLUP_PROJECTION,
+    new_away_session, open_away_session_query, away_session_touch, format_away_message, format_away_session,
+    away_sessions_query, away_messages_query, away_messages_since_query, away_cursor,
+    get_default_profile_data,
+    chat_turn_update, chat_page_query, chat_history_query, collect_chat_page,
+    PROFILE_PROJECTION, PROFILE_VERSION_BUMP,
+    profile_cache, start_profile_invalidation,
+    MONGO_CALL_SECONDS,
+)
+from src.utils.metrics import call_timer
+from src.agents.registry import Lazy, get_async_mongo_db
+
+_timed = call_timer(MONGO_CALL_SECONDS, "async", span="mongo")
+
+db = Lazy(get_async_mongo_db)
+collection = Lazy(lambda: get_async_mongo_db()[COLLECTION_NAME])
+chat_collection = Lazy(lambda: get_async_mongo_db()[CHAT_COLLECTION_NAME])
+chat_bucket_collection = Lazy(lambda: get_async_mongo_db()[CHAT_BUCKET_COLLECTION_NAME])
+away_collection = Lazy(lambda: get_async_mongo_db()[AWAY_COLLECTION_NAME])
+away_message_collection = Lazy(lambda: get_async_mongo_db()[AWAY_MESSAGE_COLLECTION_NAME])
+story_nft_collection = Lazy(lambda: get_async_mongo_db()[STORY_NFT_COLLECTION_NAME])
+analytics_rollup_collection = Lazy(lambda: get_async_mongo_db()[ANALYTICS_ROLLUP_COLLECTION_NAME])
+
+
+@_timed
+async def save_user_auth(user_id: str, hashed_password: str):
+    await collection.update_one(
+        {"user_id": user_id},
+        {"$set": {"user_id": user_id, "password": hashed_password,"plan":"Basic", "analytics": {"emails": 0, "switches": 0, "commands": 0}}},
+        upsert=True
+    )
+
+@_timed
+async def get_user_auth(user_id: str):
+    return await collection.find_one({"user_id": user_id})
+
+@_timed
+async def get_user_by_token(token: str):
+    doc = await collection.find_one({"verification_token": token})
+    if doc:
+        if doc.get("verification_expiry") and datetime.utcnow() > datetime.fromisoformat(doc["verification_expiry"]):
+            return None
+        return doc
+    return None
+
+@_timed
+async def update_user_verification(user_id: str):
+    result = await collection.update_one(
+        {"user_id": user_id},
+        {"$set": {
+            "email_verified": True,
+            "verification_token": None,
+            "verification_expiry": None
+        }}
+    )
+    return result.matched_count > 0
+
+@_timed
+async def set_verification_token(user_id: str, verification_token: str):
+    return await collection.update_one(
+        {"user_id": user_id},
+        {"$set": {
+            "verification_token": verification_token,
+            "verification_expiry": (datetime.utcnow() + timedelta(minutes=15)).isoformat()
+        }}
+    )
+
+@_timed
+async def save_user_profile(user_id: str, profile_data: dict, type: str):
+    if( type == "register"):
+        verification_token = str(uuid.uuid4())
+        await asyncio.to_thread(send_verification_email, user_id, verification_token)
+        await collection.update_one(
+            {"user_id": user_id},
+            {"$set": {
+                "password": profile_data,
+                "plan": "Basic",
+                "analytics": {"emails": 0, "switches": 0, "commands": 0},
+                "profile": get_default_profile_data(),
+                "email_verified": False,
+                "verification_token": verification_token,
+                "verification_expiry": (datetime.utcnow() + timedelta(minutes=15)).isoformat()
+            }, "$inc": PROFILE_VERSION_BUMP},
+            upsert=True
+        )
+    else:
+        await collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"profile": profile_data}, "$inc": PROFILE_VERSION_BUMP},
+            upsert=True
+        )
+    profile_cache.invalidate(user_id)
+
+@_timed
+async def get_user_profile(user_id: str):
+    start_profile_invalidation()
+    hit, profile = profile_cache.get(user_id)
+    if hit:
+        return profile
+
+    doc = await collection.find_one({"user_id": user_id}, PROFILE_PROJECTION)
+    if not doc:
+        return None
+    profile_cache.put(user_id, doc.get("profile"), doc.get("profile_version", 0), doc["_id"])
+    return doc.get("profile")
+
+@_timed
+async def read_user_profile(user_id: str):
+    """Reads the profile straight from Mongo, bypassing the process cache and its invalidation watcher.
+
+    For processes that keep their own copy up to date another way, like bot workers.
+    """
+    doc = await collection.find_one({"user_id": user_id}, PROFILE_PROJECTION)
+    return doc.get("profile") if doc else None
+
+@_timed
+async def update_user_field(user_id: str, updates: dict):
+    result = await collection.update_one(
+        {"user_id": user_id},
+        {"$set": {"profile": updates}, "$inc": PROFILE_VERSION_BUMP},
+    )
+    profile_cache.invalidate(user_id)
+    return result
+
+@_timed
+async def delete_user_profile(user_id: str):
+    result = await collection.delete_one({"user_id": user_id})
+    profile_cache.invalidate(user_id)
+    return result
+
+@_timed
+async def set_mode_mongo(user_id: str, mode: str):
+    result = await collection.update_one(
+        {"user_id": user_id},
+        {"$set": {"profile.mode": mode, "mode": mode}, "$inc": PROFILE_VERSION_BUMP}
+    )
+    profile_cache.invalidate(user_id)
+    return result
+
+@_timed
+async def set_away_mongo(user_id: str, away: bool):
+    """Flips the away flag and opens/closes the away session. Returns the id of a session it closed."""
+    closed = None
+    if away:
+        await start_away_session(user_id)
+    else:
+        closed = await end_away_session(user_id)
+    await collection.update_one(
+        {"user_id": user_id},
+        {"$set": {"profile.away": away}, "$inc": PROFILE_VERSION_BUMP}
+    )
+    profile_cache.invalidate(user_id)
+    return closed["_id"] if closed else None
+
+@_timed
+async def set_chat(user_id: str, user_input: str, response: str):
+    query, update, sort = chat_turn_update(user_id, user_input, response)
+    return await chat_bucket_collection.find_one_and_update(
+        query, update, sort=sort, upsert=True, projection={"_id": 1}
+    )
+
+@_timed
+async def get_chat_page(user_id: str, before: str = None, limit: int = 50):
+    query, sort, position = chat_page_query(user_id, before)
+    buckets = await chat_bucket_collection.find(query, {"_id": 0}).sort(sort).to_list(
+        limit // 2 + 3
+    )
+    return collect_chat_page(buckets, position, limit)
+
+@_timed
+async def get_chat(user_id: str):
+    messages = [m async for m in iter_chat(user_id)]
+    return messages or None
+
+async def iter_chat(user_id: str):
+    """Yields every chat message for the user, oldest first, one bucket at a time."""
+    query, sort = chat_history_query(user_id)
+    async for bucket in chat_bucket_collection.find(query, {"_id": 0}).sort(sort):
+        for message in bucket.get("messages", []):
+            yield message
+
+@_timed
+async def increment_email_count(user_id: str):
+    return await bulk_increment({user_id: COUNTER_FIELDS["email"]})
+
+@_timed
+async def increment_switch_count(user_id: str):
+    return await bulk_increment({user_id: COUNTER_FIELDS["switch"]})
+
+@_timed
+async def increment_command_count(user_id: str):
+    return await bulk_increment({user_id: COUNTER_FIELDS["command"]})
+
+async def _bulk_apply_once(target, operations):
+    # A duplicate key on the first pass may be a concurrent insert; on the second it means already applied.
+    for attempt in range(2):
+        if not operations:
+            return
+        try:
+            await target.bulk_write(operations, ordered=False)
+            return
+        except BulkWriteError as e:
+            operations = duplicate_upserts(e, operations)
+
+@_timed
+async def bulk_increment(increments: dict, flush_id: str = None, when: datetime = None):
+    if not increments:
+        return None
+    flush_id = flush_id or uuid.uuid4().hex
+    when = when or datetime.utcnow()
+    await _bulk_apply_once(collection, counter_operations(increments, flush_id))
+    await _bulk_apply_once(analytics_rollup_collection, rollup_operations(increments, when, flush_id))
+    return flush_id
+
+@_timed
+async def get_analytics(user_id: str):
+    doc = await collection.find_one({"user_id": user_id}, {"_id": 0, "analytics": 1, "plan" : 1})
+
+    return {
+        "analytics": doc.get("analytics") if doc else None,
+        "plan": doc.get("plan") if doc else None,
+    }
+
+@_timed
+async def get_analytics_rollups(user_id: str, granularity: str, start: datetime, end: datetime):
+    query, sort = analytics_rollups_query(user_id, granularity, start, end)
+    cursor = analytics_rollup_collection.find(query, ROLLUP_PROJECTION).sort(sort)
+    return await cursor.to_list(None)
+
+@_timed
+async def start_away_session(user_id: str):
+    try:
+        return await away_collection.insert_one(new_away_session(user_id))
+    except DuplicateKeyError:
+        # A message already opened the session; keep it.
+        return None
+
+@_timed
+async def end_away_session(user_id: str):
+    return await away_collection.find_one_and_update(
+        open_away_session_query(user_id),
+        {"$set": {"end_time": datetime.utcnow()}},
+        projection={"_id": 1}
+    )
+
+@_timed
+async def log_away_message(user_id: str, sender_id: int, sender_name: str, content: str):
+    now = datetime.utcnow()
+    for attempt in range(2):
+        try:
+            session = await away_collection.find_one_and_update(
+                open_away_session_query(user_id),
+                away_session_touch(now),
+                projection={"_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            # A concurrent upsert opened the session first; the retry matches it.
+            if attempt:
+                raise
+
+    return await away_message_collection.insert_one({
+        "user_id": user_id,
+        "session_id": session["_id"],
+        "sender_id": sender_id,
+        "sender_name": sender_name,
+        "content": content,
+        "timestamp": now
+    })
+
+@_timed
+async def get_away_sessions(user_id: str, before: str = None, limit: int = 20):
+    query, sort = away_sessions_query(user_id, before)
+    cursor = away_collection.find(query).sort(sort).limit(limit)
+    sessions = [format_away_session(doc) async for doc in cursor]
+    next_cursor = away_cursor(sessions[-1]["start_time"], sessions[-1]["session_id"]) if len(sessions) == limit else None
+    return sessions, next_cursor
+
+@_timed
+async def get_away_session_messages(user_id: str, session_id: str, after: str = None, limit: int = 100):
+    query, sort = away_messages_query(user_id, session_id, after)
+    cursor = away_message_collection.find(query).sort(sort).limit(limit)
+    docs = await cursor.to_list(limit)
+    next_cursor = away_cursor(docs[-1]["timestamp"], docs[-1]["_id"]) if len(docs) == limit else None
+    return [format_away_message(doc) for doc in docs], next_cursor
+
+@_timed
+async def get_away_session_doc(user_id: str, session_id):
+    return await away_collection.find_one({"_id": ObjectId(session_id), "user_id": user_id})
+
+@_timed
+async def get_away_messages_since(user_id: str, session_id, after_id: ObjectId = None, after: datetime = None):
+    """Messages of one session after the watermark, oldest first, with their _id and timestamp."""
+    query, sort = away_messages_since_query(user_id, session_id, after_id, after)
+    cursor = away_message_collection.find(query).sort(sort)
+    return await cursor.to_list(None)
+
+@_timed
+async def save_away_session_summary(session_id, summary: str, summary_hash: str, message_count: int,
+                                    last_message_id: ObjectId, last_message_at: datetime,
+                                    expected_hash: str = None, expected_last_message_id: ObjectId = None):
+    """Stores a summary only if the session still has the summary it was built from.
+
+    Returns False when a concurrent refresh already moved the watermark.
+    """
+    result = await away_collection.update_one(
+        {
+            "_id": ObjectId(session_id),
+            "summary_hash": expected_hash,
+            "summary_last_message_id": expected_last_message_id,
+        },
+        {"$set": {
+            "summary": summary,
+            "summary_hash": summary_hash,
+            "summary_message_count": message_count,
+            "summary_last_message_id": last_message_id,
+            "summary_last_message_at": last_message_at,
+            "summarized_at": datetime.utcnow()
+        }}
+    )
+    return result.modified_count == 1
+
+@_timed
+async def get_away_logs(user_id: str):
+    sessions = []
+    async for session in away_collection.find({"user_id": user_id}).sort("start_time", 1):
+        cursor = away_message_collection.find(
+            {"user_id": user_id, "session_id": session["_id"]}, {"_id": 0}
+        ).sort("timestamp", 1)
+        sessions.append({
+            "session_id": str(session["_id"]),
+            "start_time": session.get("start_time"),
+            "end_time": session.get("end_time"),
+            "messages": [format_away_message(m) async for m in cursor]
+        })
+
+    return sessions
+
+@_timed
+async def save_story_nft(user_id: str, result: dict):
+    await story_nft_collection.update_one(
+        {"user_id": user_id},
+        {"$push": {"story_nfts": result}},
+        upsert=True
+    )
+
+@_timed
+async def get_story_nfts(user_id: str):
+    doc = await story_nft_collection.find_one({"user_id": user_id}, {"_id": 0})
+    return doc.get("story_nfts") if doc else None
+
+@_timed
+async def set_plan(user_id: str, plan: str, tx_hash: str, subscribed_at: datetime):
+    valid_plans = ["Basic", "Premium", "Pro"]
+    if plan not in valid_plans:
+        raise ValueError(f"Invalid plan: {plan}. Must be one of {valid_plans}.")
+
+    result = await collection.update_one(
+        {"user_id": user_id},
+        {"$set": {"plan": plan, "tx_hash": tx_hash, "subscribed_at": subscribed_at}, "$inc": PROFILE_VERSION_BUMP},
+        upsert=True
+    )
+    profile_cache.invalidate(user_id)
+    return result
+
+@_timed
+async def get_plan(user_id: str):
+    doc = await collection.find_one({"user_id": user_id})
+    return doc.get("plan") if doc else None
@@ -0,0 +1,112 @@
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from src.database.mongo_manager import COUNTER_FIELDS, bulk_increment
+from src.utils.metrics import Histogram
+
+
+class CounterAggregator:
+    """Coalesces analytics counter increments in memory and flushes them in bulk.
+
+    Deltas are merged per user and per field, then written as one unordered
+    bulk_write every flush_interval_ms or as soon as max_pending updates
+    have been recorded, whichever comes first.
+
+    Each flushed batch carries an id and a timestamp. A batch that fails is
+    retried as is, with the same id, before any newer deltas are written;
+    the writer skips documents that already applied that id, so a retry
+    after a partial failure never counts an increment twice.
+    """
+
+    def __init__(self, flush_interval_ms=1000, max_pending=500, writer=bulk_increment):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending = max_pending
+        self.writer = writer
+        self._deltas = {}
+        self._pending_updates = 0
+        self._failed = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+        self.flush_latency_histogram = Histogram(
+            "counter_flush_seconds", [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+            "Duration of one bulk counter flush.",
+        )
+        self.flushed_updates = 0
+        self.last_flush_error = None
+
+        self._worker = threading.Thread(target=self._run, name="counter-aggregator", daemon=True)
+        self._worker.start()
+
+    def increment(self, user_id, counter):
+        self.add(user_id, COUNTER_FIELDS[counter])
+
+    def add(self, user_id, fields):
+        with self._lock:
+            totals = self._deltas.setdefault(user_id, {})
+            for field, delta in fields.items():
+                totals[field] = totals.get(field, 0) + delta
+            self._pending_updates += 1
+            full = self._pending_updates >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        # Only this method and close() touch _failed, and close() joins the worker first.
+        if self._failed is not None:
+            if not self._write(self._failed):
+                return
+            self._failed = None
+
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            updates, self._pending_updates = self._pending_updates, 0
+        if not deltas:
+            return
+
+        batch = (uuid.uuid4().hex, datetime.utcnow(), deltas, updates)
+        if not self._write(batch):
+            self._failed = batch
+
+    def _write(self, batch):
+        flush_id, when, deltas, updates = batch
+        started = time.perf_counter()
+        try:
+            self.writer(deltas, flush_id=flush_id, when=when)
+            self.flushed_updates += updates
+            return True
+        except Exception as e:
+            self.last_flush_error = str(e)
+            print(f"[counters] flush {flush_id} failed, will retry:", e)
+            return False
+        finally:
+            self.flush_latency_histogram.observe(time.perf_counter() - started)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self, timeout=10):
+        """Stops the worker and writes whatever is still pending (called on shutdown)."""
+        self._stopped.set()
+        self._wake.set()
+        self._worker.join(timeout)
+        self.flush()
+
+    def stats(self):
+        failed = self._failed
+        with self._lock:
+            pending_updates = self._pending_updates + (failed[3] if failed else 0)
+            pending_users = len(set(self._deltas) | set(failed[2] if failed else ()))
+        return {
+            "pending_updates": pending_updates,
+            "pending_users": pending_users,
+            "flushed_updates": self.flushed_updates,
+            "flush_seconds": self.flush_latency_histogram.snapshot(),
+            "last_flush_error": self.last_flush_error,
+        }
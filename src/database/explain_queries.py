@@ -0,0 +1,91 @@
+"""Runs explain() on every query shape mongo_manager issues and fails on a COLLSCAN.
+
+    python -m src.database.explain_queries
+
+Intended for CI or a pre-deploy check against a database that has had
+ensure_indexes() applied. Exits 1 when any shape is not index-backed.
+"""
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+
+from src.database.mongo_manager import (
+    db,
+    COLLECTION_NAME, CHAT_COLLECTION_NAME, CHAT_BUCKET_COLLECTION_NAME,
+    AWAY_COLLECTION_NAME, AWAY_MESSAGE_COLLECTION_NAME, STORY_NFT_COLLECTION_NAME, ANALYTICS_ROLLUP_COLLECTION_NAME,
+    chat_turn_update, chat_page_query, chat_history_query,
+    open_away_session_query, away_sessions_query, away_messages_query, away_messages_since_query, away_cursor,
+    analytics_rollups_query,
+)
+from src.database.indexes import ensure_indexes
+
+SAMPLE_USER = "explain@example.com"
+
+
+def query_shapes():
+    """(description, collection, filter, sort) for every shape, built by the helpers the data layer queries with."""
+    open_bucket, _, open_bucket_sort = chat_turn_update(SAMPLE_USER, "", "")
+    newest_page, page_sort, _ = chat_page_query(SAMPLE_USER)
+    older_page, _, _ = chat_page_query(SAMPLE_USER, "1:0")
+    return [
+        ("profile by user_id", COLLECTION_NAME, {"user_id": SAMPLE_USER}, None),
+        ("profile by verification_token", COLLECTION_NAME, {"verification_token": "token"}, None),
+        ("profile versions poll", COLLECTION_NAME, {"user_id": {"$in": [SAMPLE_USER]}}, None),
+        ("open chat bucket", CHAT_BUCKET_COLLECTION_NAME, open_bucket, open_bucket_sort),
+        ("newest chat page", CHAT_BUCKET_COLLECTION_NAME, newest_page, page_sort),
+        ("older chat page", CHAT_BUCKET_COLLECTION_NAME, older_page, page_sort),
+        ("chat export", CHAT_BUCKET_COLLECTION_NAME, *chat_history_query(SAMPLE_USER)),
+        ("legacy chat", CHAT_COLLECTION_NAME, {"user_id": SAMPLE_USER}, None),
+        ("open away session", AWAY_COLLECTION_NAME, open_away_session_query(SAMPLE_USER), None),
+        ("away sessions page", AWAY_COLLECTION_NAME, *away_sessions_query(SAMPLE_USER, away_cursor(datetime(2030, 1, 1), ObjectId()))),
+        ("away sessions", AWAY_COLLECTION_NAME, {"user_id": SAMPLE_USER}, [("start_time", 1)]),
+        ("away session messages", AWAY_MESSAGE_COLLECTION_NAME, *away_messages_query(SAMPLE_USER, str(ObjectId()))),
+        ("away session messages page", AWAY_MESSAGE_COLLECTION_NAME,
+         *away_messages_query(SAMPLE_USER, str(ObjectId()), away_cursor(datetime(2030, 1, 1), ObjectId()))),
+        ("away messages since summary", AWAY_MESSAGE_COLLECTION_NAME,
+         *away_messages_since_query(SAMPLE_USER, ObjectId(), ObjectId())),
+        ("story nfts", STORY_NFT_COLLECTION_NAME, {"user_id": SAMPLE_USER}, None),
+        ("analytics range", ANALYTICS_ROLLUP_COLLECTION_NAME,
+         *analytics_rollups_query(SAMPLE_USER, "day", datetime(2025, 1, 1), datetime(2025, 1, 31))),
+    ]
+
+
+def plan_stages(plan):
+    """Yields every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+def explain_shape(database, collection_name, query, sort):
+    cursor = database[collection_name].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explained = cursor.explain()
+    return list(plan_stages(explained.get("queryPlanner", {}).get("winningPlan", {})))
+
+
+def main():
+    ensure_indexes(db)
+    failures = []
+    for description, collection_name, query, sort in query_shapes():
+        stages = explain_shape(db, collection_name, query, sort)
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"[explain] {status:8} {collection_name:14} {description}: {' <- '.join(stages)}")
+        if status != "ok":
+            failures.append(description)
+
+    if failures:
+        print(f"[explain] {len(failures)} query shape(s) fall back to a collection scan: {', '.join(failures)}")
+        sys.exit(1)
+    print("[explain] all query shapes are index-backed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from src.database.mongo_manager import (
+    db,
+    COLLECTION_NAME, CHAT_COLLECTION_NAME, CHAT_BUCKET_COLLECTION_NAME,
+    AWAY_COLLECTION_NAME, AWAY_MESSAGE_COLLECTION_NAME, STORY_NFT_COLLECTION_NAME, ANALYTICS_ROLLUP_COLLECTION_NAME,
+    close_extra_open_sessions,
+)
+
+CHAT_RETENTION_DAYS = os.getenv("CHAT_RETENTION_DAYS")
+AWAY_LOG_RETENTION_DAYS = os.getenv("AWAY_LOG_RETENTION_DAYS")
+
+# (collection, keys, options) for every index the data layer relies on.
+INDEX_SPECS = [
+    (COLLECTION_NAME, [("user_id", ASCENDING)], {"name": "user_id_unique", "unique": True}),
+    (COLLECTION_NAME, [("verification_token", ASCENDING)], {"name": "verification_token_sparse", "sparse": True}),
+    (CHAT_BUCKET_COLLECTION_NAME, [("user_id", ASCENDING), ("seq", DESCENDING)], {"name": "user_id_seq_unique", "unique": True}),
+    (CHAT_COLLECTION_NAME, [("user_id", ASCENDING)], {"name": "user_id"}),
+    (AWAY_COLLECTION_NAME, [("user_id", ASCENDING), ("end_time", ASCENDING)], {"name": "user_id_end_time"}),
+    (AWAY_COLLECTION_NAME, [("user_id", ASCENDING), ("start_time", DESCENDING), ("_id", DESCENDING)], {"name": "user_id_start_time_id"}),
+    # At most one open session per user. Partial indexes reject `end_time: null`
+    # equality, so match on the BSON null type, which open sessions always store.
+    (AWAY_COLLECTION_NAME, [("user_id", ASCENDING)], {
+        "name": "user_id_open_session_unique", "unique": True,
+        "partialFilterExpression": {"end_time": {"$type": "null"}},
+    }),
+    (AWAY_MESSAGE_COLLECTION_NAME, [("user_id", ASCENDING), ("session_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], {"name": "user_id_session_id_timestamp_id"}),
+    (AWAY_MESSAGE_COLLECTION_NAME, [("user_id", ASCENDING), ("session_id", ASCENDING), ("_id", ASCENDING)], {"name": "user_id_session_id_id"}),
+    (STORY_NFT_COLLECTION_NAME, [("user_id", ASCENDING)], {"name": "user_id"}),
+    (ANALYTICS_ROLLUP_COLLECTION_NAME, [("user_id", ASCENDING), ("granularity", ASCENDING), ("period", ASCENDING)], {"name": "user_id_granularity_period_unique", "unique": True}),
+]
+
+# A bucket expires once its newest message is past retention, and an away
+# session once it has ended: open sessions keep a null end_time, which TTL skips.
+if CHAT_RETENTION_DAYS:
+    INDEX_SPECS.append((
+        CHAT_BUCKET_COLLECTION_NAME, [("last_message_at", ASCENDING)],
+        {"name": "last_message_at_ttl", "expireAfterSeconds": int(float(CHAT_RETENTION_DAYS) * 86400)},
+    ))
+
+if AWAY_LOG_RETENTION_DAYS:
+    INDEX_SPECS.append((
+        AWAY_COLLECTION_NAME, [("end_time", ASCENDING)],
+        {"name": "end_time_ttl", "expireAfterSeconds": int(float(AWAY_LOG_RETENTION_DAYS) * 86400)},
+    ))
+    INDEX_SPECS.append((
+        AWAY_MESSAGE_COLLECTION_NAME, [("timestamp", ASCENDING)],
+        {"name": "timestamp_ttl", "expireAfterSeconds": int(float(AWAY_LOG_RETENTION_DAYS) * 86400)},
+    ))
+
+# (collection, name) of indexes that were replaced and must not linger.
+RETIRED_INDEXES = [
+    (CHAT_BUCKET_COLLECTION_NAME, "created_at_ttl"),
+    (AWAY_COLLECTION_NAME, "start_time_ttl"),
+    (AWAY_COLLECTION_NAME, "user_id_start_time"),
+    (AWAY_MESSAGE_COLLECTION_NAME, "user_id_session_id_timestamp"),
+]
+
+
+def ensure_indexes(database=db):
+    """Drops retired indexes and creates any missing ones. Failures are reported per index and never stop startup."""
+    created, failed = [], []
+    for collection_name, name in RETIRED_INDEXES:
+        try:
+            if name in database[collection_name].index_information():
+                database[collection_name].drop_index(name)
+                print(f"[indexes] dropped retired {collection_name}.{name}")
+        except PyMongoError as e:
+            failed.append(f"{collection_name}.{name}")
+            print(f"[indexes] could not drop retired {collection_name}.{name}: {e}")
+
+    # The unique open-session index cannot build while a user has two open sessions.
+    try:
+        closed = close_extra_open_sessions(database[AWAY_COLLECTION_NAME])
+        if closed:
+            print(f"[indexes] closed {closed} duplicate open away sessions")
+    except PyMongoError as e:
+        print(f"[indexes] could not close duplicate open away sessions: {e}")
+
+    for collection_name, keys, options in INDEX_SPECS:
+        try:
+            database[collection_name].create_index(keys, **options)
+            created.append(f"{collection_name}.{options['name']}")
+        except PyMongoError as e:
+            failed.append(f"{collection_name}.{options['name']}")
+            print(f"[indexes] could not create {collection_name}.{options['name']}: {e}")
+
+    print(f"[indexes] ensured {len(created)} indexes" + (f", {len(failed)} failed" if failed else ""))
+    return {"created": created, "failed": failed}
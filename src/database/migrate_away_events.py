@@ -0,0 +1,14 @@
+"""One-shot migration of embedded away_logs.messages into the away_messages event log.
+
+    python -m src.database.migrate_away_events
+"""
+from src.database.mongo_manager import migrate_legacy_away_sessions
+
+
+def main():
+    moved = migrate_legacy_away_sessions()
+    print(f"[away-migrate] done: moved {moved} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""One-shot migration of legacy chat_history documents into chat_buckets.
+
+    python -m src.database.migrate_chat_buckets
+"""
+from src.database.mongo_manager import chat_collection, migrate_legacy_chat
+
+
+def main():
+    users = chat_collection.distinct("user_id")
+    total = 0
+    for user_id in users:
+        moved = migrate_legacy_chat(user_id)
+        total += moved
+        print(f"[chat-migrate] {user_id}: {moved} messages")
+    print(f"[chat-migrate] done: {total} messages across {len(users)} users")
+
+
+if __name__ == "__main__":
+    main()
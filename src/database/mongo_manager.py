@@ -1,25 +1,59 @@
-from pymongo import MongoClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime, timedelta
 import os
+import time
 from dotenv import load_dotenv
 import uuid
+import threading
 from src.utils.email_service import send_verification_email
+from src.database.profile_cache import ProfileCache
+from src.utils.metrics import REGISTRY, call_timer
+from src.agents.registry import Lazy, get_mongo_db
 
 load_dotenv(override=True)
 
+MONGO_CALL_SECONDS = REGISTRY.histogram_family(
+    "mongo_call_seconds", ("client", "function"), description="Latency of mongo_manager calls."
+)
+_timed = call_timer(MONGO_CALL_SECONDS, "sync", span="mongo")
+
 MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = "persona_bot"
+DB_NAME = os.getenv("MONGO_DB_NAME", "persona_bot")
 COLLECTION_NAME = "user_profiles"
 CHAT_COLLECTION_NAME = "chat_history"
+CHAT_BUCKET_COLLECTION_NAME = "chat_buckets"
+CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", "100"))
 AWAY_COLLECTION_NAME = "away_logs"
+AWAY_MESSAGE_COLLECTION_NAME = "away_messages"
 STORY_NFT_COLLECTION_NAME = "story_nft"
-
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-collection = db[COLLECTION_NAME]
-chat_collection = db[CHAT_COLLECTION_NAME]
-away_collection = db[AWAY_COLLECTION_NAME]
-story_nft_collection = db[STORY_NFT_COLLECTION_NAME]
+ANALYTICS_ROLLUP_COLLECTION_NAME = "analytics_rollups"
+MONGO_POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+}
+
+# Connected on first use through the registry, so importing this module never touches the network.
+db = Lazy(get_mongo_db)
+collection = Lazy(lambda: get_mongo_db()[COLLECTION_NAME])
+chat_collection = Lazy(lambda: get_mongo_db()[CHAT_COLLECTION_NAME])
+chat_bucket_collection = Lazy(lambda: get_mongo_db()[CHAT_BUCKET_COLLECTION_NAME])
+away_collection = Lazy(lambda: get_mongo_db()[AWAY_COLLECTION_NAME])
+away_message_collection = Lazy(lambda: get_mongo_db()[AWAY_MESSAGE_COLLECTION_NAME])
+story_nft_collection = Lazy(lambda: get_mongo_db()[STORY_NFT_COLLECTION_NAME])
+analytics_rollup_collection = Lazy(lambda: get_mongo_db()[ANALYTICS_ROLLUP_COLLECTION_NAME])
+
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_CACHE_POLL_SECONDS = float(os.getenv("PROFILE_CACHE_POLL_SECONDS", "5"))
+PROFILE_PROJECTION = {"profile": 1, "profile_version": 1}
+PROFILE_VERSION_BUMP = {"profile_version": 1}
+
+profile_cache = ProfileCache(PROFILE_CACHE_TTL_SECONDS, PROFILE_CACHE_SIZE)
+_profile_watcher = None
+_profile_watcher_lock = threading.Lock()
 
 def get_default_profile_data():
     return {
@@ -53,6 +87,7 @@ def get_default_profile_data():
     }
 
 
+@_timed
 def save_user_auth(user_id: str, hashed_password: str): 
     collection.update_one(
         {"user_id": user_id},
@@ -60,10 +95,12 @@ def save_user_auth(user_id: str, hashed_password: str):
         upsert=True
     )
 
+@_timed
 def get_user_auth(user_id: str):
     doc = collection.find_one({"user_id": user_id})
     return doc
 
+@_timed
 def get_user_by_token(token: str):
     doc = collection.find_one({"verification_token": token})
     if doc:
@@ -72,6 +109,7 @@ def get_user_by_token(token: str):
         return doc
     return None
 
+@_timed
 def update_user_verification(user_id: str):
     doc = collection.find_one({"user_id": user_id})
     if doc:
@@ -86,7 +124,17 @@ def update_user_verification(user_id: str):
         return True
     return False
 
+@_timed
+def set_verification_token(user_id: str, verification_token: str):
+    return collection.update_one(
+        {"user_id": user_id},
+        {"$set": {
+            "verification_token": verification_token,
+            "verification_expiry": (datetime.utcnow() + timedelta(minutes=15)).isoformat()
+        }}
+    )
 
+@_timed
 def save_user_profile(user_id: str, profile_data: dict, type: str):
     if( type == "register"):
         verification_token = str(uuid.uuid4())
@@ -101,149 +149,649 @@ def save_user_profile(user_id: str, profile_data: dict, type: str):
                 "email_verified": False,
                 "verification_token": verification_token,
                 "verification_expiry": (datetime.utcnow() + timedelta(minutes=15)).isoformat()
-            }},
+            }, "$inc": PROFILE_VERSION_BUMP},
             upsert=True
         )
     else:
         collection.update_one(
             {"user_id": user_id},
-            {"$set": {"profile": profile_data}},
+            {"$set": {"profile": profile_data}, "$inc": PROFILE_VERSION_BUMP},
             upsert=True
         )
-
+    profile_cache.invalidate(user_id)
+
+def _watch_profile_changes():
+    """Invalidates cached profiles written by other processes.
+
+    Uses a change stream on profile_version bumps when the deployment
+    supports it (replica sets / Atlas) and falls back to polling the
+    versions of cached users otherwise.
+    """
+    pipeline = [{"$match": {"$or": [
+        {"operationType": {"$in": ["replace", "delete"]}},
+        {"updateDescription.updatedFields.profile_version": {"$exists": True}},
+    ]}}]
+    try:
+        with collection.watch(pipeline) as stream:
+            for change in stream:
+                profile_cache.invalidate_doc(change["documentKey"]["_id"])
+    except Exception as e:
+        print(f"[profile-cache] change stream unavailable ({e}); polling every {PROFILE_CACHE_POLL_SECONDS}s")
+
+    while True:
+        time.sleep(PROFILE_CACHE_POLL_SECONDS)
+        cached = list(profile_cache.versions())
+        if not cached:
+            continue
+        try:
+            current = {
+                doc["user_id"]: doc.get("profile_version", 0)
+                for doc in collection.find({"user_id": {"$in": cached}}, {"user_id": 1, "profile_version": 1})
+            }
+            profile_cache.drop_stale(current)
+        except Exception as e:
+            print("[profile-cache] poll failed:", e)
+
+def start_profile_invalidation():
+    """Starts the cross-process invalidation thread once per process."""
+    global _profile_watcher
+    if _profile_watcher is not None:
+        return
+    with _profile_watcher_lock:
+        if _profile_watcher is None:
+            _profile_watcher = threading.Thread(target=_watch_profile_changes, name="profile-cache-watch", daemon=True)
+            _profile_watcher.start()
+
+@_timed
 def get_user_profile(user_id: str):
-    doc = collection.find_one({"user_id": user_id}, {"_id": 0})
-    return doc.get("profile") if doc else None
-
+    start_profile_invalidation()
+    hit, profile = profile_cache.get(user_id)
+    if hit:
+        return profile
+
+    doc = collection.find_one({"user_id": user_id}, PROFILE_PROJECTION)
+    if not doc:
+        return None
+    profile_cache.put(user_id, doc.get("profile"), doc.get("profile_version", 0), doc["_id"])
+    return doc.get("profile")
+
+@_timed
 def update_user_field(user_id: str, updates: dict):
-    return collection.update_one(
+    result = collection.update_one(
         {"user_id": user_id},
-        {"$set": {"profile": updates}},
+        {"$set": {"profile": updates}, "$inc": PROFILE_VERSION_BUMP},
     )
+    profile_cache.invalidate(user_id)
+    return result
 
+@_timed
 def delete_user_profile(user_id: str):
-    return collection.delete_one({"user_id": user_id})
+    result = collection.delete_one({"user_id": user_id})
+    profile_cache.invalidate(user_id)
+    return result
 
+@_timed
 def set_mode_mongo(user_id: str, mode: str):
-    collection.update_one(
+    result = collection.update_one(
         {"user_id": user_id},
-        {"$set": {"profile.mode": mode}}
+        {"$set": {"profile.mode": mode, "mode": mode}, "$inc": PROFILE_VERSION_BUMP}
     )
-    return collection.update_one({"user_id": user_id}, {"$set": {"mode": mode}})
+    profile_cache.invalidate(user_id)
+    return result
 
+@_timed
 def set_away_mongo(user_id: str, away: bool):
+    """Flips the away flag and opens/closes the away session. Returns the id of a session it closed."""
+    closed = None
     if away:
         start_away_session(user_id)
     else:
-        end_away_session(user_id)
-    return collection.update_one(
+        closed = end_away_session(user_id)
+    collection.update_one(
         {"user_id": user_id},
-        {"$set": {"profile.away": away}}
+        {"$set": {"profile.away": away}, "$inc": PROFILE_VERSION_BUMP}
     )
-
-def set_chat(user_id: str, user_input: str, response: str):
-    chat_collection.update_one(
-        {"user_id": user_id},
-        {"$push": {"chat": {
-            "sender": "user",
-            "content": user_input,
-            "timestamp": datetime.now().isoformat()
-        }}},
-        upsert=True
+    profile_cache.invalidate(user_id)
+    return closed["_id"] if closed else None
+
+CHAT_OPEN_BUCKET_SORT = [("seq", -1)]
+CHAT_PAGE_SORT = [("seq", -1)]
+CHAT_HISTORY_SORT = [("seq", 1)]
+
+def chat_turn_messages(user_input: str, response: str, timestamp: str):
+    return [
+        {"sender": "user", "content": user_input, "timestamp": timestamp},
+        {"sender": "bot", "content": response, "timestamp": timestamp}
+    ]
+
+def chat_turn_update(user_id: str, user_input: str, response: str, timestamp: str = None):
+    """Filter/update/sort that appends one user+bot turn to the user's newest open chat bucket.
+
+    A bucket is open while it is not marked closed and has room for a full
+    turn; when none is open the upsert starts a new one whose seq is its
+    creation time in nanoseconds, so buckets sort chronologically per user.
+    Migrated legacy buckets are stored closed, so new turns never land in them.
+    """
+    # UTC, like rollup_period(): analytics_rollups buckets turns by the date prefix of this string.
+    timestamp = timestamp or datetime.utcnow().isoformat()
+    return (
+        {"user_id": user_id, "closed": False, "count": {"$lte": CHAT_BUCKET_SIZE - 2}},
+        {
+            "$push": {"messages": {"$each": chat_turn_messages(user_input, response, timestamp)}},
+            "$inc": {"count": 2},
+            # The retention TTL keys on last_message_at, so a bucket expires only once its newest turn has.
+            "$set": {"end_ts": timestamp, "last_message_at": datetime.utcnow()},
+            "$setOnInsert": {"seq": time.time_ns(), "start_ts": timestamp, "created_at": datetime.utcnow()},
+        },
+        CHAT_OPEN_BUCKET_SORT,
     )
 
-    chat_collection.update_one(
-        {"user_id": user_id},
-        {"$push": {"chat": {
-            "sender": "bot",
-            "content": response,
-            "timestamp": datetime.now().isoformat()
-        }}},
-        upsert=True
+def chat_turns_update(user_id: str, turns: list):
+    """Filter/update/sort that appends several (user_input, response, timestamp) turns to the user's newest open bucket.
+
+    The filter only matches a bucket with room for all of them, and there is
+    no upsert: when they do not fit the caller falls back to chat_turn_update
+    per turn, which fills the open bucket before starting the next one.
+    """
+    messages = [m for user_input, response, timestamp in turns for m in chat_turn_messages(user_input, response, timestamp)]
+    return (
+        {"user_id": user_id, "closed": False, "count": {"$lte": CHAT_BUCKET_SIZE - len(messages)}},
+        {
+            "$push": {"messages": {"$each": messages}},
+            "$inc": {"count": len(messages)},
+            "$set": {"end_ts": turns[-1][2], "last_message_at": datetime.utcnow()},
+        },
+        CHAT_OPEN_BUCKET_SORT,
     )
 
-def get_chat(user_id: str):
-    doc = chat_collection.find_one({"user_id": user_id}, {"_id": 0})
-    return doc.get("chat") if doc else None
+def parse_chat_cursor(cursor: str):
+    """Splits a "<seq>:<offset>" chat cursor; raises ValueError when malformed."""
+    seq, offset = cursor.split(":")
+    return int(seq), int(offset)
+
+def chat_page_query(user_id: str, before: str = None):
+    """Bucket filter, sort and cursor position for the page that ends just before `before` (or at the newest message)."""
+    if not before:
+        return {"user_id": user_id}, CHAT_PAGE_SORT, None
+    seq, offset = parse_chat_cursor(before)
+    return {"user_id": user_id, "seq": {"$lte": seq}}, CHAT_PAGE_SORT, (seq, offset)
+
+def chat_history_query(user_id: str):
+    """Filter and sort for reading every bucket of a user's history, oldest first."""
+    return {"user_id": user_id}, CHAT_HISTORY_SORT
+
+def collect_chat_page(buckets, position, limit: int):
+    """Walks buckets newest-first and returns (messages oldest-first, next cursor).
+
+    The cursor is None once the page reaches the user's first message.
+    """
+    page = []
+    oldest = None
+    buckets = iter(buckets)
+    for bucket in buckets:
+        messages = bucket.get("messages", [])
+        if position and bucket["seq"] == position[0]:
+            messages = messages[:position[1]]
+        take = messages[-(limit - len(page)):] if limit > len(page) else []
+        if not take:
+            continue
+        page[:0] = take
+        oldest = (bucket["seq"], len(messages) - len(take))
+        if len(page) >= limit:
+            break
+
+    has_older = oldest is not None and (oldest[1] > 0 or next(buckets, None) is not None)
+    next_cursor = f"{oldest[0]}:{oldest[1]}" if has_older and len(page) >= limit else None
+    return page, next_cursor
+
+@_timed
+def set_chat(user_id: str, user_input: str, response: str):
+    query, update, sort = chat_turn_update(user_id, user_input, response)
+    return chat_bucket_collection.find_one_and_update(query, update, sort=sort, upsert=True, projection={"_id": 1})
 
+@_timed
+def get_chat_page(user_id: str, before: str = None, limit: int = 50):
+    query, sort, position = chat_page_query(user_id, before)
+    buckets = chat_bucket_collection.find(query, {"_id": 0}).sort(sort)
+    return collect_chat_page(buckets, position, limit)
 
-def increment_email_count(user_id: str):
-    return collection.update_one(
-        {"user_id": user_id},
-        {"$inc": {"analytics.emails": 1, "chat_count": 1}},
+@_timed
+def get_chat(user_id: str):
+    messages = [m for bucket in iter_chat_buckets(user_id) for m in bucket.get("messages", [])]
+    return messages or None
+
+def iter_chat_buckets(user_id: str):
+    query, sort = chat_history_query(user_id)
+    return chat_bucket_collection.find(query, {"_id": 0}).sort(sort)
+
+def _message_time(message):
+    try:
+        return datetime.fromisoformat(message.get("timestamp"))
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+
+def migrate_legacy_chat(user_id: str):
+    """Splits a legacy single-document chat_history array into buckets and removes it."""
+    doc = chat_collection.find_one({"user_id": user_id})
+    if not doc or not doc.get("chat"):
+        return 0
+
+    chat = doc["chat"]
+    chunks = [chat[start:start + CHAT_BUCKET_SIZE] for start in range(0, len(chat), CHAT_BUCKET_SIZE)]
+
+    # Legacy history predates every live bucket, so number it just below the oldest one
+    # and close it: later turns must go to a live bucket even if the last chunk has room.
+    first_live = chat_bucket_collection.find_one({"user_id": user_id}, {"seq": 1}, sort=[("seq", 1)])
+    base_seq = (first_live["seq"] if first_live else time.time_ns()) - len(chunks)
+    buckets = [
+        {
+            "user_id": user_id,
+            "seq": base_seq + i,
+            "count": len(chunk),
+            "closed": True,
+            "messages": chunk,
+            "start_ts": chunk[0].get("timestamp"),
+            "end_ts": chunk[-1].get("timestamp"),
+            "last_message_at": _message_time(chunk[-1]),
+            "created_at": datetime.utcnow(),
+        }
+        for i, chunk in enumerate(chunks)
+    ]
+    chat_bucket_collection.insert_many(buckets)
+    chat_collection.delete_one({"_id": doc["_id"]})
+    return len(chat)
+
+
+# Analytics counters only; metered plan usage (chat_count/email_count) is owned by quota.QuotaEngine.
+COUNTER_FIELDS = {
+    "email": {"analytics.emails": 1},
+    "switch": {"analytics.switches": 1},
+    "command": {"analytics.commands": 1},
+    "away_message": {"analytics.away_messages": 1},
+}
+
+ROLLUP_GRANULARITIES = ("day", "week", "month")
+
+def rollup_period(when: datetime, granularity: str):
+    """Bucket label for a timestamp: 2025-05-04, 2025-W18 or 2025-05. Labels sort chronologically."""
+    if granularity == "day":
+        return when.strftime("%Y-%m-%d")
+    if granularity == "week":
+        year, week, _ = when.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "month":
+        return when.strftime("%Y-%m")
+    raise ValueError(f"Invalid granularity: {granularity}. Must be one of {list(ROLLUP_GRANULARITIES)}.")
+
+# Counter flushes are retried whole, so every $inc is guarded by the flush's id:
+# a document records the last few ids applied to it and skips a repeated one.
+APPLIED_FLUSHES_FIELD = "applied_flushes"
+APPLIED_FLUSHES_KEPT = 20
+
+def apply_once(query: dict, increments: dict, flush_id: str):
+    """Upsert that applies `increments` to the matching document unless flush_id was already applied."""
+    return UpdateOne(
+        {**query, APPLIED_FLUSHES_FIELD: {"$ne": flush_id}},
+        {
+            "$inc": increments,
+            "$push": {APPLIED_FLUSHES_FIELD: {"$each": [flush_id], "$slice": -APPLIED_FLUSHES_KEPT}},
+        },
         upsert=True
     )
 
+def counter_operations(increments: dict, flush_id: str):
+    """Guarded upserts that add {user_id: {field: delta}} to the users' profile documents."""
+    return [apply_once({"user_id": user_id}, fields, flush_id) for user_id, fields in increments.items()]
+
+def rollup_operations(increments: dict, when: datetime, flush_id: str):
+    """Guarded upserts that add {user_id: {analytics.field: delta}} to the day/week/month rollups."""
+    operations = []
+    for user_id, fields in increments.items():
+        deltas = {field.split(".", 1)[1]: delta for field, delta in fields.items() if field.startswith("analytics.")}
+        if not deltas:
+            continue
+        for granularity in ROLLUP_GRANULARITIES:
+            operations.append(apply_once(
+                {"user_id": user_id, "granularity": granularity, "period": rollup_period(when, granularity)},
+                deltas,
+                flush_id
+            ))
+    return operations
+
+def duplicate_upserts(error: BulkWriteError, operations: list):
+    """Operations of a guarded bulk_write that failed on a duplicate key; re-raises on any other failure.
+
+    A guarded upsert hits the unique index either because a concurrent
+    upsert created the document first (a retry then matches it) or because
+    the document already records the flush id (a retry is a no-op).
+    """
+    details = error.details or {}
+    errors = details.get("writeErrors", [])
+    if details.get("writeConcernErrors") or any(e.get("code") != 11000 for e in errors):
+        raise error
+    return [operations[e["index"]] for e in errors]
+
+@_timed
+def increment_email_count(user_id: str):
+    return bulk_increment({user_id: COUNTER_FIELDS["email"]})
+
+@_timed
 def increment_switch_count(user_id: str):
-    return collection.update_one(
-        {"user_id": user_id},
-        {"$inc": {"analytics.switches": 1,}},
-        upsert=True
-    )
+    return bulk_increment({user_id: COUNTER_FIELDS["switch"]})
 
+@_timed
 def increment_command_count(user_id: str):
-    return collection.update_one(
-        {"user_id": user_id},
-        {"$inc": {"analytics.commands": 1, "chat_count": 1}},
-        upsert=True
-    )
-
+    return bulk_increment({user_id: COUNTER_FIELDS["command"]})
+
+class PartialWriteError(Exception):
+    """A batched write that stopped part way; `written` holds the indexes of the items that were stored."""
+
+    def __init__(self, written, cause):
+        super().__init__(f"{len(written)} written before: {cause}")
+        self.written = written
+
+@_timed
+def bulk_set_chat(turns: list):
+    """Appends many (user_id, user_input, response, timestamp) turns, in order per user, and returns how many it wrote.
+
+    Each user's turns go out as one sorted find_one_and_update with a
+    $push/$each (bulk UpdateOne cannot sort before MongoDB 8.0), so a batch
+    costs one round trip per user. Only when the newest open bucket lacks
+    room for them all are that user's turns appended one at a time, filling
+    the bucket before the next is started. Raises PartialWriteError when a
+    write fails, so the caller retries only the turns that were not stored.
+    """
+    by_user = {}
+    for index, (user_id, user_input, response, timestamp) in enumerate(turns):
+        by_user.setdefault(user_id, []).append((index, (user_input, response, timestamp)))
+
+    written = []
+    for user_id, user_turns in by_user.items():
+        try:
+            if len(user_turns) > 1 and 2 * len(user_turns) <= CHAT_BUCKET_SIZE:
+                query, update, sort = chat_turns_update(user_id, [turn for _, turn in user_turns])
+                if chat_bucket_collection.find_one_and_update(query, update, sort=sort, projection={"_id": 1}):
+                    written.extend(index for index, _ in user_turns)
+                    continue
+            for index, turn in user_turns:
+                query, update, sort = chat_turn_update(user_id, *turn)
+                chat_bucket_collection.find_one_and_update(query, update, sort=sort, upsert=True, projection={"_id": 1})
+                written.append(index)
+        except Exception as e:
+            raise PartialWriteError(written, e) from e
+    return len(turns)
+
+def _bulk_apply_once(target, operations):
+    # A duplicate key on the first pass may be a concurrent insert; on the second it means already applied.
+    for attempt in range(2):
+        if not operations:
+            return
+        try:
+            target.bulk_write(operations, ordered=False)
+            return
+        except BulkWriteError as e:
+            operations = duplicate_upserts(e, operations)
+
+@_timed
+def bulk_increment(increments: dict, flush_id: str = None, when: datetime = None):
+    """Applies {user_id: {field: delta}} counter increments and their rollups.
+
+    Calling it again with the same flush_id and `when` (a retry after an
+    error) never applies an increment twice.
+    """
+    if not increments:
+        return None
+    flush_id = flush_id or uuid.uuid4().hex
+    when = when or datetime.utcnow()
+    _bulk_apply_once(collection, counter_operations(increments, flush_id))
+    _bulk_apply_once(analytics_rollup_collection, rollup_operations(increments, when, flush_id))
+    return flush_id
+
+@_timed
 def get_analytics(user_id: str):
     doc = collection.find_one({"user_id": user_id}, {"_id": 0, "analytics": 1, "plan" : 1})
-    plan = doc.get("plan")
 
     return {
         "analytics": doc.get("analytics") if doc else None,
-        "plan": plan,
+        "plan": doc.get("plan") if doc else None,
     }
 
-def start_away_session(user_id: str):
-    away_collection.insert_one({
+ROLLUP_PROJECTION = {"_id": 0, "user_id": 0, "granularity": 0, APPLIED_FLUSHES_FIELD: 0}
+
+def analytics_rollups_query(user_id: str, granularity: str, start: datetime, end: datetime):
+    """Filter and sort for a user's rollups of one granularity between two dates, oldest first."""
+    return (
+        {
+            "user_id": user_id,
+            "granularity": granularity,
+            "period": {"$gte": rollup_period(start, granularity), "$lte": rollup_period(end, granularity)},
+        },
+        [("period", 1)],
+    )
+
+@_timed
+def get_analytics_rollups(user_id: str, granularity: str, start: datetime, end: datetime):
+    query, sort = analytics_rollups_query(user_id, granularity, start, end)
+    return list(analytics_rollup_collection.find(query, ROLLUP_PROJECTION).sort(sort))
+
+# Away mode is stored as one summary document per session in away_logs
+# (counts and time bounds) plus one append-only document per message in
+# away_messages, indexed by (user_id, session_id, timestamp). A unique
+# partial index allows at most one open session (end_time null) per user.
+
+def new_away_session(user_id: str, now: datetime = None):
+    return {
         "user_id": user_id,
-        "start_time": datetime.utcnow(),
+        "start_time": now or datetime.utcnow(),
         "end_time": None,
-        "messages": []
-    })
+        "message_count": 0,
+    }
+
+def open_away_session_query(user_id: str):
+    return {"user_id": user_id, "end_time": None}
+
+def away_session_touch(now: datetime):
+    """Update that records one more message on the open session, opening one if needed.
+
+    Used with open_away_session_query(), which seeds user_id and end_time
+    when the upsert has to open a session.
+    """
+    return {
+        "$inc": {"message_count": 1},
+        "$max": {"last_message_at": now},
+        "$min": {"first_message_at": now},
+        "$setOnInsert": {"start_time": now},
+    }
+
+def format_away_message(message: dict):
+    return f"{message['sender_name']}: {message['content']}"
+
+def format_away_session(session: dict):
+    return {
+        "session_id": str(session["_id"]),
+        "start_time": session.get("start_time"),
+        "end_time": session.get("end_time"),
+        "message_count": session.get("message_count", 0),
+        "first_message_at": session.get("first_message_at"),
+        "last_message_at": session.get("last_message_at"),
+    }
 
+def away_cursor(timestamp: datetime, _id):
+    return f"{timestamp.isoformat()}_{_id}"
+
+def parse_away_cursor(cursor: str):
+    """Splits a "<timestamp>_<_id>" away cursor; raises ValueError when malformed.
+
+    Cursors issued before ids were added are a bare timestamp, whose _id is None.
+    """
+    timestamp, _, _id = cursor.partition("_")
+    try:
+        return datetime.fromisoformat(timestamp), ObjectId(_id) if _id else None
+    except InvalidId as e:
+        raise ValueError(f"invalid cursor id: {_id}") from e
+
+def _past_cursor(field: str, op: str, cursor: str):
+    # Rows can share a timestamp, so the page boundary is (timestamp, _id) and ties are broken by _id.
+    timestamp, _id = parse_away_cursor(cursor)
+    if _id is None:
+        return {field: {op: timestamp}}
+    return {"$or": [{field: {op: timestamp}}, {field: timestamp, "_id": {op: _id}}]}
+
+def away_sessions_query(user_id: str, before: str = None):
+    """Filter and sort for a newest-first page of session summaries."""
+    query = {"user_id": user_id}
+    if before:
+        query.update(_past_cursor("start_time", "$lt", before))
+    return query, [("start_time", -1), ("_id", -1)]
+
+def away_messages_query(user_id: str, session_id: str, after: str = None):
+    """Filter and sort for an oldest-first page of one session's messages."""
+    query = {"user_id": user_id, "session_id": ObjectId(session_id)}
+    if after:
+        query.update(_past_cursor("timestamp", "$gt", after))
+    return query, [("timestamp", 1), ("_id", 1)]
+
+def away_messages_since_query(user_id: str, session_id, after_id: ObjectId = None, after: datetime = None):
+    """Filter and sort for one session's messages past a summary watermark, in insertion order.
+
+    The watermark is the last summarized message's _id; `after` is the
+    timestamp watermark of summaries stored before ids were recorded.
+    """
+    query = {"user_id": user_id, "session_id": ObjectId(session_id)}
+    if after_id:
+        query["_id"] = {"$gt": after_id}
+    elif after:
+        query["timestamp"] = {"$gt": after}
+    return query, [("_id", 1)]
+
+@_timed
+def start_away_session(user_id: str):
+    try:
+        return away_collection.insert_one(new_away_session(user_id))
+    except DuplicateKeyError:
+        # A message already opened the session; keep it.
+        return None
+
+@_timed
 def end_away_session(user_id: str):
-    return away_collection.update_one(
-        {"user_id": user_id, "end_time": None},
-        {"$set": {"end_time": datetime.utcnow()}}
+    return away_collection.find_one_and_update(
+        open_away_session_query(user_id),
+        {"$set": {"end_time": datetime.utcnow()}},
+        projection={"_id": 1}
     )
 
+@_timed
 def log_away_message(user_id: str, sender_id: int, sender_name: str, content: str):
-    log = {
+    now = datetime.utcnow()
+    for attempt in range(2):
+        try:
+            session = away_collection.find_one_and_update(
+                open_away_session_query(user_id),
+                away_session_touch(now),
+                projection={"_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            # A concurrent upsert opened the session first; the retry matches it.
+            if attempt:
+                raise
+
+    return away_message_collection.insert_one({
+        "user_id": user_id,
+        "session_id": session["_id"],
         "sender_id": sender_id,
         "sender_name": sender_name,
         "content": content,
-        "timestamp": datetime.utcnow()
-    }
-
-    return away_collection.update_one(
-        {"user_id": user_id},
-        {"$push": {"messages": log}},
-        upsert=True
-    )
-
-def get_away_logs(user_id: str):
-    logs = away_collection.find({
-        "user_id": user_id,
+        "timestamp": now
     })
 
+@_timed
+def get_away_sessions(user_id: str, before: str = None, limit: int = 20):
+    """Newest-first page of session summaries; the cursor is the oldest (start_time, _id) returned."""
+    query, sort = away_sessions_query(user_id, before)
+    sessions = [format_away_session(doc) for doc in away_collection.find(query).sort(sort).limit(limit)]
+    next_cursor = away_cursor(sessions[-1]["start_time"], sessions[-1]["session_id"]) if len(sessions) == limit else None
+    return sessions, next_cursor
+
+@_timed
+def get_away_session_messages(user_id: str, session_id: str, after: str = None, limit: int = 100):
+    """Oldest-first page of one session's messages; the cursor is the last (timestamp, _id) returned."""
+    query, sort = away_messages_query(user_id, session_id, after)
+    docs = list(away_message_collection.find(query).sort(sort).limit(limit))
+    next_cursor = away_cursor(docs[-1]["timestamp"], docs[-1]["_id"]) if len(docs) == limit else None
+    return [format_away_message(doc) for doc in docs], next_cursor
+
+@_timed
+def get_away_logs(user_id: str):
+    """Every session with its formatted messages (used by the summarizer)."""
     sessions = []
-    for log in logs:
-        session_messages = []
-        for msg in log.get("messages", []):
-            session_messages.append(f"{msg['sender_name']}: {msg['content']}")  # include sender
+    for session in away_collection.find({"user_id": user_id}).sort("start_time", 1):
+        messages = away_message_collection.find(
+            {"user_id": user_id, "session_id": session["_id"]}, {"_id": 0}
+        ).sort("timestamp", 1)
         sessions.append({
-            "start_time": log["start_time"],
-            "end_time": log["end_time"],
-            "messages": session_messages
+            "session_id": str(session["_id"]),
+            "start_time": session.get("start_time"),
+            "end_time": session.get("end_time"),
+            "messages": [format_away_message(m) for m in messages]
         })
 
     return sessions
 
+def migrate_legacy_away_sessions():
+    """Moves embedded away_logs.messages arrays into away_messages and fills session summaries."""
+    moved = 0
+    for session in away_collection.find({"messages": {"$exists": True}}):
+        messages = session.get("messages", [])
+        if messages:
+            away_message_collection.insert_many([
+                {**message, "user_id": session["user_id"], "session_id": session["_id"]}
+                for message in messages
+            ])
+        timestamps = [m["timestamp"] for m in messages if m.get("timestamp")]
+        away_collection.update_one(
+            {"_id": session["_id"]},
+            {
+                "$set": {
+                    "start_time": session.get("start_time") or (min(timestamps) if timestamps else datetime.utcnow()),
+                    "end_time": session.get("end_time"),
+                    "message_count": len(messages),
+                    "first_message_at": min(timestamps) if timestamps else None,
+                    "last_message_at": max(timestamps) if timestamps else None,
+                },
+                "$unset": {"messages": ""},
+            }
+        )
+        moved += len(messages)
+    close_extra_open_sessions()
+    return moved
+
+def close_extra_open_sessions(collection=away_collection):
+    """Closes all but each user's newest open away session and returns how many it closed.
+
+    Legacy sessions could be left open side by side, which would stop the
+    user_id_open_session_unique index from building. A closed duplicate ends
+    at its last message, or at its start when it has none.
+    """
+    closed = 0
+    duplicates = collection.aggregate([
+        {"$match": {"end_time": None}},
+        {"$sort": {"user_id": 1, "start_time": -1}},
+        {"$group": {"_id": "$user_id", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ])
+    for group in duplicates:
+        result = collection.update_many(
+            {"_id": {"$in": group["ids"][1:]}, "end_time": None},
+            [{"$set": {"end_time": {"$ifNull": ["$last_message_at", {"$ifNull": ["$start_time", "$$NOW"]}]}}}],
+        )
+        closed += result.modified_count
+    return closed
 
+
+@_timed
 def save_story_nft(user_id: str, result: dict):
     story_nft_collection.update_one(
         {"user_id": user_id},
@@ -251,21 +799,26 @@ def save_story_nft(user_id: str, result: dict):
         upsert=True
     )
 
+@_timed
 def get_story_nfts(user_id: str):
     doc = story_nft_collection.find_one({"user_id": user_id}, {"_id": 0})
     return doc.get("story_nfts") if doc else None
 
+@_timed
 def set_plan(user_id: str, plan: str, tx_hash: str, subscribed_at: datetime):
     valid_plans = ["Basic", "Premium", "Pro"]
     if plan not in valid_plans:
         raise ValueError(f"Invalid plan: {plan}. Must be one of {valid_plans}.")
     
-    return collection.update_one(
+    result = collection.update_one(
         {"user_id": user_id},
-        {"$set": {"plan": plan, "tx_hash": tx_hash, "subscribed_at": subscribed_at} },
+        {"$set": {"plan": plan, "tx_hash": tx_hash, "subscribed_at": subscribed_at}, "$inc": PROFILE_VERSION_BUMP},
         upsert=True
     )
+    profile_cache.invalidate(user_id)
+    return result
 
+@_timed
 def get_plan(user_id: str):
     doc = collection.find_one({"user_id": user_id})
     return doc.get("plan") if doc else None
\ No newline at end of file
@@ -0,0 +1,88 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class ProfileCache:
+    """Process-level TTL/LRU cache of user profiles keyed by user_id.
+
+    Entries remember the profile_version they were read at and the user
+    document's _id, so invalidations can arrive either by user_id (local
+    writes, polling) or by _id (change stream events). Callers always get
+    a private copy because handlers mutate the profile they are given.
+    """
+
+    def __init__(self, ttl_seconds=60, max_entries=10_000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._ids = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        """Returns (hit, profile)."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry["fetched_at"] > self.ttl:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return True, copy.deepcopy(entry["profile"])
+
+    def put(self, user_id, profile, version=0, doc_id=None):
+        with self._lock:
+            self._entries[user_id] = {
+                "profile": copy.deepcopy(profile),
+                "version": version,
+                "doc_id": doc_id,
+                "fetched_at": time.monotonic(),
+            }
+            self._entries.move_to_end(user_id)
+            if doc_id is not None:
+                self._ids[doc_id] = user_id
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._ids.pop(evicted["doc_id"], None)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._ids.pop(entry["doc_id"], None)
+                self.invalidations += 1
+
+    def invalidate_doc(self, doc_id):
+        with self._lock:
+            user_id = self._ids.get(doc_id)
+        if user_id is not None:
+            self.invalidate(user_id)
+
+    def version(self, user_id):
+        """profile_version of the cached entry, or None when the user is not cached."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return entry["version"] if entry is not None else None
+
+    def versions(self):
+        with self._lock:
+            return {user_id: entry["version"] for user_id, entry in self._entries.items()}
+
+    def drop_stale(self, current_versions):
+        """Invalidates entries whose stored version differs from {user_id: version}."""
+        for user_id, version in self.versions().items():
+            if current_versions.get(user_id) != version:
+                self.invalidate(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+from pymongo import ReturnDocument
+
+from src.database.async_mongo_manager import collection
+
+DEFAULT_PLAN = "Basic"
+
+# Per-plan limits for metered actions; None means unlimited.
+PLAN_LIMITS = {
+    "Basic": {"chat": 100, "email": 10},
+    "Premium": {"chat": 500, "email": 100},
+    "Pro": {"chat": None, "email": None},
+}
+
+QUOTA_FIELDS = {
+    "chat": "chat_count",
+    "email": "email_count",
+}
+
+QUOTA_REJECT_TTL_SECONDS = float(os.getenv("QUOTA_REJECT_TTL_SECONDS", "60"))
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, plan, kind):
+        self.plan = plan
+        self.kind = kind
+        super().__init__(f"You have reached your {kind} limit for the {plan} plan.")
+
+
+def _limit_expression(kind):
+    """$switch that resolves the caller's limit for `kind` from the document's plan."""
+    unlimited = 2 ** 62
+    return {
+        "$switch": {
+            "branches": [
+                {
+                    "case": {"$eq": [{"$ifNull": ["$plan", DEFAULT_PLAN]}, plan]},
+                    "then": unlimited if limits[kind] is None else limits[kind],
+                }
+                for plan, limits in PLAN_LIMITS.items()
+            ],
+            "default": PLAN_LIMITS[DEFAULT_PLAN][kind],
+        }
+    }
+
+
+class QuotaEngine:
+    """Reserves metered units with one conditional find_one_and_update per request.
+
+    A reservation only succeeds while the counter is below the plan's limit,
+    so concurrent requests cannot overshoot. Users who were just rejected
+    are remembered for QUOTA_REJECT_TTL_SECONDS and turned away without a
+    database round trip.
+    """
+
+    def __init__(self, reject_ttl=QUOTA_REJECT_TTL_SECONDS):
+        self.reject_ttl = reject_ttl
+        self._rejected = {}
+        self._lock = threading.Lock()
+
+    def _recently_rejected(self, user_id, kind):
+        with self._lock:
+            entry = self._rejected.get((user_id, kind))
+            if entry is None:
+                return None
+            plan, expires_at = entry
+            if time.monotonic() > expires_at:
+                del self._rejected[(user_id, kind)]
+                return None
+            return plan
+
+    def clear(self, user_id):
+        """Forgets cached rejections, e.g. after a plan change."""
+        with self._lock:
+            for kind in QUOTA_FIELDS:
+                self._rejected.pop((user_id, kind), None)
+
+    async def reserve(self, user_id, kind):
+        """Consumes one unit of `kind` or raises QuotaExceeded. Returns the new count."""
+        plan = self._recently_rejected(user_id, kind)
+        if plan is not None:
+            raise QuotaExceeded(plan, kind)
+
+        field = QUOTA_FIELDS[kind]
+        doc = await collection.find_one_and_update(
+            {
+                "user_id": user_id,
+                "$expr": {"$lt": [{"$ifNull": [f"${field}", 0]}, _limit_expression(kind)]},
+            },
+            {"$inc": {field: 1}},
+            projection={"_id": 0, field: 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is not None:
+            return doc[field]
+
+        current = await collection.find_one({"user_id": user_id}, {"_id": 0, "plan": 1})
+        plan = (current or {}).get("plan") or DEFAULT_PLAN
+        with self._lock:
+            self._rejected[(user_id, kind)] = (plan, time.monotonic() + self.reject_ttl)
+        raise QuotaExceeded(plan, kind)
+
+    async def refund(self, user_id, kind):
+        """Returns a unit reserved for a request that failed."""
+        field = QUOTA_FIELDS[kind]
+        await collection.update_one(
+            {"user_id": user_id, field: {"$gt": 0}},
+            {"$inc": {field: -1}},
+        )
+
+
+quota_engine = QuotaEngine()
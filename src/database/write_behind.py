@@ -0,0 +1,150 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from src.database.mongo_manager import PartialWriteError, bulk_set_chat
+from src.utils.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Background pipeline for writes that do not need to finish before a reply is sent.
+
+    Conversation memory and chat rows are queued on the request path and a
+    worker thread drains them in batches: one embedding batch + vector
+    upsert for memory and one append per user for chat rows. The queue
+    is bounded and enqueueing never blocks (it runs on the event loop): when
+    the queue is full the write is rejected and counted. A failed batch is
+    retried, ahead of newer writes, up to max_retries times before its rows
+    are dropped; only the rows a failed write did not store are retried, and
+    memory rows carry a stable vector id, so a retry never stores a turn twice.
+    Analytics counters go through counters.CounterAggregator.
+    """
+
+    def __init__(self, memory=None, max_pending=10_000, batch_size=200, flush_interval_ms=50,
+                 max_retries=3, retry_backoff_ms=1000):
+        self.memory = memory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_pending)
+        # Failed rows wait here, ahead of the queue, so a retry keeps each user's chat order.
+        self._retry = []
+        self._retry_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self.lag_histogram = Histogram(
+            "write_behind_lag_seconds", [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+            "Time between enqueueing a write and it being flushed.",
+        )
+        self.rejected = Counter("write_behind_rejected_total", "Writes rejected because the write-behind queue was full.")
+        self.dropped = Counter("write_behind_dropped_total", "Queued writes dropped after exhausting their flush retries.")
+        self.last_flush_error = None
+
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+
+    def save_conversation(self, user_id, user_input, ai_response, type="general"):
+        # The timestamp pins the vector id, so a retried flush overwrites rather than duplicates.
+        self._put("memory", (user_id, user_input, ai_response, type, time.time()))
+
+    def set_chat(self, user_id, user_input, response):
+        self._put("chat", (user_id, user_input, response, datetime.utcnow().isoformat()))
+
+    def _put(self, kind, payload):
+        # Called on the event loop, so never wait for room: a full queue means the backend is stalled.
+        try:
+            self._queue.put_nowait((kind, payload, time.perf_counter(), 0))
+        except queue.Full:
+            self.rejected.inc()
+            logger.warning("write-behind queue full, rejecting %s write", kind)
+
+    def pending(self):
+        return self._queue.qsize() + len(self._retry)
+
+    def _drain(self, block):
+        with self._retry_lock:
+            items, self._retry = self._retry[:self.batch_size], self._retry[self.batch_size:]
+        try:
+            if block and not items:
+                items.append(self._queue.get(timeout=self.flush_interval))
+            while len(items) < self.batch_size:
+                items.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    def _flush(self, items):
+        memories, chats = [], []
+        for item in items:
+            (memories if item[0] == "memory" else chats).append(item)
+
+        ok = True
+        for name, write, batch in (
+            ("memory", lambda b: self.memory.save_conversations(b), memories),
+            ("chat", bulk_set_chat, chats),
+        ):
+            if not batch:
+                continue
+            try:
+                write([payload for _, payload, _, _ in batch])
+            except Exception as e:
+                ok = False
+                self.last_flush_error = f"{name}: {e}"
+                # Chat appends are not idempotent: only re-queue the rows that were not written.
+                written = set(e.written) if isinstance(e, PartialWriteError) else set()
+                self._observe_lag([item for i, item in enumerate(batch) if i in written])
+                logger.warning("write-behind %s flush failed after %d of %d rows, re-queueing the rest: %s",
+                               name, len(written), len(batch), e)
+                self._requeue([item for i, item in enumerate(batch) if i not in written])
+                continue
+            self._observe_lag(batch)
+        return ok
+
+    def _observe_lag(self, batch):
+        flushed = time.perf_counter()
+        for _, _, enqueued, _ in batch:
+            self.lag_histogram.observe(flushed - enqueued)
+
+    def _requeue(self, batch):
+        retry = []
+        for kind, payload, enqueued, attempts in batch:
+            if attempts >= self.max_retries:
+                self.dropped.inc()
+                logger.error("write-behind dropping %s write after %d attempts", kind, attempts + 1)
+                continue
+            retry.append((kind, payload, enqueued, attempts + 1))
+        with self._retry_lock:
+            self._retry[:0] = retry
+
+    def _run(self):
+        while not self._stopped.is_set():
+            items = self._drain(block=True)
+            if items and not self._flush(items):
+                self._stopped.wait(self.retry_backoff)
+
+    def flush(self):
+        """Synchronously writes everything queued so far, giving up on a batch that keeps failing."""
+        while True:
+            items = self._drain(block=False)
+            if not items or not self._flush(items):
+                return
+
+    def close(self, timeout=10):
+        """Stops the worker and flushes remaining writes (called on shutdown)."""
+        self._stopped.set()
+        self._worker.join(timeout)
+        self.flush()
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "lag_seconds": self.lag_histogram.snapshot(),
+            "rejected": self.rejected.value,
+            "dropped": self.dropped.value,
+            "last_flush_error": self.last_flush_error,
+        }
@@ -1,29 +1,29 @@
 import requests
 import json
 from datetime import datetime
-from groq import Groq  
 import os
-from web3 import Web3
 from dotenv import load_dotenv
 from io import BytesIO
 from requests_toolbelt import MultipartEncoder
 from src.database.mongo_manager import (
     save_story_nft
 )
+from src.agents.registry import get_contract, get_llm, get_web3
+from src.utils.metrics import REGISTRY, Histogram, LATENCY_BUCKETS, call_timer
+from src.utils.tracing import span
 
 load_dotenv(override=True)
 
-MONAD_RPC = "https://testnet-rpc.monad.xyz"  
-CONTRACT_ADDRESS = os.getenv("STORY_NFT_ADDRESS")
 PRIVATE_KEY = os.getenv("OWNER_PRIVATE_KEY")  
 OWNER_ADDRESS = os.getenv("OWNER_ADDRESS")
 
-with open("StoryNFT_ABI.json", "r") as abi_file:
-    CONTRACT_ABI = json.load(abi_file)
+STORY_MODEL_NAME = "llama-3.3-70b-versatile"
+STORY_TIMEOUT_SECONDS = float(os.getenv("STORY_TIMEOUT_SECONDS", "60"))
 
-client = Groq(
-    api_key=os.getenv("GROQ_API_KEY"),
+WEB3_CALL_SECONDS = REGISTRY.histogram_family(
+    "web3_call_seconds", ("module", "function"), description="Latency of on-chain calls and transactions."
 )
+ipfs_upload_seconds = Histogram("ipfs_upload_seconds", LATENCY_BUCKETS, "Latency of Pinata uploads.")
 
 def generate_story(prompt: str) -> str:
     story_prompt = (
@@ -32,16 +32,17 @@ def generate_story(prompt: str) -> str:
         f"a single character or pair of characters, a central conflict, and a meaningful or surprising resolution. "
         f"Write it in a tone that fits the idea, suitable for an NFT minting."
     )
-    chat_completion = client.chat.completions.create(
-        messages=[
+    completion = get_llm().invoke(
+        [
             {
                 "role" : "user",
                 "content" : story_prompt
             }
         ],
-        model="llama-3.3-70b-versatile"
+        model=STORY_MODEL_NAME,
+        timeout=STORY_TIMEOUT_SECONDS
     )
-    return chat_completion.choices[0].message.content.strip()
+    return completion.content.strip()
 
 
 def upload_to_ipfs(content: str,filename: str = None) -> str:
@@ -74,7 +75,8 @@ def upload_to_ipfs(content: str,filename: str = None) -> str:
         "Content-Type": m.content_type
     }
 
-    response = requests.post("https://uploads.pinata.cloud/v3/files", headers=headers, data=m)
+    with ipfs_upload_seconds.time(), span("ipfs.upload", bytes=len(content)):
+        response = requests.post("https://uploads.pinata.cloud/v3/files", headers=headers, data=m)
 
     if response.status_code == 200:
         ipfs_hash = response.json().get("data").get("cid")
@@ -82,9 +84,10 @@ def upload_to_ipfs(content: str,filename: str = None) -> str:
     else:
         raise Exception(f"[Pinata Upload Failed] {response.status_code} - {response.text}")
 
+@call_timer(WEB3_CALL_SECONDS, "story_nft_skill", span="web3")
 def mint_story_nft(ipfs_link: str, title: str, user_wallet: str) -> dict:
-    w3 = Web3(Web3.HTTPProvider(MONAD_RPC))
-    contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+    w3 = get_web3()
+    contract = get_contract("story_nft")
     
     nonce = w3.eth.get_transaction_count(OWNER_ADDRESS)
     import math
@@ -118,7 +121,8 @@ def mint_story_nft(ipfs_link: str, title: str, user_wallet: str) -> dict:
 
 def handle_story_and_mint(user_id: str,prompt: str, user_wallet: str) -> dict:
     print("[📖] Generating story...")
-    story = generate_story(prompt)
+    with span("story.generate"):
+        story = generate_story(prompt)
     
     print("[🌀] Uploading to IPFS...")
     ipfs_url = upload_to_ipfs(story)
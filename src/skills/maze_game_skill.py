@@ -1,23 +1,18 @@
-from web3 import Web3
-from eth_account import Account
-import os
-import json
-from dotenv import load_dotenv
 import math
+from src.agents.registry import Lazy, get_contract, get_owner_account, get_web3
+from src.utils.metrics import REGISTRY, call_timer
 
-load_dotenv(override=True)
+# Built on first use, so a slow RPC or missing key only affects the duel routes.
+w3 = Lazy(get_web3)
+ACCOUNT = Lazy(get_owner_account)
+contract = Lazy(lambda: get_contract("maze"))
 
-provider = Web3.HTTPProvider("https://testnet-rpc.monad.xyz")
-w3 = Web3(provider)
-PRIVATE_KEY = os.getenv("OWNER_PRIVATE_KEY")
-ACCOUNT = Account.from_key(PRIVATE_KEY)
-ADDRESS = ACCOUNT.address
-
-with open("MazeGameABI.json", "r") as f:
-    abi = json.load(f)
-
-contract = w3.eth.contract(address=os.getenv("MAZE_CONTRACT_ADDRESS"), abi=abi)
+WEB3_CALL_SECONDS = REGISTRY.histogram_family(
+    "web3_call_seconds", ("module", "function"), description="Latency of on-chain calls and transactions."
+)
+_timed = call_timer(WEB3_CALL_SECONDS, "maze_game_skill", span="web3")
 
+@_timed
 def get_tx_params():
     block = w3.eth.get_block("latest")
     base_fee = block.get("baseFeePerGas", w3.to_wei("1", "gwei"))
@@ -25,44 +20,49 @@ def get_tx_params():
     priority_fee = w3.to_wei("2", "gwei")
 
     return {
-        "from": ADDRESS,
-        "nonce": w3.eth.get_transaction_count(ADDRESS),
+        "from": ACCOUNT.address,
+        "nonce": w3.eth.get_transaction_count(ACCOUNT.address),
         "gas": 500000,
         "maxFeePerGas": max_fee,
         "maxPriorityFeePerGas": priority_fee
     }
 
+@_timed
 def get_path_hash_from_contract(path: list[str]) -> bytes:
     """
     Calls the contract's hashPath function with the string array path to get the keccak hash.
     """
     return contract.functions.hashPath(path).call()
 
+@_timed
 def create_duel(path: list[str]) -> int:
     path_hash = get_path_hash_from_contract(path)
     tx_params = get_tx_params()
 
     txn = contract.functions.createDuel(path_hash).build_transaction(tx_params)
-    signed = w3.eth.account.sign_transaction(txn, private_key=PRIVATE_KEY)
+    signed = w3.eth.account.sign_transaction(txn, private_key=ACCOUNT.key)
     tx_hash = w3.eth.send_raw_transaction(signed["raw_transaction"])
     receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
     logs = contract.events.DuelCreated().process_receipt(receipt)
     return logs[0]['args']['duelId']
 
+@_timed
 def submit_guess(duel_id: int, path: list[str]) -> str:
     tx_params = get_tx_params()
     txn = contract.functions.submitGuess(duel_id, path).build_transaction(tx_params)
-    signed = w3.eth.account.sign_transaction(txn, private_key=PRIVATE_KEY)
+    signed = w3.eth.account.sign_transaction(txn, private_key=ACCOUNT.key)
     tx_hash = w3.eth.send_raw_transaction(signed["raw_transaction"])
     return tx_hash.hex()
 
+@_timed
 def reveal_maze(duel_id: int, path: list[str]) -> str:
     tx_params = get_tx_params()
     txn = contract.functions.revealMaze(duel_id, path).build_transaction(tx_params)
-    signed = w3.eth.account.sign_transaction(txn, private_key=PRIVATE_KEY)
+    signed = w3.eth.account.sign_transaction(txn, private_key=ACCOUNT.key)
     tx_hash = w3.eth.send_raw_transaction(signed["raw_transaction"])
     return tx_hash.hex()
 
+@_timed
 def get_winner(duel_id: int) -> str:
     winner = contract.functions.getWinner(duel_id).call()
     return None if winner == "0x0000000000000000000000000000000000000000" else winner
@@ -1,12 +1,11 @@
-from groq import Groq
 import os
-import serpapi
+from src.agents.registry import get_llm, get_serpapi_client
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-serpapi_client = serpapi.Client(api_key=os.getenv("SERPAPI_API_KEY"))
+SHOPPING_MODEL_NAME = "llama-3.3-70b-versatile"
+SHOPPING_TIMEOUT_SECONDS = float(os.getenv("SHOPPING_TIMEOUT_SECONDS", "15"))
 
 def search_products(query: str) -> list:
-    results = serpapi_client.search({
+    results = get_serpapi_client().search({
         "engine": "google",
         "q": query,
     })
@@ -28,14 +27,15 @@ def search_products(query: str) -> list:
 
 def generate_shopping_reply(user_prompt: str) -> str:
     system_prompt = "Extract a clean product search query from this user's shopping request.Use the most relevant keywords and phrases to form a concise search query.The user may have provided a lot of context, but focus on the main product they are looking for and give the result in one sentence for example user serach query is 'I want to buy a new laptop for gaming' then the output should be 'gaming laptop'." 
-    chat_completion = client.chat.completions.create(
-        messages=[
+    completion = get_llm().invoke(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        model="llama-3.3-70b-versatile"
+        model=SHOPPING_MODEL_NAME,
+        timeout=SHOPPING_TIMEOUT_SECONDS
     )
-    return chat_completion.choices[0].message.content.strip()
+    return completion.content.strip()
 
 def handle_shopping_flow(prompt: str) -> dict:
     print("[🧠] Understanding intent...")
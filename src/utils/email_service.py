@@ -4,16 +4,21 @@ from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
 from datetime import datetime
+from src.utils.metrics import Counter, Histogram, LATENCY_BUCKETS
 
 load_dotenv(override=True)
 
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
 FROM_EMAIL = os.getenv("EMAIL")  
 FROM_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
 BASE_URL = os.getenv("BACKEND_URL") 
 
+smtp_send_seconds = Histogram("smtp_send_seconds", LATENCY_BUCKETS, "Time to connect to the SMTP server and send one email.")
+smtp_send_failures = Counter("smtp_send_failures_total", "Emails that failed to send.")
+
 def send_verification_email(to_email, token):
     try:
         msg = MIMEMultipart("alternative")
@@ -39,13 +44,17 @@ def send_verification_email(to_email, token):
         part = MIMEText(html, "html")
         msg.attach(part)
 
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(FROM_EMAIL, FROM_PASSWORD)
-        server.sendmail(FROM_EMAIL, to_email, msg.as_string())
-        server.quit()
+        with smtp_send_seconds.time():
+            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
+            if SMTP_STARTTLS:
+                server.starttls()
+            if FROM_PASSWORD:
+                server.login(FROM_EMAIL, FROM_PASSWORD)
+            server.sendmail(FROM_EMAIL, to_email, msg.as_string())
+            server.quit()
 
         print(f"Verification email sent to {to_email}")
 
     except Exception as e:
+        smtp_send_failures.inc()
         print(f"Failed to send email: {e}")
@@ -0,0 +1,252 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from src.utils import tracing
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def histogram_family(self, name, labelnames, buckets=LATENCY_BUCKETS, description=""):
+        """Returns the family registered under `name`, creating it on first use."""
+        with self._lock:
+            family = self._metrics.get(name)
+            if family is None:
+                family = HistogramFamily(name, labelnames, buckets, description, registry=None)
+                self._metrics[name] = family
+            return family
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class Histogram:
+    """Cumulative bucketed histogram (Prometheus style) that is cheap to observe from many threads."""
+
+    def __init__(self, name, buckets, description="", registry=REGISTRY):
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.buckets + [float("inf")], counts):
+            running += n
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+    def _samples(self, labels=()):
+        snapshot = self.snapshot()
+        lines = [
+            f"{self.name}_bucket{_format_labels(list(labels) + [('le', _format_value(bound))])} {count}"
+            for bound, count in snapshot["buckets"]
+        ]
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {snapshot['count']}")
+        return lines
+
+    def expose(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"] + self._samples()
+
+
+class HistogramFamily:
+    """Histograms sharing a name and buckets, one child per label combination."""
+
+    def __init__(self, name, labelnames, buckets=LATENCY_BUCKETS, description="", registry=REGISTRY):
+        self.name = name
+        self.labelnames = tuple(labelnames)
+        self.buckets = sorted(buckets)
+        self.description = description
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.name, self.buckets, registry=None))
+        return child
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(child._samples(list(zip(self.labelnames, values))))
+        return lines
+
+
+class Counter:
+    def __init__(self, name, description="", registry=REGISTRY):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def expose(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter", f"{self.name} {self._value}"]
+
+
+class Gauge:
+    """A settable value, or one read from `callback` at scrape time."""
+
+    def __init__(self, name, description="", callback=None, registry=REGISTRY):
+        self.name = name
+        self.description = description
+        self.callback = callback
+        self._value = 0
+        if registry is not None:
+            registry.register(self)
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        return self.callback() if self.callback else self._value
+
+    def expose(self):
+        try:
+            value = self.value()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge", f"{self.name} {_format_value(value)}"]
+
+
+class GaugeFamily:
+    """Labelled gauges read together at scrape time; `callback` returns {label values tuple: value}."""
+
+    def __init__(self, name, labelnames, callback, description="", registry=REGISTRY):
+        self.name = name
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.description = description
+        if registry is not None:
+            registry.register(self)
+
+    def expose(self):
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, labels)))} {_format_value(value)}")
+        return lines
+
+
+def call_timer(family, *labels, span=None):
+    """Decorator recording each call's duration in `family`, labelled with `labels` plus the function name.
+
+    With `span` set, sampled requests also get a `<span>.<function>` trace span per call.
+    """
+    def decorate(fn):
+        histogram = family.labels(*labels, fn.__name__)
+        span_name = f"{span}.{fn.__name__}" if span else None
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    if span_name is None:
+                        return await fn(*args, **kwargs)
+                    with tracing.span(span_name, tracing.KIND_CLIENT):
+                        return await fn(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                if span_name is None:
+                    return fn(*args, **kwargs)
+                with tracing.span(span_name, tracing.KIND_CLIENT):
+                    return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
@@ -0,0 +1,417 @@
+"""Lightweight request tracing with OTLP/JSON export.
+
+A trace is started per request (TracingMiddleware) or per bot message and
+only recorded when sampled: by head sampling at TRACE_SAMPLE_RATE, or on
+request from a trusted caller. A caller is trusted when its address is in
+TRACE_TRUSTED_CLIENTS or it sends `X-Trace-Force: <TRACE_FORCE_SECRET>`;
+trusted callers can force sampling (`X-Trace-Force: 1` from a trusted
+address) and have the sampled flag of their W3C `traceparent` honoured.
+Other callers only ever get head sampling. Bot messages for users listed in
+TRACE_FORCE_USERS are always sampled. Forced traces are capped at
+TRACE_FORCE_PER_MINUTE. Unsampled requests pay for one context-variable
+lookup per instrumented call.
+
+Finished traces are exported as OTLP/JSON (one ExportTraceServiceRequest
+per line) to TRACE_FILE, which is rotated to TRACE_FILE.1 once it reaches
+TRACE_FILE_MAX_BYTES, or POSTed to an OTLP/HTTP collector at
+TRACE_OTLP_ENDPOINT when TRACE_EXPORTER=otlp.
+"""
+import contextvars
+import functools
+import hmac
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(100 * 1024 * 1024)))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "echopersona-api")
+FORCE_HEADER = "x-trace-force"
+TRACE_FORCE_USERS = {u for u in os.getenv("TRACE_FORCE_USERS", "").split(",") if u}
+TRACE_FORCE_SECRET = os.getenv("TRACE_FORCE_SECRET", "")
+TRACE_TRUSTED_CLIENTS = {c for c in os.getenv("TRACE_TRUSTED_CLIENTS", "").split(",") if c}
+TRACE_FORCE_PER_MINUTE = float(os.getenv("TRACE_FORCE_PER_MINUTE", "60"))
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT, KIND_CONSUMER = 1, 2, 3, 5
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class _Trace:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.closed = False
+        self.lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace, name, parent_id=None, kind=KIND_INTERNAL, attributes=None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def traceparent(self):
+        return f"00-{self.trace.trace_id}-{self.span_id}-01"
+
+    def end(self, error=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        trace = self.trace
+        with trace.lock:
+            if trace.closed:
+                late = [self]
+            else:
+                trace.spans.append(self)
+                late = None
+        if late:
+            exporter().export(late)
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class _Scope:
+    """Context manager that activates a span for its body and ends it on exit."""
+
+    __slots__ = ("span", "_token", "_root")
+
+    def __init__(self, span, root=False):
+        self.span = span
+        self._token = None
+        self._root = root
+
+    def __enter__(self):
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.span.end(exc)
+        if self._root:
+            finish_trace(self.span.trace)
+        return False
+
+
+class _NoopScope:
+    span = None
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopScope()
+
+
+def current_span():
+    return _current.get()
+
+
+def parse_traceparent(header):
+    """Returns (trace_id, parent_span_id, sampled) or None for a malformed header."""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+class _ForceLimiter:
+    """Token bucket capping forced traces at `per_minute`, with a burst of the same size."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+_force_limiter = _ForceLimiter(TRACE_FORCE_PER_MINUTE)
+
+
+def start_trace(name, traceparent=None, force=False, trust_parent=True, kind=KIND_SERVER, **attributes):
+    """Root scope for a request or job; a no-op unless the trace is sampled.
+
+    An incoming traceparent continues the caller's trace; when `trust_parent`
+    is set it also inherits its sampling decision, otherwise head sampling
+    applies. `force` samples too, up to TRACE_FORCE_PER_MINUTE traces.
+    """
+    parent = parse_traceparent(traceparent)
+    if parent and trust_parent:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id = parent[:2] if parent else (os.urandom(16).hex(), None)
+        sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+    if not sampled and not (force and _force_limiter.allow()):
+        return _NOOP
+    return _Scope(Span(_Trace(trace_id), name, parent_id, kind, attributes), root=True)
+
+
+def span(name, kind=KIND_INTERNAL, **attributes):
+    """Child scope of the active span; a no-op when there is no sampled trace."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return _Scope(Span(parent.trace, name, parent.span_id, kind, attributes))
+
+
+def start_span(name, kind=KIND_INTERNAL, **attributes):
+    """Child span that is not made current; the caller must call end().
+
+    Use this around async generators, whose body may be resumed from a
+    different context than the one that created them.
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+
+def traceparent_header():
+    """Headers that propagate the active trace to another service, if any."""
+    active = _current.get()
+    return {"traceparent": active.traceparent()} if active else {}
+
+
+def finish_trace(trace):
+    with trace.lock:
+        trace.closed = True
+        spans, trace.spans = trace.spans, []
+    if spans:
+        exporter().export(spans)
+
+
+def set_service_name(name):
+    """Names the process in exported resources, e.g. for bot processes forked from the API."""
+    global TRACE_SERVICE_NAME
+    TRACE_SERVICE_NAME = name
+
+
+def otlp_payload(spans, service_name=None):
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", service_name or TRACE_SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "echopersona.tracing"}, "spans": [s.to_otlp() for s in spans]}],
+        }]
+    }
+
+
+class _BackgroundExporter:
+    """Serializes and ships spans on a daemon thread so requests never wait on I/O."""
+
+    def __init__(self, max_pending=10_000):
+        self.pid = os.getpid()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self._worker = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._worker.start()
+
+    def export(self, spans):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += len(spans)
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self.write(json.dumps(otlp_payload(spans), separators=(",", ":")))
+            except Exception as e:
+                print("[tracing] export failed:", e)
+
+    def write(self, payload):
+        raise NotImplementedError
+
+
+class FileExporter(_BackgroundExporter):
+    """Appends one OTLP/JSON line per trace; single O_APPEND writes keep lines from several processes intact.
+
+    Once the file reaches max_bytes it is renamed to `<path>.1`, replacing
+    the previous one, so traces never take more than about twice max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=TRACE_FILE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        super().__init__()
+
+    def write(self, payload):
+        data = (payload + "\n").encode("utf-8")
+        if self.max_bytes:
+            self._rotate_if_full(len(data))
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _rotate_if_full(self, incoming):
+        try:
+            if os.stat(self.path).st_size + incoming > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except FileNotFoundError:
+            # Not written yet, or another process rotated it between the stat and the rename.
+            pass
+
+
+class OtlpHttpExporter(_BackgroundExporter):
+    """POSTs OTLP/JSON to a collector's /v1/traces endpoint."""
+
+    def __init__(self, endpoint, timeout=5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        super().__init__()
+
+    def write(self, payload):
+        request = urllib.request.Request(
+            self.endpoint, data=payload.encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST"
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def exporter():
+    global _exporter
+    # A forked bot process inherits the object but not its worker thread.
+    if _exporter is None or _exporter.pid != os.getpid():
+        with _exporter_lock:
+            if _exporter is None or _exporter.pid != os.getpid():
+                if TRACE_EXPORTER == "otlp":
+                    _exporter = OtlpHttpExporter(TRACE_OTLP_ENDPOINT)
+                else:
+                    _exporter = FileExporter(TRACE_FILE)
+    return _exporter
+
+
+@functools.lru_cache(maxsize=None)
+def _traced_http_provider_class():
+    from web3 import Web3
+
+    class TracedHTTPProvider(Web3.HTTPProvider):
+        def make_request(self, method, params):
+            with span(f"web3.rpc {method}", KIND_CLIENT, **{"rpc.method": method}):
+                return super().make_request(method, params)
+
+    return TracedHTTPProvider
+
+
+def traced_http_provider(endpoint_uri):
+    """Web3 HTTPProvider that records one client span per JSON-RPC request."""
+    return _traced_http_provider_class()(endpoint_uri)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span around every HTTP request.
+
+    The span covers the whole response, including streamed bodies, and the
+    trace id is returned in an X-Trace-Id header when the request is sampled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        force_value = headers.get(FORCE_HEADER, "")
+        has_secret = bool(TRACE_FORCE_SECRET) and hmac.compare_digest(force_value.encode(), TRACE_FORCE_SECRET.encode())
+        client = scope.get("client")
+        trusted = has_secret or (client is not None and client[0] in TRACE_TRUSTED_CLIENTS)
+        root = start_trace(
+            f"{scope['method']} {scope['path']}",
+            traceparent=headers.get("traceparent"),
+            force=has_secret or (trusted and force_value in ("1", "true")),
+            trust_parent=trusted,
+            **{"http.method": scope["method"], "http.target": scope["path"]},
+        )
+        if root is _NOOP:
+            return await self.app(scope, receive, send)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                root.span.set("http.status_code", message["status"])
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-trace-id", root.span.trace_id.encode("latin-1"))
+                ]}
+            await send(message)
+
+        with root:
+            await self.app(scope, receive, send_with_trace)
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                root.span.name = f"{scope['method']} {route.path}"
+                root.span.set("http.route", route.path)
@@ -0,0 +1,97 @@
+import asyncio
+import itertools
+import multiprocessing
+import threading
+
+import pytest
+
+from src.bot.worker import BotWorker
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    def is_closed(self):
+        return self.closed
+
+    def is_ready(self):
+        return not self.closed
+
+
+class FakeWorker(BotWorker):
+    """BotWorker without Discord or Mongo: clients idle until removed."""
+
+    def _make_client(self, user_id):
+        return FakeClient()
+
+    async def _run_client(self, user_id, client, token):
+        await asyncio.Event().wait()
+
+    async def _load_profile(self, user_id):
+        return None
+
+
+@pytest.fixture
+def call():
+    """Runs a FakeWorker's command reader on a pipe and returns a blocking call(op, *args)."""
+    parent, child = multiprocessing.Pipe()
+    worker = FakeWorker(0)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def serve():
+        worker._stopped = asyncio.Event()
+        threading.Thread(target=worker._read_commands, args=(child, loop), daemon=True).start()
+        ready.set()
+        await worker._stopped.wait()
+        for user_id in list(worker.clients):
+            await worker.remove(user_id)
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True)
+    thread.start()
+    ready.wait(5)
+    request_ids = itertools.count()
+
+    def call(op, *args):
+        request_id = next(request_ids)
+        parent.send((request_id, op, args))
+        assert parent.poll(5), f"no reply to {op}"
+        reply_id, ok, value = parent.recv()
+        assert reply_id == request_id
+        if not ok:
+            raise RuntimeError(value)
+        return value
+
+    yield call
+    call("shutdown")
+    thread.join(5)
+    loop.close()
+
+
+def test_add_status_remove(call):
+    assert call("status", "alice") is False
+    assert call("add", "alice", "token") is True
+    assert call("add", "alice", "token") is False
+    assert call("status", "alice") is True
+    assert call("users") == ["alice"]
+
+    assert call("remove", "alice") is True
+    assert call("remove", "alice") is False
+    assert call("status", "alice") is False
+    assert call("users") == []
+
+
+def test_profile_push_needs_a_running_bot(call):
+    assert call("profile", "bob", {"away": True}) is False
+    call("add", "bob", "token")
+    assert call("profile", "bob", {"away": True}) is True
+    assert call("stats")["cached_profiles"] == 1
+
+
+def test_unknown_command_is_reported(call):
+    with pytest.raises(RuntimeError, match="Unknown bot worker command"):
+        call("restart")
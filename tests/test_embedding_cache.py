@@ -0,0 +1,59 @@
+import numpy as np
+
+from src.agents.embedding_cache import DiskEmbeddingStore
+
+
+def vector(i, dimension=3):
+    return np.full(dimension, i, dtype=np.float32)
+
+
+def log_lines(store):
+    with open(store.keys_path) as f:
+        return f.read().splitlines()
+
+
+def test_key_log_is_rewritten_from_live_slots(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path), 3, capacity=4, compact_factor=2)
+    for i in range(20):
+        store.put(f"k{i}", vector(i))
+
+    lines = log_lines(store)
+    assert len(lines) <= store.max_log_lines
+    assert store.log_lines == len(lines)
+    # Only the newest `capacity` keys survive round-robin reuse.
+    assert set(store.slots) == {"k16", "k17", "k18", "k19"}
+    store.close()
+
+
+def test_replay_after_compaction_restores_slots_and_next_slot(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path), 3, capacity=4, compact_factor=2)
+    for i in range(10):
+        store.put(f"k{i}", vector(i))
+    store._compact()
+    expected_slots, expected_next = dict(store.slots), store.next_slot
+    store.close()
+
+    reopened = DiskEmbeddingStore(str(tmp_path), 3, capacity=4, compact_factor=2)
+    assert reopened.slots == expected_slots
+    assert reopened.next_slot == expected_next
+    for i in range(6, 10):
+        np.testing.assert_array_equal(reopened.get(f"k{i}"), vector(i))
+
+    # The next write reuses the oldest slot, as it would have before the restart.
+    reopened.put("k10", vector(10))
+    assert reopened.get("k6") is None
+    assert set(reopened.slots) == {"k7", "k8", "k9", "k10"}
+    reopened.close()
+
+
+def test_replay_skips_partial_lines_and_out_of_range_slots(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path), 3, capacity=4)
+    store.put("k0", vector(0))
+    store.close()
+    with open(store.keys_path, "a") as f:
+        f.write("9\tbeyond\n3\n")
+
+    reopened = DiskEmbeddingStore(str(tmp_path), 3, capacity=4)
+    assert reopened.slots == {"k0": 0}
+    assert reopened.next_slot == 1
+    reopened.close()
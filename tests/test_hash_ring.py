@@ -0,0 +1,49 @@
+from collections import Counter
+
+import pytest
+
+from src.bot.hash_ring import HashRing
+
+KEYS = [f"user-{i}@example.com" for i in range(10_000)]
+
+
+def assignments(ring):
+    return {key: ring.node_for(key) for key in KEYS}
+
+
+def test_keys_spread_evenly():
+    ring = HashRing(range(4))
+    counts = Counter(assignments(ring).values())
+    mean = len(KEYS) / 4
+    assert set(counts) == {0, 1, 2, 3}
+    assert all(0.75 * mean < count < 1.25 * mean for count in counts.values())
+
+
+def test_add_only_moves_keys_to_the_new_node():
+    ring = HashRing(range(4))
+    before = assignments(ring)
+    ring.add(4)
+    after = assignments(ring)
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 4 for key in moved)
+    # The new node should take about a fifth of the keys.
+    assert 0.1 < len(moved) / len(KEYS) < 0.3
+
+
+def test_remove_only_moves_the_removed_nodes_keys():
+    ring = HashRing(range(4))
+    before = assignments(ring)
+    ring.remove(2)
+    after = assignments(ring)
+
+    assert len(ring) == 3
+    assert 2 not in after.values()
+    for key in KEYS:
+        if before[key] != 2:
+            assert after[key] == before[key]
+
+
+def test_empty_ring_raises():
+    with pytest.raises(LookupError):
+        HashRing().node_for("user")